@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Настройки БД по умолчанию для ASGI, см. config/database.py
+os.environ.setdefault('DJANGO_ASGI', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,104 @@
+"""
+Выборочная инструментация запросов.
+
+Для доли запросов, заданной REQUEST_INSTRUMENTATION_SAMPLE_RATE, считает
+число SQL-запросов, время в БД, время сериализации и общее время и пишет
+одну строку лога на запрос. Для остальных запросов накладные расходы
+сводятся к одному вызову random().
+"""
+
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Статистика текущего запроса (None, если запрос не попал в выборку)
+_current_stats: ContextVar['RequestStats | None'] = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Накопитель метрик одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self._serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка connection.execute_wrapper: считает запросы и время в БД."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def get_current_stats() -> RequestStats | None:
+    """Возвращает статистику текущего запроса, если он попал в выборку."""
+    return _current_stats.get()
+
+
+class InstrumentedSerializerMixin:
+    """Миксин сериализатора: учитывает время to_representation в статистике запроса.
+
+    Вложенные вызовы (элементы списка внутри уже замеряемого вызова) не
+    замеряются повторно.
+    """
+
+    def to_representation(self, instance):
+        stats = _current_stats.get()
+        if stats is None or stats._serializing:
+            return super().to_representation(instance)
+
+        stats._serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serialization_time += time.perf_counter() - start
+            stats._serializing = False
+
+
+class RequestInstrumentationMiddleware:
+    """Middleware, который пишет метрики для выборки запросов."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_INSTRUMENTATION_SAMPLE_RATE', 0.0)
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        total_time = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        logger.info(
+            'request method=%s endpoint=%s status=%s queries=%d db_ms=%.1f serialization_ms=%.1f total_ms=%.1f',
+            request.method,
+            match.view_name if match else request.path,
+            response.status_code,
+            stats.queries,
+            stats.db_time * 1000,
+            stats.serialization_time * 1000,
+            total_time * 1000,
+        )
+        return response
@@ -0,0 +1,132 @@
+"""
+Разрешение telegram_id → id пользователя с кэшированием.
+
+Кэш двухуровневый:
+    * в рамках запроса — повторные обращения за тем же telegram_id
+      в одном запросе не выполняют SQL;
+    * в процессе — LRU с TTL, размер и время жизни задаются
+      TELEGRAM_ID_CACHE_SIZE и TELEGRAM_ID_CACHE_TTL (секунды).
+
+Записи процессного кэша сбрасываются сигналами post_save/post_delete
+модели User в текущем процессе; остальные воркеры увидят изменение не позже
+чем через TTL. Отсутствие пользователя в процессном кэше не запоминается,
+чтобы только что зарегистрированный пользователь находился сразу.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+
+# Атрибут HttpRequest, в котором хранится кэш текущего запроса
+REQUEST_CACHE_ATTR = '_telegram_user_ids'
+
+
+class TelegramIdCache:
+    """Потокобезопасный LRU-кэш telegram_id → id пользователя с TTL."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[int, float]] = OrderedDict()
+        # Обратный индекс user_id → telegram_id для сброса без обхода всего кэша
+        self._keys_by_user: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, telegram_id: int) -> int | None:
+        """Возвращает id пользователя или None, если записи нет или она устарела."""
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                return None
+            user_id, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._discard(telegram_id)
+                return None
+            self._entries.move_to_end(telegram_id)
+            return user_id
+
+    def set(self, telegram_id: int, user_id: int) -> None:
+        """Запоминает соответствие, вытесняя самую давно использованную запись."""
+        with self._lock:
+            self._discard(telegram_id)
+            self._discard(self._keys_by_user.get(user_id))
+            self._entries[telegram_id] = (user_id, time.monotonic() + self.ttl)
+            self._keys_by_user[user_id] = telegram_id
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, user_id: int, telegram_id: int | None = None) -> None:
+        """Удаляет записи, противоречащие актуальной паре telegram_id ↔ user_id.
+
+        Без telegram_id (пользователь удален) удаляется запись пользователя.
+        """
+        with self._lock:
+            cached_key = self._keys_by_user.get(user_id)
+            if cached_key is not None and cached_key != telegram_id:
+                self._discard(cached_key)
+            entry = self._entries.get(telegram_id)
+            if entry is not None and entry[0] != user_id:
+                self._discard(telegram_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _discard(self, telegram_id: int | None) -> None:
+        entry = self._entries.pop(telegram_id, None)
+        if entry is not None:
+            self._keys_by_user.pop(entry[0], None)
+
+
+telegram_id_cache = TelegramIdCache(
+    max_size=getattr(settings, 'TELEGRAM_ID_CACHE_SIZE', 10_000),
+    ttl=getattr(settings, 'TELEGRAM_ID_CACHE_TTL', 300),
+)
+
+
+def _request_cache(request) -> dict | None:
+    """Возвращает словарь кэша запроса (для DRF Request — исходного HttpRequest)."""
+    if request is None:
+        return None
+    http_request = getattr(request, '_request', request)
+    return http_request.__dict__.setdefault(REQUEST_CACHE_ATTR, {})
+
+
+def resolve_user_id(telegram_id, request=None) -> int | None:
+    """Возвращает id пользователя по telegram_id или None, если пользователя нет.
+
+    Выбрасывает ValueError/TypeError, если telegram_id не является числом.
+    """
+    telegram_id = int(telegram_id)
+    request_cache = _request_cache(request)
+    if request_cache is not None and telegram_id in request_cache:
+        return request_cache[telegram_id]
+
+    user_id = telegram_id_cache.get(telegram_id)
+    if user_id is None:
+        user_id = User.objects.filter(telegram_id=telegram_id).values_list('id', flat=True).first()
+        if user_id is not None:
+            telegram_id_cache.set(telegram_id, user_id)
+
+    if request_cache is not None:
+        request_cache[telegram_id] = user_id
+    return user_id
+
+
+@receiver(post_save, sender=User)
+def invalidate_saved_user(sender, instance, **kwargs):
+    """Сбрасывает устаревшие записи, если telegram_id пользователя изменился."""
+    telegram_id_cache.invalidate(instance.pk, instance.telegram_id)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    """Сбрасывает запись удаленного пользователя."""
+    telegram_id_cache.invalidate(instance.pk)
@@ -0,0 +1,123 @@
+"""
+Отложенная запись last_visit пользователей.
+
+Посещения накапливаются в памяти процесса (user_id → самое позднее время)
+и записываются пакетно: один UPDATE ... SET last_visit = CASE id WHEN ...
+на LAST_VISIT_FLUSH_BATCH пользователей. Запись выполняется фоновым потоком
+раз в LAST_VISIT_FLUSH_INTERVAL секунд, сразу при заполнении буфера до
+LAST_VISIT_BUFFER_SIZE пользователей и при завершении процесса (atexit).
+
+При LAST_VISIT_FLUSH_INTERVAL = 0 фоновый поток не запускается и буфер
+сбрасывается только при заполнении, явным вызовом flush() и при выходе.
+При аварийном завершении воркера несброшенные посещения теряются: last_visit
+информационное поле, поэтому это допустимо.
+"""
+
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+class LastVisitBuffer:
+    """Буфер посещений пользователей с пакетной записью в БД."""
+
+    def __init__(self, max_size: int, interval: float, batch_size: int = 500):
+        self.max_size = max_size
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending: dict[int, object] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def mark_seen(self, user_id: int, when=None) -> None:
+        """Запоминает посещение пользователя; при заполнении буфера сбрасывает его."""
+        when = when or timezone.now()
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is None or previous < when:
+                self._pending[user_id] = when
+            full = len(self._pending) >= self.max_size
+        self._ensure_thread()
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Записывает накопленные посещения и возвращает число пользователей."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            items = list(pending.items())
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                try:
+                    self._write(batch)
+                except Exception:
+                    logger.exception(f'[LastVisitBuffer] Не удалось записать last_visit для {len(batch)} пользователей')
+                    self._requeue(items[start:])
+                    return start
+            return len(items)
+
+    def _write(self, batch: list[tuple[int, object]]) -> None:
+        """Один UPDATE на пакет; Greatest не дает откатить время назад
+        при записи из нескольких воркеров."""
+        visits = Case(*(When(pk=user_id, then=Value(when)) for user_id, when in batch))
+        User.objects.filter(pk__in=[user_id for user_id, _ in batch]).update(
+            last_visit=Greatest(F('last_visit'), visits),
+        )
+
+    def _requeue(self, items: list[tuple[int, object]]) -> None:
+        """Возвращает незаписанные посещения в буфер, не превышая max_size."""
+        with self._lock:
+            for user_id, when in items:
+                if len(self._pending) >= self.max_size:
+                    break
+                previous = self._pending.get(user_id)
+                if previous is None or previous < when:
+                    self._pending[user_id] = when
+
+    def _ensure_thread(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='last-visit-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        """Цикл фонового потока: сбрасывает буфер раз в interval секунд."""
+        while not self._stopped.wait(self.interval):
+            # Поток живет долго: соблюдаем CONN_MAX_AGE и не держим битое соединение
+            close_old_connections()
+            self.flush()
+            close_old_connections()
+
+    def stop(self) -> None:
+        """Останавливает фоновый поток и сбрасывает остаток буфера."""
+        self._stopped.set()
+        self.flush()
+
+
+last_visit_buffer = LastVisitBuffer(
+    max_size=settings.LAST_VISIT_BUFFER_SIZE,
+    interval=settings.LAST_VISIT_FLUSH_INTERVAL,
+    batch_size=settings.LAST_VISIT_FLUSH_BATCH,
+)
+
+atexit.register(last_visit_buffer.stop)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_photo_url'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='last_visit',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='Дата и время последнего посещения приложения', verbose_name='Время последнего посещения'),
+        ),
+    ]
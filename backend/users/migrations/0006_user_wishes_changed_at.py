@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_last_visit_not_auto_now'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='wishes_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Когда у пользователя последний раз удаляли или перемещали желания и вишлисты', null=True, verbose_name='Время удаления или перемещения желаний'),
+        ),
+    ]
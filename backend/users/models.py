@@ -50,8 +50,11 @@ class User(models.Model):
         help_text='Дата и время регистрации пользователя'
     )
     
+    # Не auto_now: обновляется только при посещении (см. users/last_visit.py),
+    # а не при любом save() пользователя
     last_visit = models.DateTimeField(
-        auto_now=True,
+        default=timezone.now,
+        editable=False,
         verbose_name='Время последнего посещения',
         help_text='Дата и время последнего посещения приложения'
     )
@@ -113,6 +116,14 @@ class User(models.Model):
         help_text='Количество подарков, которые пользователь получил'
     )
     
+    wishes_changed_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Время удаления или перемещения желаний',
+        help_text='Когда у пользователя последний раз удаляли или перемещали желания и вишлисты'
+    )
+    
     subscriptions = models.ManyToManyField(
         'self',
         symmetrical=False,
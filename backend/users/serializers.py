@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from .models import User
+from config.instrumentation import InstrumentedSerializerMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели User."""
     
     invited_by_telegram_id = serializers.IntegerField(
@@ -0,0 +1,78 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .identity import telegram_id_cache
+from .last_visit import last_visit_buffer
+from .models import User
+
+# Поля профиля Telegram, которые клиент присылает при каждом запуске приложения
+PROFILE_FIELDS = ('first_name', 'last_name', 'username', 'photo_url', 'language', 'theme_color')
+
+# Значения полей профиля для нового пользователя, если клиент их не прислал
+PROFILE_DEFAULTS = {
+    'first_name': '',
+    'last_name': '',
+    'username': '',
+    'photo_url': '',
+    'language': 'ru',
+    'theme_color': 'light',
+}
+
+
+def _get_user(telegram_id: int) -> User | None:
+    return User.objects.select_related('invited_by').filter(telegram_id=telegram_id).first()
+
+
+def _last_visit_is_stale(user: User, now) -> bool:
+    """Проверяет, что last_visit старше LAST_VISIT_UPDATE_INTERVAL секунд."""
+    interval = timedelta(seconds=settings.LAST_VISIT_UPDATE_INTERVAL)
+    return user.last_visit is None or user.last_visit <= now - interval
+
+
+def register_or_get_user(telegram_id: int, profile: dict, inviter_id: int | None = None) -> tuple[User, bool]:
+    """Регистрирует пользователя или возвращает существующего: (user, created).
+
+    Существующий пользователь читается одним SELECT. UPDATE выполняется
+    только для изменившихся полей профиля. Посещение без изменений не чаще
+    чем раз в LAST_VISIT_UPDATE_INTERVAL секунд попадает в last_visit_buffer
+    и записывается пакетно, поэтому повторные запуски приложения не пишут
+    в таблицу пользователей синхронно. Одновременная регистрация одного
+    telegram_id обрабатывается как у get_or_create: проигравший INSERT
+    откатывается к точке сохранения и идет по пути обновления.
+    """
+    profile = {field: value for field, value in profile.items() if field in PROFILE_FIELDS}
+    user = _get_user(telegram_id)
+
+    if user is None:
+        try:
+            with transaction.atomic():
+                user = User.objects.create(
+                    telegram_id=telegram_id,
+                    invited_by_id=inviter_id,
+                    **{**PROFILE_DEFAULTS, **profile},
+                )
+            telegram_id_cache.set(telegram_id, user.pk)
+            return user, True
+        except IntegrityError:
+            user = _get_user(telegram_id)
+            if user is None:
+                raise
+
+    changes = {field: value for field, value in profile.items() if getattr(user, field) != value}
+    if inviter_id and not user.invited_by_id and inviter_id != user.pk:
+        changes['invited_by_id'] = inviter_id
+
+    now = timezone.now()
+    if changes:
+        # Строка все равно перезаписывается, last_visit обновляем тем же UPDATE
+        changes['last_visit'] = now
+        User.objects.filter(pk=user.pk).update(**changes)
+        for field, value in changes.items():
+            setattr(user, field, value)
+    elif _last_visit_is_stale(user, now):
+        last_visit_buffer.mark_seen(user.pk, now)
+        user.last_visit = now
+
+    telegram_id_cache.set(telegram_id, user.pk)
+    return user, False
@@ -1,3 +1,210 @@
+from datetime import timedelta
+from unittest import mock
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .last_visit import LastVisitBuffer, last_visit_buffer
+from wishes.models import Wish, Wishlist
+from .models import User
 
-# Create your tests here.
+REGISTER_URL = '/api/users/register-or-get/'
+
+
+class RegisterOrGetTests(TestCase):
+    """register-or-get пишет в users_user только изменения и не чаще раза в интервал."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.profile = {'telegram_id': 7001, 'first_name': 'Анна', 'username': 'anna', 'language': 'ru'}
+
+    def register(self, **data):
+        """Вызывает register-or-get и возвращает (ответ, выполненные SQL-запросы)."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(REGISTER_URL, {**self.profile, **data}, format='json')
+        writes = [q['sql'] for q in captured.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        return response, writes
+
+    def test_creates_user(self):
+        response, writes = self.register()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(writes), 1)
+        user = User.objects.get(telegram_id=7001)
+        self.assertEqual((user.first_name, user.theme_color), ('Анна', 'light'))
+
+    def test_repeat_launch_does_not_write(self):
+        self.register()
+        response, writes = self.register()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(writes, [])
+
+    def test_updates_only_changed_fields(self):
+        self.register()
+        response, writes = self.register(first_name='Аня')
+        self.assertEqual(response.data['first_name'], 'Аня')
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"first_name"', writes[0])
+        self.assertNotIn('"username"', writes[0])
+
+    def test_stale_last_visit_is_buffered(self):
+        self.register()
+        stale = timezone.now() - timedelta(hours=1)
+        User.objects.filter(telegram_id=7001).update(last_visit=stale)
+        with mock.patch.object(last_visit_buffer, 'interval', 0):
+            response, writes = self.register()
+        self.assertEqual(writes, [])
+        self.assertGreater(response.data['last_visit'], stale.strftime('%Y-%m-%d %H:%M:%S'))
+
+        self.assertEqual(last_visit_buffer.flush(), 1)
+        self.assertGreater(User.objects.get(telegram_id=7001).last_visit, stale)
+
+    def test_save_does_not_touch_last_visit(self):
+        self.register()
+        user = User.objects.get(telegram_id=7001)
+        stale = timezone.now() - timedelta(hours=1)
+        User.objects.filter(pk=user.pk).update(last_visit=stale)
+        user.refresh_from_db()
+        user.hobbies = 'Походы'
+        user.save()
+        user.refresh_from_db()
+        self.assertEqual(user.last_visit, stale)
+
+    def test_inviter_is_set_once(self):
+        inviter = User.objects.create(telegram_id=7002, first_name='Борис')
+        other = User.objects.create(telegram_id=7003, first_name='Вера')
+        response, _ = self.register(start_param=str(inviter.telegram_id))
+        self.assertEqual(response.data['invited_by_telegram_id'], inviter.telegram_id)
+
+        response, writes = self.register(start_param=str(other.telegram_id))
+        self.assertEqual(response.data['invited_by_telegram_id'], inviter.telegram_id)
+        self.assertEqual(writes, [])
+
+    def test_self_invite_is_ignored(self):
+        response, _ = self.register(start_param='7001')
+        self.assertIsNone(response.data['invited_by_telegram_id'])
+
+
+class LastVisitBufferTests(TestCase):
+    """Посещения копятся в памяти и записываются одним UPDATE на пакет."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create(telegram_id=7100 + i, first_name=f'Гость {i}') for i in range(5)]
+
+    def setUp(self):
+        self.buffer = LastVisitBuffer(max_size=100, interval=0, batch_size=3)
+        self.seen_at = timezone.now() + timedelta(minutes=5)
+
+    def test_flush_writes_batches(self):
+        for user in self.users:
+            self.buffer.mark_seen(user.pk, self.seen_at)
+            self.buffer.mark_seen(user.pk, self.seen_at - timedelta(minutes=1))
+        self.assertEqual(len(self.buffer), 5)
+
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.buffer.flush(), 5)
+        self.assertEqual(len(captured), 2)
+        self.assertEqual(len(self.buffer), 0)
+        for user in self.users:
+            user.refresh_from_db()
+            self.assertEqual(user.last_visit, self.seen_at)
+
+    def test_does_not_move_last_visit_back(self):
+        user = self.users[0]
+        self.buffer.mark_seen(user.pk, user.last_visit - timedelta(days=1))
+        self.buffer.flush()
+        self.assertEqual(User.objects.get(pk=user.pk).last_visit, user.last_visit)
+
+    def test_full_buffer_is_flushed(self):
+        buffer = LastVisitBuffer(max_size=2, interval=0)
+        buffer.mark_seen(self.users[0].pk, self.seen_at)
+        with CaptureQueriesContext(connection) as captured:
+            buffer.mark_seen(self.users[1].pk, self.seen_at)
+        self.assertEqual(len(captured), 1)
+        self.assertEqual(len(buffer), 0)
+
+
+class FeedTests(TestCase):
+    """Лента подписок: курсорная пагинация без пропусков и постоянное число запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(telegram_id=7200, first_name='Читатель')
+        cls.stranger = User.objects.create(telegram_id=7201, first_name='Чужой')
+        cls.add_owners(3)
+        foreign = Wishlist.objects.create(user=cls.stranger, name='Чужой')
+        Wish.objects.create(wishlist=foreign, user=cls.stranger, title='Не в ленте')
+
+    @classmethod
+    def add_owners(cls, count: int) -> None:
+        """Подписывает читателя на count новых владельцев с тремя желаниями у каждого.
+
+        Желания разных владельцев создаются с одинаковым created_at, чтобы
+        порядок на границах страниц решал id.
+        """
+        created_at = timezone.now()
+        start = User.objects.count()
+        for i in range(count):
+            owner = User.objects.create(telegram_id=7300 + start + i, first_name=f'Друг {start + i}')
+            wishlist = Wishlist.objects.create(user=owner, name='Праздник')
+            for minutes in range(3):
+                wish = Wish.objects.create(wishlist=wishlist, user=owner, title=f'Желание {minutes}')
+                Wish.objects.filter(pk=wish.pk).update(created_at=created_at - timedelta(minutes=minutes))
+            cls.reader.subscriptions.add(owner)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = f'/api/users/{self.reader.id}/feed/'
+
+    def fetch(self, **params):
+        """Запрашивает страницу ленты и возвращает (ответ, число SQL-запросов)."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url, params)
+        return response, len(captured)
+
+    def walk(self, limit: int) -> list[list[int]]:
+        """Проходит все страницы ленты и возвращает id желаний каждой страницы."""
+        pages, params = [], {'limit': limit}
+        while True:
+            response, _ = self.fetch(**params)
+            self.assertEqual(response.status_code, 200)
+            ids = []
+            for group in response.data['groups']:
+                self.assertTrue(all(wish['user'] == group['user']['id'] for wish in group['wishes']))
+                ids.extend(wish['id'] for wish in group['wishes'])
+            pages.append(ids)
+            if response.data['next_cursor'] is None:
+                return pages
+            params = {'limit': limit, 'cursor': response.data['next_cursor']}
+
+    def test_pages_cover_feed_without_duplicates_or_gaps(self):
+        expected = list(
+            Wish.objects.filter(user__subscribers=self.reader)
+            .order_by('-created_at', '-id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(len(expected), 9)
+        for limit in (1, 2, 4, 9, 100):
+            with self.subTest(limit=limit):
+                # Внутри страницы желания сгруппированы по владельцам, поэтому
+                # сравнивается состав каждой страницы, а не порядок
+                pages = self.walk(limit)
+                self.assertEqual(
+                    [sorted(ids) for ids in pages],
+                    [sorted(expected[i:i + limit]) for i in range(0, len(expected), limit)],
+                )
+
+    def test_query_count_does_not_grow_with_subscriptions(self):
+        _, queries = self.fetch(limit=100)
+        self.add_owners(5)
+        response, more_queries = self.fetch(limit=100)
+        self.assertEqual(len(response.data['groups']), 8)
+        self.assertEqual(more_queries, queries)
+
+    def test_invalid_params_return_400(self):
+        for params in ({'limit': 'many'}, {'cursor': 'not-a-cursor'}, {'cursor': ''.join(['x'] * 40)}):
+            with self.subTest(params=params):
+                response, _ = self.fetch(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
@@ -3,12 +3,28 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.request import Request
 from django.shortcuts import get_object_or_404
+from django.db.models import prefetch_related_objects
+from . import services
+from .identity import resolve_user_id
 from .models import User
 from .serializers import (
     UserSerializer,
     UserCreateSerializer,
     UserUpdateSerializer,
 )
+from wishes.models import Wish
+from wishes.pagination import cursor_values, decode_cursor, encode_cursor, keyset_filter
+from wishes.serializers import WishSerializer
+from wishes.views import WISH_SELECT_RELATED
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Размер страницы ленты по умолчанию и максимально допустимый
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+# Порядок ленты: от новых к старым, id для однозначности курсора
+FEED_ORDERING = ['-created_at', '-id']
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -62,12 +78,11 @@ class UserViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'], url_path='register-or-get')
     def register_or_get(self, request: Request) -> Response:
-        """Регистрирует пользователя или возвращает существующего (get_or_create)."""
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        logger.info(f'Получен запрос на регистрацию: {request.data}')
-        
+        """Регистрирует пользователя или возвращает существующего.
+
+        Вызывается при каждом запуске Mini App, поэтому в таблицу пишутся
+        только изменившиеся поля (см. services.register_or_get_user).
+        """
         telegram_id = request.data.get('telegram_id')
         
         if not telegram_id:
@@ -86,63 +101,17 @@ class UserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Получаем или создаём пользователя
-        user, created = User.objects.get_or_create(
-            telegram_id=telegram_id,
-            defaults={
-                'first_name': request.data.get('first_name', ''),
-                'last_name': request.data.get('last_name', ''),
-                'username': request.data.get('username', ''),
-                'photo_url': request.data.get('photo_url', ''),
-                'language': request.data.get('language', 'ru'),
-                'theme_color': request.data.get('theme_color', 'light'),
-            }
-        )
+        # Обработка пригласившего (start_param); нельзя пригласить самого себя
+        inviter_id = None
+        try:
+            inviter_telegram_id = int(request.data.get('start_param'))
+            if inviter_telegram_id != telegram_id:
+                inviter_id = resolve_user_id(inviter_telegram_id, request)
+        except (ValueError, TypeError):
+            pass  # start_param не передан или некорректен, пропускаем
         
-        # Если пользователь уже существовал, обновляем его данные (включая photo_url)
-        if not created:
-            updated = False
-            if 'first_name' in request.data and user.first_name != request.data['first_name']:
-                user.first_name = request.data['first_name']
-                updated = True
-            if 'last_name' in request.data and user.last_name != request.data.get('last_name', ''):
-                user.last_name = request.data.get('last_name', '')
-                updated = True
-            if 'username' in request.data and user.username != request.data.get('username', ''):
-                user.username = request.data.get('username', '')
-                updated = True
-            # Обновляем photo_url если он передан и отличается от текущего, или если у пользователя его нет
-            if 'photo_url' in request.data:
-                new_photo_url = request.data.get('photo_url', '')
-                if not user.photo_url or user.photo_url != new_photo_url:
-                    user.photo_url = new_photo_url
-                    updated = True
-            if 'language' in request.data and user.language != request.data['language']:
-                user.language = request.data['language']
-                updated = True
-            if 'theme_color' in request.data and user.theme_color != request.data['theme_color']:
-                user.theme_color = request.data['theme_color']
-                updated = True
-            
-            # Всегда сохраняем пользователя, чтобы обновить last_visit (auto_now=True)
-            user.save()
-        
-        # Обработка пригласившего (start_param)
-        start_param = request.data.get('start_param')
-        if start_param and not user.invited_by:
-            try:
-                inviter_telegram_id = int(start_param)
-                if inviter_telegram_id != telegram_id:  # Нельзя пригласить самого себя
-                    try:
-                        inviter = User.objects.get(telegram_id=inviter_telegram_id)
-                        user.invited_by = inviter
-                        user.save()
-                    except User.DoesNotExist:
-                        pass  # Пригласивший не найден, пропускаем
-            except (ValueError, TypeError):
-                pass  # Некорректный start_param, пропускаем
-        
-        logger.info(f'Пользователь {"создан" if created else "найден"}: telegram_id={telegram_id}, id={user.id}')
+        user, created = services.register_or_get_user(telegram_id, request.data, inviter_id)
+        logger.debug(f'Пользователь {"создан" if created else "найден"}: telegram_id={telegram_id}, id={user.id}')
         
         serializer = self.get_serializer(user)
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
@@ -155,6 +124,67 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = UserSerializer(subscriptions, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'], url_path='feed')
+    def feed(self, request: Request, pk: int = None) -> Response:
+        """Получает ленту желаний из подписок пользователя одним запросом.
+
+        Желания сортируются по (created_at, id) от новых к старым и
+        группируются по владельцам. Пагинация курсорная: в ответе
+        возвращается next_cursor, который передается параметром cursor.
+        """
+        user = get_object_or_404(User, pk=pk)
+        
+        try:
+            limit = int(request.query_params.get('limit', FEED_PAGE_SIZE))
+        except ValueError:
+            return Response(
+                {'error': 'Некорректный limit'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, FEED_MAX_PAGE_SIZE))
+        
+        # Желания всех пользователей, на которых подписан user, одним JOIN
+        wishes = (
+            Wish.objects
+            .filter(user__subscribers=user)
+            .select_related(*WISH_SELECT_RELATED, 'user__invited_by')
+            .order_by(*FEED_ORDERING)
+        )
+        
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                values = decode_cursor(cursor, len(FEED_ORDERING))
+            except ValueError:
+                return Response(
+                    {'error': 'Некорректный cursor'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            wishes = wishes.filter(keyset_filter(FEED_ORDERING, values))
+        
+        # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+        page = list(wishes[:limit + 1])
+        has_next = len(page) > limit
+        page = page[:limit]
+        
+        # Группируем по владельцам в порядке появления самого свежего желания
+        groups = {}
+        for wish in page:
+            groups.setdefault(wish.user_id, (wish.user, []))[1].append(wish)
+        owners = [owner for owner, _ in groups.values()]
+        prefetch_related_objects(owners, 'subscriptions')
+        
+        return Response({
+            'groups': [
+                {
+                    'user': UserSerializer(owner).data,
+                    'wishes': WishSerializer(owner_wishes, many=True).data,
+                }
+                for owner, owner_wishes in groups.values()
+            ],
+            'next_cursor': encode_cursor(cursor_values(page[-1], FEED_ORDERING)) if has_next else None,
+        })
+    
     @action(detail=True, methods=['get'], url_path='subscribers')
     def subscribers(self, request: Request, pk: int = None) -> Response:
         """Получает список подписчиков пользователя с полными данными."""
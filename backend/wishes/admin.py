@@ -23,10 +23,15 @@ class WishlistAdmin(admin.ModelAdmin):
     formatted_updated_at.short_description = 'Дата обновления'
     formatted_updated_at.admin_order_field = 'updated_at'
     
+    def get_queryset(self, request):
+        """Добавляет количество желаний в основной запрос списка."""
+        return super().get_queryset(request).select_related('user').with_wish_counts()
+    
     def wishes_count(self, obj):
         """Возвращает количество желаний в вишлисте."""
-        return obj.wishes.count()
+        return obj.wishes_count
     wishes_count.short_description = 'Количество желаний'
+    wishes_count.admin_order_field = 'wishes_count'
     
     def formatted_event_date(self, obj):
         """Форматирует дату события."""
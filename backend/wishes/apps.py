@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class WishesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wishes'
+
+    def ready(self):
+        # Регистрирует сигналы сброса кэша ответов, отметок об удалении и событий
+        from . import caching, events, sync  # noqa: F401
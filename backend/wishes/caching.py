@@ -0,0 +1,239 @@
+"""
+Кэш ответов списков желаний и вишлистов.
+
+Кэшируются списки, которые друзья читают чаще всего:
+    /api/wishes/?wishlist_id=X    — область вишлиста X;
+    /api/wishlists/?user_id=X     — область владельца X.
+
+Ключ ответа содержит версию области. Сохранение или удаление Wish/Wishlist
+(сигналы post_save/post_delete) и условные UPDATE в services увеличивают
+версию затронутых областей, после чего старые ответы больше не читаются и
+истекают по RESPONSE_CACHE_TIMEOUT. ETag строится из той же версии, поэтому
+If-None-Match проверяется без запросов к БД и без сериализации.
+
+Версии хранятся в кэше Django (settings.CACHES). С кэшем в памяти процесса
+каждый воркер видит только свои инвалидации, поэтому при нескольких воркерах
+нужен общий бэкенд (CACHE_URL=redis://...), иначе чужие изменения видны
+с задержкой до RESPONSE_CACHE_TIMEOUT.
+
+ConditionalGetMixin отвечает 304 на If-None-Match для остальных списков и
+на If-None-Match/If-Modified-Since для отдельных объектов. Отпечаток считается одним
+агрегирующим запросом: MAX(updated_at) по объектам и связанным вишлистам
+и желаниям, их количество и User.wishes_changed_at владельцев — время
+последнего удаления или перемещения, которое не отражается в updated_at.
+"""
+
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, parse_etags
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from users.models import User
+from .models import Wish, Wishlist
+
+WISHLIST_SCOPE = 'wishlist'
+OWNER_SCOPE = 'owner'
+
+KEY_PREFIX = 'response-cache'
+
+
+def _version_key(scope: str, scope_id: int) -> str:
+    return f'{KEY_PREFIX}:version:{scope}:{scope_id}'
+
+
+def get_version(scope: str, scope_id: int) -> int:
+    """Возвращает текущую версию области, создавая ее при первом обращении.
+
+    Начальная версия берется из времени, чтобы после вытеснения ключа версии
+    не совпасть с версией уже закэшированных ответов.
+    """
+    key = _version_key(scope, scope_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(scope: str, scope_id: int) -> None:
+    """Увеличивает версию области, делая ее закэшированные ответы недоступными."""
+    key = _version_key(scope, scope_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(wishlist_ids=(), owner_ids=()) -> None:
+    """Сбрасывает кэш вишлистов и владельцев.
+
+    Версия увеличивается сразу и еще раз после коммита: иначе параллельный
+    запрос успел бы закэшировать еще не закоммиченное состояние под новой
+    версией.
+    """
+    scopes = [(WISHLIST_SCOPE, pk) for pk in wishlist_ids if pk]
+    scopes += [(OWNER_SCOPE, pk) for pk in owner_ids if pk]
+
+    def bump():
+        for scope, scope_id in scopes:
+            bump_version(scope, scope_id)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidate_wish(pk: int) -> None:
+    """Сбрасывает кэш для желания, измененного через queryset.update()."""
+    scope = Wish.objects.filter(pk=pk).values_list('wishlist_id', 'user_id').first()
+    if scope:
+        invalidate(wishlist_ids=[scope[0]], owner_ids=[scope[1]])
+
+
+def touch_owner(user_id: int) -> None:
+    """Отмечает удаление или перемещение у владельца (User.wishes_changed_at)."""
+    User.objects.filter(pk=user_id).update(wishes_changed_at=timezone.now())
+
+
+@receiver(post_save, sender=Wish)
+@receiver(post_delete, sender=Wish)
+def invalidate_wish_scopes(sender, instance, **kwargs):
+    """Желание входит в список вишлиста и в счетчики вишлистов владельца."""
+    invalidate(wishlist_ids=[instance.wishlist_id], owner_ids=[instance.user_id])
+
+
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def invalidate_wishlist_scopes(sender, instance, **kwargs):
+    """Название и дата вишлиста выводятся и в списке его желаний."""
+    invalidate(wishlist_ids=[instance.pk], owner_ids=[instance.user_id])
+
+
+@receiver(post_delete, sender=Wish)
+@receiver(post_delete, sender=Wishlist)
+def touch_owner_on_delete(sender, instance, **kwargs):
+    """Удаление не меняет updated_at оставшихся объектов, поэтому отмечается у владельца."""
+    touch_owner(instance.user_id)
+
+
+class CachedListMixin:
+    """Миксин ViewSet: кэширует list() для запросов с параметром cache_scope_param.
+
+    Ответ отдается с ETag и Cache-Control: no-cache, поэтому браузер сам
+    присылает If-None-Match и получает 304, пока область не изменилась.
+    """
+
+    cache_scope: str
+    cache_scope_param: str
+
+    def list(self, request, *args, **kwargs):
+        try:
+            scope_id = int(request.query_params[self.cache_scope_param])
+        except (KeyError, ValueError):
+            return super().list(request, *args, **kwargs)
+
+        version = get_version(self.cache_scope, scope_id)
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = hashlib.md5(f'{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+        etag = f'"{self.cache_scope}-{scope_id}-{version}-{digest[:16]}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        key = f'{KEY_PREFIX}:{self.cache_scope}:{scope_id}:{version}:{digest}'
+        data = cache.get(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+        return Response(data, headers=headers)
+
+
+class ConditionalGetMixin:
+    """Миксин ViewSet: условные GET для list() и retrieve() по отпечатку данных.
+
+    fingerprint_fields — поля, по которым берется MAX(); вместе с количеством
+    объектов они образуют ETag, а наибольшее значение отдается в Last-Modified.
+    Списки, которые обслуживает CachedListMixin, проверяются по версии кэша
+    и здесь пропускаются.
+
+    Для списков Last-Modified не отдается и If-Modified-Since не проверяется:
+    строка, выпавшая из выборки (например, снятый резерв при
+    ?reserved_by_id=&status=reserved), не меняет MAX(updated_at) оставшихся,
+    и клиент получил бы устаревший 304. Изменение количества учитывает ETag.
+    """
+
+    fingerprint_fields: tuple[str, ...] = ('updated_at',)
+
+    def get_fingerprint_queryset(self):
+        """Queryset, по которому считается отпечаток (по умолчанию — отфильтрованный список)."""
+        return self.filter_queryset(self.get_queryset())
+
+    def get_validators(self, queryset) -> tuple[str, object]:
+        """Возвращает (ETag, Last-Modified) для queryset одним запросом."""
+        aggregates = {f'max_{i}': Max(field) for i, field in enumerate(self.fingerprint_fields)}
+        values = queryset.order_by().aggregate(count=Count('pk', distinct=True), **aggregates)
+        timestamps = [value for name, value in values.items() if name != 'count' and value is not None]
+        last_modified = max(timestamps) if timestamps else None
+
+        query = urlencode(sorted(self.request.query_params.lists()), doseq=True)
+        raw = f'{self.request.path}?{query}|{values["count"]}|' + '|'.join(
+            value.isoformat() if value else '' for name, value in values.items() if name != 'count'
+        )
+        etag = f'"{hashlib.md5(raw.encode()).hexdigest()}"'
+        return etag, last_modified
+
+    def conditional_response(self, queryset, respond, use_last_modified: bool = True):
+        """Отвечает 304, если клиент уже получил текущие данные, иначе вызывает respond().
+
+        use_last_modified=False — только ETag (для списков, см. docstring класса).
+        """
+        etag, last_modified = self.get_validators(queryset)
+        timestamp = int(last_modified.timestamp()) if last_modified and use_last_modified else None
+        response = get_conditional_response(self.request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = respond()
+        elif response.status_code == status.HTTP_304_NOT_MODIFIED:
+            # Ответ Django заменяем на Response DRF, чтобы прошел через finalize_response
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if getattr(self, 'cache_scope_param', None) in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            self.get_fingerprint_queryset(),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+            use_last_modified=False,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        try:
+            queryset = self.get_fingerprint_queryset().filter(**lookup)
+        except (TypeError, ValueError):
+            # Некорректный pk: get_object() ответит 404
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            queryset,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
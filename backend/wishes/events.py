@@ -0,0 +1,255 @@
+"""
+События желаний в реальном времени (/api/events/?wishlist_id=...).
+
+Клиент открывает SSE-поток (text/event-stream) для вишлистов, которые он
+смотрит, и получает события вида
+    {"type": "reserved", "wish_id": 1, "wishlist_id": 2, "user_id": 3, "status": "reserved"}
+Типы: created, updated, deleted (сигналы и обновление через API), reserved,
+fulfilled, unfulfilled (действия WishViewSet) и moved — у него есть
+from_wishlist_id, и событие получают подписчики обоих вишлистов.
+Событие reordered — одно на вишлист, с новым порядком wish_ids.
+
+Событие — только уведомление: актуальные данные клиент забирает через
+/api/wishes/changes/ со своим токеном since. Событие resync означает, что
+клиент не успевал читать поток и часть событий пропущена. Переподключение
+EventSource выполняет сам, после него тоже нужна синхронизация.
+
+События отправляются после коммита транзакции (transaction.on_commit)
+через бэкенд рассылки settings.EVENTS_BACKEND:
+    LocalBackend — в пределах процесса, подходит для одного воркера;
+    RedisBackend — через Redis pub/sub (пакет redis), каждый воркер
+                   слушает канал и раздает события своим подписчикам.
+Поток держит соединение открытым, поэтому приложение должно работать
+под ASGI (config.asgi); под WSGI каждый поток занимает воркер целиком.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Wish
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+RESERVED = 'reserved'
+FULFILLED = 'fulfilled'
+UNFULFILLED = 'unfulfilled'
+MOVED = 'moved'
+REORDERED = 'reordered'
+# Служебное событие: очередь подписчика переполнилась
+RESYNC = 'resync'
+
+
+class Subscription:
+    """Подписка одного потока на события набора вишлистов.
+
+    Создается в цикле событий потока; события доставляются в его очередь
+    из любого потока через call_soon_threadsafe.
+    """
+
+    def __init__(self, wishlist_ids, max_size: int):
+        self.wishlist_ids = frozenset(wishlist_ids)
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(max_size)
+
+    def deliver(self, event: dict) -> None:
+        """Кладет событие в очередь; при переполнении заменяет ее событием resync."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': RESYNC})
+
+    async def get(self, timeout: float) -> dict | None:
+        """Ждет следующее событие не дольше timeout секунд (None — таймаут)."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broadcaster:
+    """Реестр подписок процесса: раздает событие подписчикам его вишлистов."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscriptions: dict[int, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(set().union(*self._subscriptions.values()))
+
+    def subscribe(self, wishlist_ids) -> Subscription:
+        """Подписывает на вишлисты; вызывается из цикла событий потока."""
+        subscription = Subscription(wishlist_ids, self.queue_size)
+        with self._lock:
+            for wishlist_id in subscription.wishlist_ids:
+                self._subscriptions.setdefault(wishlist_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for wishlist_id in subscription.wishlist_ids:
+                subscribers = self._subscriptions.get(wishlist_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[wishlist_id]
+
+    def dispatch(self, event: dict) -> None:
+        """Доставляет событие каждому подписчику один раз."""
+        wishlist_ids = {event.get('wishlist_id'), event.get('from_wishlist_id')}
+        with self._lock:
+            targets = set()
+            for wishlist_id in wishlist_ids:
+                targets |= self._subscriptions.get(wishlist_id, set())
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Цикл событий потока уже закрыт
+                self.unsubscribe(subscription)
+
+
+class LocalBackend:
+    """Рассылка внутри процесса: события видят подписчики этого же воркера."""
+
+    def __init__(self, broadcaster: Broadcaster):
+        self.broadcaster = broadcaster
+
+    def listen(self) -> None:
+        """Готовит прием событий перед первой подпиской (здесь ничего не нужно)."""
+
+    def publish(self, event: dict) -> None:
+        self.broadcaster.dispatch(event)
+
+
+class RedisBackend:
+    """Рассылка через Redis pub/sub для нескольких воркеров и серверов.
+
+    publish() отправляет событие в канал, фоновый поток каждого процесса
+    слушает канал и раздает события локальным подписчикам. Поток
+    запускается при первой подписке, поэтому процессы без потоков событий
+    только публикуют.
+    """
+
+    channel = 'wish-events'
+
+    def __init__(self, broadcaster: Broadcaster):
+        import redis
+
+        self.broadcaster = broadcaster
+        self.client = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def listen(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='wish-events-listener', daemon=True)
+                self._thread.start()
+
+    def publish(self, event: dict) -> None:
+        self.client.publish(self.channel, json.dumps(event))
+
+    def _run(self) -> None:
+        """Цикл фонового потока; после обрыва соединения подписывается заново."""
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.broadcaster.dispatch(json.loads(message['data']))
+            except Exception:
+                logger.exception('[RedisBackend] Соединение с Redis потеряно, переподключаюсь')
+                time.sleep(1)
+
+
+broadcaster = Broadcaster(queue_size=settings.EVENTS_QUEUE_SIZE)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Возвращает бэкенд рассылки settings.EVENTS_BACKEND (создается при первом вызове)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.EVENTS_BACKEND)(broadcaster)
+    return _backend
+
+
+def send(event: dict) -> None:
+    """Отправляет событие сразу; ошибка рассылки не ломает запрос."""
+    try:
+        get_backend().publish(event)
+    except Exception:
+        logger.exception(f'[events] Не удалось отправить событие {event.get("type")}')
+
+
+def publish_event(event: dict) -> None:
+    """Отправляет событие после коммита текущей транзакции."""
+    transaction.on_commit(lambda: send(event))
+
+
+def publish(event_type: str, wish: Wish, **extra) -> None:
+    """Отправляет событие о желании после коммита текущей транзакции."""
+    publish_event({
+        'type': event_type,
+        'wish_id': wish.pk,
+        'wishlist_id': wish.wishlist_id,
+        'user_id': wish.user_id,
+        'status': wish.status,
+        **extra,
+    })
+
+
+def format_event(event: dict) -> str:
+    """Кадр SSE с событием."""
+    return f'data: {json.dumps(event)}\n\n'
+
+
+async def stream(wishlist_ids):
+    """Асинхронный генератор SSE-потока для StreamingHttpResponse.
+
+    Пока событий нет, раз в EVENTS_HEARTBEAT_INTERVAL секунд отправляется
+    комментарий, чтобы прокси не закрывали соединение. При отключении
+    клиента генератор отменяется и подписка удаляется.
+    """
+    get_backend().listen()
+    subscription = broadcaster.subscribe(wishlist_ids)
+    try:
+        # Первый кадр сразу отправляет заголовки ответа
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        while True:
+            event = await subscription.get(settings.EVENTS_HEARTBEAT_INTERVAL)
+            yield format_event(event) if event is not None else ': ping\n\n'
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+@receiver(post_save, sender=Wish)
+def publish_created(sender, instance, created, **kwargs):
+    if created:
+        publish(CREATED, instance)
+
+
+@receiver(post_delete, sender=Wish)
+def publish_deleted(sender, instance, **kwargs):
+    publish(DELETED, instance)
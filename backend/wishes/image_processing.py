@@ -0,0 +1,159 @@
+"""
+Обработка изображений желаний в процессах пула (см. wishes/images.py).
+
+Модуль не импортирует Django: дочерние процессы запускаются методом spawn
+и импортируют только его. Функции работают с путями к файлам и не трогают БД.
+
+Файлы хранятся по содержимому: имя — SHA-256 файла, каталоги — первые
+два и следующие два символа хэша (<root>/ab/cd/abcd...jpg). Одинаковые
+файлы хранятся один раз, а файл по имени никогда не меняется.
+"""
+
+import base64
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+# Опциональный импорт Pillow для обработки изображений
+try:
+    from PIL import Image, ImageOps, features
+    HAS_PIL = True
+    HAS_WEBP = features.check('webp')
+except ImportError:
+    HAS_PIL = False
+    HAS_WEBP = False
+    Image = ImageOps = None
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+
+def to_rgb(img):
+    """Переводит изображение в RGB; прозрачность заменяется белым фоном."""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        rgb_img.paste(img, mask=img.split()[-1])
+        return rgb_img
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+# Суффикс временных файлов в корне хранилища (их удаляет cleanup_images)
+TEMPORARY_SUFFIX = '.tmp'
+
+
+def content_name(digest: str, extension: str) -> str:
+    """Имя файла с хэшем digest относительно корня хранилища."""
+    return f'{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def store(root: str, temporary: str, digest: str, extension: str) -> str:
+    """Переносит записанный временный файл в хранилище и возвращает его имя.
+
+    Если такой файл уже есть, временный удаляется, а у существующего
+    обновляется время изменения, чтобы cleanup_images не счел его старым.
+    """
+    name = content_name(digest, extension)
+    path = os.path.join(root, name)
+    if os.path.exists(path):
+        os.remove(temporary)
+        os.utime(path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temporary, path)
+    return name
+
+
+def store_bytes(root: str, data: bytes, extension: str) -> str:
+    """Записывает data в хранилище (если такого файла еще нет) и возвращает имя."""
+    fd, temporary = tempfile.mkstemp(dir=root, suffix=TEMPORARY_SUFFIX)
+    with os.fdopen(fd, 'wb') as destination:
+        destination.write(data)
+    return store(root, temporary, hashlib.sha256(data).hexdigest(), extension)
+
+
+def _save(img, root: str, fmt: str, quality: int) -> dict:
+    """Кодирует img без метаданных (EXIF, ICC) и сохраняет в хранилище.
+
+    Файл пишется во временный и переименовывается, поэтому по адресу
+    никогда не отдается недописанное изображение.
+    """
+    buffer = BytesIO()
+    if fmt == 'WEBP':
+        img.save(buffer, fmt, quality=quality, method=4)
+    else:
+        img.save(buffer, fmt, quality=quality, optimize=True, progressive=True)
+    return {
+        'name': store_bytes(root, buffer.getvalue(), EXTENSIONS[fmt]),
+        'width': img.width,
+        'height': img.height,
+        'type': MIME_TYPES[fmt],
+    }
+
+
+def make_placeholder(img, size: int, width: int, height: int) -> dict:
+    """Заглушка для мгновенной отрисовки: JPEG size px как data URL, основной цвет и размеры.
+
+    Основной цвет — самый частый после квантования до 4 цветов.
+    """
+    small = img.copy()
+    small.thumbnail((size, size), Image.Resampling.BOX)
+    buffer = BytesIO()
+    small.save(buffer, 'JPEG', quality=50, optimize=True)
+    quantized = small.quantize(colors=4)
+    _, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+    return {
+        'data_url': f"data:image/jpeg;base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}",
+        'color': f'#{red:02x}{green:02x}{blue:02x}',
+        'width': width,
+        'height': height,
+    }
+
+
+def process_image(
+    source: str,
+    root: str,
+    max_dimension: int,
+    quality: int,
+    sizes: tuple[int, ...] = (),
+    webp_quality: int = 80,
+    placeholder_size: int = 20,
+) -> dict:
+    """Декодирует source и сохраняет в хранилище root основной JPEG и уменьшенные копии.
+
+    Ориентация из EXIF применяется к пикселям, метаданные не сохраняются.
+    Для каждого размера из sizes (по большей стороне, меньше исходного)
+    сохраняется JPEG и, если Pillow поддерживает WebP, WebP. Копии
+    уменьшаются каскадом от предыдущей, а не от оригинала, заглушка
+    (make_placeholder) — от самой маленькой копии.
+
+    Возвращает {'variants': описания файлов (имя относительно root, ширина,
+    высота, тип), первым идет основной JPEG; 'placeholder': заглушка}.
+    """
+    with Image.open(source) as img:
+        # JPEG декодируется сразу в уменьшенном масштабе, если он больше нужного
+        img.draft('RGB', (max_dimension, max_dimension))
+        img = to_rgb(ImageOps.exif_transpose(img))
+    if max(img.size) > max_dimension:
+        img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    width, height = img.size
+    variants = [_save(img, root, 'JPEG', quality)]
+
+    for size in sorted(sizes, reverse=True):
+        if size >= max(img.size):
+            continue
+        img = img.copy()
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants.append(_save(img, root, 'JPEG', quality))
+        if HAS_WEBP:
+            variants.append(_save(img, root, 'WEBP', webp_quality))
+    return {
+        'variants': variants,
+        'placeholder': make_placeholder(img, placeholder_size, width, height),
+    }
@@ -0,0 +1,354 @@
+"""
+Асинхронная обработка загруженных изображений желаний.
+
+upload-image сохраняет исходный файл в хранилище MEDIA_ROOT/wish_images/
+и сразу отвечает 202 с адресом оригинала и id загрузки (ImageUpload).
+Декодирование, перевод в RGB, уменьшение и кодирование выполняются в
+пуле процессов (image_processing.process_image), поэтому воркер веб-сервера
+не занят на время обработки. Кроме основного JPEG (IMAGE_MAX_DIMENSION)
+создаются уменьшенные копии IMAGE_DERIVATIVE_SIZES в JPEG и WebP; они
+записываются в ImageUpload.variants и отдаются в WishSerializer как srcset.
+Там же один раз вычисляется заглушка (ImageUpload.placeholder): картинка
+IMAGE_PLACEHOLDER_SIZE px в data URL, основной цвет и размеры — клиент
+рисует карточку сразу, без дополнительного запроса.
+
+Очередь ограничена IMAGE_PROCESSING_QUEUE_SIZE загрузками в обработке;
+при заполнении submit() возвращает False, и API отвечает 503. Когда файл
+готов, адрес оригинала заменяется обработанным во всех желаниях, которые
+успели его сохранить, а сериализаторы заменяют его при сохранении позже
+(resolve_image). Желание ссылается на загрузку через Wish.image.
+
+Файлы именуются по SHA-256 содержимого и раскладываются по каталогам
+wish_images/ab/cd/ (см. image_processing.store): повторная загрузка того же
+файла возвращает существующую загрузку без обработки, а одинаковые
+результаты обработки хранятся один раз. Файл по адресу никогда не меняется,
+поэтому отдается с Cache-Control immutable (views.serve_media).
+
+Оригиналы не удаляются при обработке: клиент мог сохранить их адрес в
+промежутке между проверкой и подменой. Загрузки, на которые не ссылается ни
+одно желание, и их файлы удаляет команда cleanup_images. Загрузки, прерванные
+перезапуском процесса, остаются pending и обрабатываются командой
+process_images. При IMAGE_PROCESSING_WORKERS = 0 пул не запускается и
+изображение обрабатывается в запросе (тесты, отладка).
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import posixpath
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Exists, OuterRef, Q, TextField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from . import caching, events, image_processing
+from .models import ImageUpload, Wish
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = 'wish_images'
+
+# Путь файла хранилища относительно MEDIA_ROOT: wish_images/ab/cd/<sha256>.<ext>
+CONTENT_NAME_RE = re.compile(rf'^{IMAGES_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}\.[a-z]+$')
+
+# Расширения оригиналов по типу файла
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+    'image/gif': '.gif',
+}
+
+
+def media_path(name: str) -> str:
+    """Абсолютный путь файла по пути относительно MEDIA_ROOT."""
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+def _spool(uploaded_file, root: str) -> tuple[str, str]:
+    """Копирует файл во временный файл хранилища по частям; возвращает (путь, SHA-256)."""
+    digest = hashlib.sha256()
+    fd, temporary = tempfile.mkstemp(dir=root, suffix=image_processing.TEMPORARY_SUFFIX)
+    try:
+        with os.fdopen(fd, 'wb') as destination:
+            for chunk in uploaded_file.chunks():
+                digest.update(chunk)
+                destination.write(chunk)
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return temporary, digest.hexdigest()
+
+
+def save_original(uploaded_file, content_type: str, url_prefix: str) -> tuple[ImageUpload, bool]:
+    """Записывает загруженный файл в хранилище по частям, вычисляя его хэш.
+
+    Если такой же файл уже загружали и он не завершился ошибкой, возвращается
+    существующая загрузка. Возвращает (загрузка, создана ли новая).
+    """
+    root = media_path(IMAGES_DIR)
+    os.makedirs(root, exist_ok=True)
+    if getattr(uploaded_file, 'sha256', None):
+        # Файл уже записан в хранилище по частям (uploads.ImageUploadHandler)
+        uploaded_file.close()
+        temporary, digest = uploaded_file.temporary_file_path(), uploaded_file.sha256
+    else:
+        temporary, digest = _spool(uploaded_file, root)
+    return store_original(temporary, digest, content_type, url_prefix)
+
+
+def store_original(temporary: str, digest: str, content_type: str, url_prefix: str) -> tuple[ImageUpload, bool]:
+    """Переносит временный файл хранилища с хэшем digest на место и создает загрузку.
+
+    Возвращает (загрузка, создана ли новая), см. save_original.
+    """
+    name = image_processing.store(media_path(IMAGES_DIR), temporary, digest, EXTENSIONS.get(content_type, ''))
+    original = f'{IMAGES_DIR}/{name}'
+
+    existing = ImageUpload.objects.filter(original=original).exclude(status='failed').order_by('created_at').first()
+    if existing is not None:
+        return existing, False
+
+    # До обработки показывается оригинал
+    upload = ImageUpload(url_prefix=url_prefix, original=original, processed=original)
+    if not image_processing.HAS_PIL:
+        logger.warning('Pillow не установлен, изображение сохраняется без обработки')
+        upload.status = 'ready'
+    upload.save()
+    return upload, True
+
+
+def processing_args(upload: ImageUpload) -> tuple:
+    """Аргументы image_processing.process_image для загрузки."""
+    return (
+        media_path(upload.original),
+        media_path(IMAGES_DIR),
+        settings.IMAGE_MAX_DIMENSION,
+        settings.IMAGE_JPEG_QUALITY,
+        settings.IMAGE_DERIVATIVE_SIZES,
+        settings.IMAGE_WEBP_QUALITY,
+        settings.IMAGE_PLACEHOLDER_SIZE,
+    )
+
+
+def complete(upload_id, error: BaseException | None = None, result: dict | None = None) -> ImageUpload:
+    """Отмечает результат обработки и подменяет адрес оригинала в желаниях.
+
+    result — результат process_image; имена файлов в нем относительны
+    хранилища, первым идет основной JPEG.
+    """
+    upload = ImageUpload.objects.get(pk=upload_id)
+    if error is not None:
+        logger.warning(f'[images] Не удалось обработать {upload.original}: {error}')
+        upload.status = 'failed'
+        upload.error = str(error) or error.__class__.__name__
+        upload.save(update_fields=['status', 'error', 'updated_at'])
+        return upload
+
+    result = result or {}
+    upload.status = 'ready'
+    upload.variants = [{**variant, 'name': f"{IMAGES_DIR}/{variant['name']}"} for variant in result.get('variants', ())]
+    if upload.variants:
+        upload.processed = upload.variants[0]['name']
+    upload.placeholder = result.get('placeholder')
+    upload.save(update_fields=['status', 'processed', 'variants', 'placeholder', 'updated_at'])
+    attach(upload)
+    return upload
+
+
+def attach(upload: ImageUpload) -> int:
+    """Переводит желания с адресом оригинала на обработанный файл одним UPDATE;
+    сбрасывает кэш и сообщает клиентам."""
+    wishes = list(Wish.objects.filter(image_url=upload.original_url).only('id', 'wishlist_id', 'user_id', 'status'))
+    if not wishes:
+        return 0
+    Wish.objects.filter(pk__in=[wish.pk for wish in wishes]).update(
+        image_url=upload.image_url,
+        image=upload,
+        updated_at=timezone.now(),
+    )
+    caching.invalidate(
+        wishlist_ids={wish.wishlist_id for wish in wishes},
+        owner_ids={wish.user_id for wish in wishes},
+    )
+    for wish in wishes:
+        events.publish(events.UPDATED, wish)
+    return len(wishes)
+
+
+def resolve_image(url: str | None) -> tuple[str | None, ImageUpload | None]:
+    """Находит загрузку по адресу ее оригинала или обработанного файла.
+
+    Возвращает (адрес для сохранения, загрузка): для готовой загрузки адрес
+    оригинала заменяется обработанным. Для внешних адресов — (url, None).
+    """
+    return resolve_images([url])[url]
+
+
+def resolve_images(urls) -> dict:
+    """Как resolve_image для нескольких адресов, одним запросом: {url: (адрес, загрузка)}.
+
+    Значения, не являющиеся строкой или None, пропускаются (их отклонит сериализатор).
+    """
+    urls = [url for url in urls if url is None or isinstance(url, str)]
+    names = {}
+    for url in urls:
+        if url and f'/{IMAGES_DIR}/' in url:
+            names[url] = f"{IMAGES_DIR}/{url.split(f'/{IMAGES_DIR}/', 1)[1]}"
+
+    found = {}
+    if names:
+        wanted = set(names.values())
+        for upload in ImageUpload.objects.filter(Q(original__in=wanted) | Q(processed__in=wanted)):
+            for name in {upload.original, upload.processed}:
+                found.setdefault(name, []).append(upload)
+
+    resolved = {}
+    for url in urls:
+        # Один файл может принадлежать нескольким загрузкам: предпочитаем готовую
+        candidates = found.get(names.get(url), [])
+        upload = min(candidates, key=lambda upload: upload.status != 'ready', default=None)
+        resolved[url] = (url, None) if upload is None else (upload.image_url, upload)
+    return resolved
+
+
+def is_content_addressed(name: str) -> bool:
+    """True, если файл назван по содержимому и никогда не изменится."""
+    return CONTENT_NAME_RE.match(name) is not None
+
+
+def upload_files(upload: ImageUpload) -> set[str]:
+    """Файлы загрузки относительно MEDIA_ROOT."""
+    return {upload.original, upload.processed, *(variant['name'] for variant in upload.variants)}
+
+
+def is_file_used(name: str) -> bool:
+    """True, если файл принадлежит какой-либо загрузке.
+
+    Имя хэша уникально, поэтому для вариантов достаточно поиска подстроки
+    в JSON (запрос одинаково работает в SQLite и PostgreSQL).
+    """
+    digest = posixpath.basename(name).split('.', 1)[0]
+    return (
+        ImageUpload.objects
+        .annotate(variants_text=Cast('variants', TextField()))
+        .filter(Q(original=name) | Q(processed=name) | Q(variants_text__contains=digest))
+        .exists()
+    )
+
+
+def unreferenced_uploads(before):
+    """Загрузки, созданные раньше before, на которые не ссылается ни одно желание.
+
+    Ссылкой считается Wish.image и image_url с адресом оригинала или
+    обработанного файла (желания, сохраненные до появления Wish.image).
+    """
+    return (
+        ImageUpload.objects
+        .filter(created_at__lt=before)
+        .exclude(Exists(Wish.objects.filter(image=OuterRef('pk'))))
+        .exclude(Exists(Wish.objects.filter(image_url__endswith=OuterRef('original'))))
+        .exclude(Exists(Wish.objects.filter(image_url__endswith=OuterRef('processed'))))
+    )
+
+
+def discard(upload: ImageUpload, before: float | None = None) -> int:
+    """Удаляет загрузку и ее файлы, которые не нужны другим загрузкам.
+
+    before — время (timestamp): файлы, измененные позже, не удаляются, так как
+    их могла только что получить новая загрузка (image_processing.store
+    обновляет время изменения). Возвращает число удаленных файлов.
+    """
+    upload.delete()
+    removed = 0
+    for name in upload_files(upload):
+        path = media_path(name)
+        try:
+            if before is not None and os.path.getmtime(path) >= before:
+                continue
+            if not is_file_used(name):
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def process_now(upload: ImageUpload) -> ImageUpload:
+    """Обрабатывает загрузку в текущем процессе."""
+    try:
+        result = image_processing.process_image(*processing_args(upload))
+    except Exception as e:
+        return complete(upload.pk, e)
+    return complete(upload.pk, result=result)
+
+
+class ImagePipeline:
+    """Пул процессов обработки изображений с ограниченной очередью."""
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(queue_size, 1))
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: fork процесса с потоками (last_visit, события) небезопасен
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    max_tasks_per_child=settings.IMAGE_PROCESSING_TASKS_PER_CHILD,
+                )
+            return self._executor
+
+    def submit(self, upload: ImageUpload) -> bool:
+        """Ставит загрузку в очередь; False — очередь заполнена."""
+        if upload.status != 'pending':
+            return True
+        if self.workers <= 0:
+            process_now(upload)
+            return True
+        if not self._slots.acquire(blocking=False):
+            return False
+        try:
+            future = self._get_executor().submit(image_processing.process_image, *processing_args(upload))
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(partial(self._finish, upload.pk))
+        return True
+
+    def _finish(self, upload_id, future) -> None:
+        """Вызывается потоком пула после обработки: записывает результат в БД."""
+        try:
+            error = future.exception()
+            complete(upload_id, error, result=future.result() if error is None else None)
+        except Exception:
+            logger.exception(f'[images] Не удалось сохранить результат обработки {upload_id}')
+        finally:
+            self._slots.release()
+            # Поток пула не обслуживает запросы, соединение закрываем сами
+            connections.close_all()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+pipeline = ImagePipeline(
+    workers=settings.IMAGE_PROCESSING_WORKERS,
+    queue_size=settings.IMAGE_PROCESSING_QUEUE_SIZE,
+)
@@ -0,0 +1,145 @@
+import itertools
+import logging
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from rest_framework.test import APIClient
+from config.database import sqlite_init_command
+from users.models import User
+from wishes.models import Wishlist, Wish
+
+# Режим SQLite по умолчанию (rollback journal, отложенные транзакции) для сравнения
+BASELINE_OPTIONS = {
+    'init_command': sqlite_init_command({'journal_mode': 'DELETE', 'synchronous': 'FULL'}),
+}
+
+
+class Command(BaseCommand):
+    """Сравнивает пропускную способность списка желаний и резервирования при разных PRAGMA SQLite.
+
+    Пример: python manage.py benchmark_sqlite --readers 8 --writers 4 --seconds 10
+    """
+
+    help = (
+        'Запускает конкурентные чтения /api/wishes/?wishlist_id= и резервирования '
+        'на временной SQLite БД с PRAGMA по умолчанию и с settings.SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Число потоков чтения')
+        parser.add_argument('--writers', type=int, default=4, help='Число потоков записи')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Длительность каждого прогона')
+        parser.add_argument('--wishes', type=int, default=50, help='Число желаний в вишлисте')
+
+    def handle(self, *args, **options):
+        # 409 и прочие 4xx ожидаемы и не должны засорять вывод
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        with tempfile.TemporaryDirectory() as tmp:
+            tuned_options = {
+                'init_command': sqlite_init_command(settings.SQLITE_PRAGMAS),
+                'transaction_mode': 'IMMEDIATE',
+            }
+            for label, db_options in (('baseline', BASELINE_OPTIONS), ('tuned', tuned_options)):
+                self.use_database(Path(tmp) / f'{label}.sqlite3', db_options)
+                wishlist = self.seed(options['wishes'])
+                reads, writes, errors = self.run(wishlist, options)
+                seconds = options['seconds']
+                self.stdout.write(
+                    f'{label:>8}: чтений/с {reads / seconds:8.1f}  '
+                    f'записей/с {writes / seconds:8.1f}  ошибок {errors}'
+                )
+                connections.close_all()
+
+    def use_database(self, path: Path, db_options: dict) -> None:
+        """Переключает соединение default на новую временную БД с заданными OPTIONS."""
+        connections.close_all()
+        connections.settings['default'] = connections.configure_settings({
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': path,
+                'OPTIONS': db_options,
+            },
+        })['default']
+        del connections['default']
+        call_command('migrate', verbosity=0)
+
+    def seed(self, size: int) -> Wishlist:
+        """Создает владельца, вишлист с size желаниями и пользователей для резервирования."""
+        owner = User.objects.create(telegram_id=1, first_name='Владелец')
+        wishlist = Wishlist.objects.create(user=owner, name='Бенчмарк')
+        Wish.objects.bulk_create(
+            Wish(wishlist=wishlist, user=owner, title=f'Желание {i}') for i in range(size)
+        )
+        return wishlist
+
+    def run(self, wishlist: Wishlist, options: dict) -> tuple[int, int, int]:
+        """Запускает процессы чтения и записи и возвращает (чтения, записи, ошибки).
+
+        Используются отдельные процессы, как у воркеров Gunicorn, чтобы GIL
+        не маскировал блокировки SQLite.
+        """
+        wish_ids = list(wishlist.wishes.values_list('id', flat=True))
+        friend_id = User.objects.create(telegram_id=2, first_name='Друг').id
+        deadline = time.time() + options['seconds']
+        # Соединения не должны наследоваться дочерними процессами
+        connections.close_all()
+
+        mp = multiprocessing.get_context('fork')
+        results = mp.Queue()
+        workers = [
+            mp.Process(target=_reader, args=(results, wishlist.id, deadline))
+            for _ in range(options['readers'])
+        ]
+        workers += [
+            mp.Process(target=_writer, args=(results, wish_ids[n::options['writers']], friend_id, deadline))
+            for n in range(options['writers'])
+        ]
+        for worker in workers:
+            worker.start()
+        totals = [0, 0, 0]
+        for _ in workers:
+            for i, value in enumerate(results.get()):
+                totals[i] += value
+        for worker in workers:
+            worker.join()
+        return tuple(totals)
+
+
+def _client() -> APIClient:
+    return APIClient(raise_request_exception=False, SERVER_NAME='localhost')
+
+
+def _reader(results, wishlist_id: int, deadline: float) -> None:
+    """Читает список желаний вишлиста до deadline."""
+    client = _client()
+    reads = errors = 0
+    while time.time() < deadline:
+        response = client.get('/api/wishes/', {'wishlist_id': wishlist_id})
+        if response.status_code == 200:
+            reads += 1
+        else:
+            errors += 1
+    results.put((reads, 0, errors))
+
+
+def _writer(results, wish_ids: list[int], friend_id: int, deadline: float) -> None:
+    """Резервирует и снимает резерв с желаний по кругу до deadline."""
+    client = _client()
+    writes = errors = 0
+    for wish_id in itertools.cycle(wish_ids):
+        if time.time() >= deadline:
+            break
+        reserved = client.post(f'/api/wishes/{wish_id}/reserve/', {'reserved_by_id': friend_id})
+        released = client.patch(f'/api/wishes/{wish_id}/', {'status': 'active'}, format='json')
+        for response in (reserved, released):
+            if response.status_code == 200:
+                writes += 1
+            else:
+                errors += 1
+    results.put((0, writes, errors))
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.core.management.base import BaseCommand
+from django.http.multipartparser import MultiPartParser
+from django.test import override_settings
+from wishes.uploads import ImageUploadHandler
+
+BOUNDARY = 'benchmark-boundary'
+
+
+class Command(BaseCommand):
+    """Сравнивает память воркера при параллельных загрузках изображений.
+
+    Разбирает одинаковые multipart-запросы одновременно стандартными
+    обработчиками Django с прежним порогом FILE_UPLOAD_MAX_MEMORY_SIZE = 20 МБ
+    и потоковым uploads.ImageUploadHandler. Все разобранные файлы держатся
+    до конца прогона, как во время обработки параллельных запросов.
+    Память считается через tracemalloc (пик выделений Python).
+
+    Пример: python manage.py benchmark_uploads --uploads 20 --size-mb 10
+    """
+
+    help = 'Измеряет пик памяти при параллельном разборе загрузок изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=20, help='Число параллельных загрузок')
+        parser.add_argument('--size-mb', type=int, default=10, help='Размер файла, МБ')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            body_path = self.write_body(tmp, options['size_mb'] * 1024 * 1024)
+            runs = (
+                ('memory', lambda: [MemoryFileUploadHandler(), TemporaryFileUploadHandler()]),
+                ('streaming', lambda: [ImageUploadHandler()]),
+            )
+            with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=20 * 1024 * 1024, MEDIA_ROOT=tmp):
+                for label, make_handlers in runs:
+                    peak, seconds = self.run(body_path, make_handlers, options['uploads'])
+                    self.stdout.write(
+                        f'{label:>9}: пик памяти {peak / 1024 / 1024:8.1f} МБ  '
+                        f'время {seconds:6.2f} с'
+                    )
+
+    def write_body(self, directory: str, size: int) -> str:
+        """Пишет тело multipart-запроса с полем image размера size; возвращает путь."""
+        path = os.path.join(directory, 'body')
+        with open(path, 'wb') as body:
+            body.write(
+                f'--{BOUNDARY}\r\n'
+                f'Content-Disposition: form-data; name="image"; filename="photo.jpg"\r\n'
+                f'Content-Type: image/jpeg\r\n\r\n'.encode()
+            )
+            # Сигнатура JPEG и случайные данные (содержимое не декодируется)
+            body.write(b'\xff\xd8\xff\xe0')
+            remaining = size - 4
+            while remaining > 0:
+                chunk = os.urandom(min(remaining, 1024 * 1024))
+                body.write(chunk)
+                remaining -= len(chunk)
+            body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+        return path
+
+    def run(self, body_path: str, make_handlers, uploads: int) -> tuple[int, float]:
+        """Разбирает uploads запросов параллельно; возвращает (пик памяти, секунды)."""
+        meta = {
+            'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+            'CONTENT_LENGTH': str(os.path.getsize(body_path)),
+        }
+        barrier = threading.Barrier(uploads)
+
+        def parse(_):
+            with open(body_path, 'rb') as stream:
+                _, files = MultiPartParser(meta, stream, make_handlers()).parse()
+            # Файлы всех запросов существуют одновременно
+            barrier.wait()
+            for uploaded in files.values():
+                uploaded.close()
+                path = getattr(uploaded, 'path', None)
+                if path:
+                    os.remove(path)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(uploads) as executor:
+                list(executor.map(parse, range(uploads)))
+            return tracemalloc.get_traced_memory()[1], time.perf_counter() - started
+        finally:
+            tracemalloc.stop()
@@ -0,0 +1,53 @@
+import os
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from wishes import image_processing, images, uploads
+from wishes.models import UploadSession
+
+
+class Command(BaseCommand):
+    """Удаляет загрузки изображений, на которые не ссылается ни одно желание.
+
+    Файл хранилища удаляется, только когда он не нужен ни одной оставшейся
+    загрузке (одинаковые файлы хранятся один раз). Заодно удаляются
+    заброшенные сессии загрузки частями и временные файлы, оставшиеся от
+    прерванных загрузок и обработки.
+    Запускается по расписанию (cron).
+    """
+
+    help = 'Удаляет неиспользуемые загрузки изображений и их файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=24 * 60 * 60,
+            help='Удалять загрузки и файлы старше стольких секунд',
+        )
+
+    def handle(self, *args, **options):
+        before = time.time() - options['older_than']
+        threshold = timezone.now() - timedelta(seconds=options['older_than'])
+
+        deleted = removed = 0
+        for upload in images.unreferenced_uploads(threshold).iterator():
+            removed += images.discard(upload, before=before)
+            deleted += 1
+
+        sessions = 0
+        for session in UploadSession.objects.filter(updated_at__lt=threshold).iterator():
+            uploads.discard_session(session)
+            sessions += 1
+
+        root = images.media_path(images.IMAGES_DIR)
+        if os.path.isdir(root):
+            for entry in os.scandir(root):
+                if entry.name.endswith(image_processing.TEMPORARY_SUFFIX) and entry.stat().st_mtime < before:
+                    os.remove(entry.path)
+                    removed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено загрузок: {deleted}, сессий загрузки: {sessions}, файлов: {removed}'
+        ))
@@ -0,0 +1,43 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from wishes import images
+from wishes.models import ImageUpload
+
+
+class Command(BaseCommand):
+    """Обрабатывает загрузки изображений, оставшиеся в статусе pending.
+
+    Такие загрузки остаются после перезапуска воркера во время обработки.
+    Запускается по расписанию (cron) или вручную после деплоя.
+    С --missing-placeholders заново обрабатывает готовые загрузки без
+    заглушки (загруженные до ее появления); файлы с тем же содержимым не
+    перезаписываются.
+    """
+
+    help = 'Обрабатывает зависшие загрузки изображений в текущем процессе'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=600,
+            help='Обрабатывать загрузки, ожидающие дольше стольких секунд',
+        )
+        parser.add_argument(
+            '--missing-placeholders',
+            action='store_true',
+            help='Также обработать готовые загрузки без заглушки',
+        )
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(seconds=options['older_than'])
+        uploads = ImageUpload.objects.filter(status='pending', created_at__lt=threshold)
+        if options['missing_placeholders']:
+            uploads |= ImageUpload.objects.filter(status='ready', placeholder__isnull=True)
+        results = {'ready': 0, 'failed': 0}
+        for upload in uploads.iterator():
+            results[images.process_now(upload).status] += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано: {results["ready"]}, с ошибкой: {results["failed"]}'
+        ))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from wishes.models import WishTombstone
+
+
+class Command(BaseCommand):
+    """Удаляет отметки об удаленных желаниях старше срока хранения.
+
+    Запускается по расписанию (cron), например раз в сутки.
+    """
+
+    help = 'Удаляет WishTombstone старше SYNC_TOMBSTONE_RETENTION_DAYS дней'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.SYNC_TOMBSTONE_RETENTION_DAYS,
+            help='Срок хранения отметок в днях',
+        )
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = WishTombstone.objects.filter(deleted_at__lt=threshold).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено отметок: {deleted}'))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from users.models import User
+from wishes.models import Wish
+
+
+def _fulfilled_count(field: str) -> Coalesce:
+    """Подзапрос: число исполненных желаний, где field ссылается на пользователя."""
+    counts = (
+        Wish.objects
+        .filter(**{field: OuterRef('pk')}, status='fulfilled')
+        .order_by()
+        .values(field)
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+class Command(BaseCommand):
+    """Пересчитывает gifts_received/gifts_given по исполненным желаниям."""
+
+    help = 'Пересчитывает счетчики подарков пользователей по Wish.status и Wish.gifted_by'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество пользователей с расхождениями',
+        )
+
+    def handle(self, *args, **options):
+        received = _fulfilled_count('user')
+        given = _fulfilled_count('gifted_by')
+
+        with transaction.atomic():
+            drifted = (
+                User.objects
+                .annotate(actual_received=received, actual_given=given)
+                .filter(~Q(gifts_received=F('actual_received')) | ~Q(gifts_given=F('actual_given')))
+                .values('pk')
+            )
+            drifted_count = drifted.count()
+
+            if options['dry_run']:
+                self.stdout.write(f'Пользователей с расхождениями: {drifted_count}')
+                return
+
+            # Один UPDATE с коррелированными подзапросами только для расходящихся строк
+            updated = User.objects.filter(pk__in=drifted).update(
+                gifts_received=received,
+                gifts_given=given,
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Счетчики пересчитаны у пользователей: {updated}'))
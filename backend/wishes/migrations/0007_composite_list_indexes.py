@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_photo_url'),
+        ('wishes', '0006_add_event_date_to_wishlist'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='wish',
+            name='wishes_wish_wishlis_4669dd_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='wish',
+            name='wishes_wish_user_id_79d8ae_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='wishlist',
+            name='wishes_wish_user_id_6b78e6_idx',
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(fields=['order', '-created_at', '-id'], name='wishes_wish_order_7b1dbf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(fields=['wishlist', 'order', '-created_at', '-id'], name='wishes_wish_wishlis_aa769f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(fields=['user', 'order', '-created_at', '-id'], name='wishes_wish_user_id_945698_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(fields=['user', 'status', 'order', '-created_at', '-id'], name='wishes_wish_user_id_69568c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(condition=models.Q(('status', 'reserved')), fields=['reserved_by', 'order', '-created_at', '-id'], name='wish_reserved_by_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(condition=models.Q(('status', 'fulfilled')), fields=['gifted_by', 'order', '-created_at', '-id'], name='wish_gifted_by_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wishlist',
+            index=models.Index(fields=['user', 'order', '-created_at', '-id'], name='wishes_wish_user_id_b3a61f_idx'),
+        ),
+    ]
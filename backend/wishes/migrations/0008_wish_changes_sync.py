@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_wishes_changed_at'),
+        ('wishes', '0007_composite_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WishTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wish_id', models.BigIntegerField(help_text='Идентификатор удаленного желания', verbose_name='ID желания')),
+                ('wishlist_id', models.BigIntegerField(help_text='Вишлист, в котором было желание', verbose_name='ID вишлиста')),
+                ('user_id', models.BigIntegerField(help_text='Владелец удаленного желания', verbose_name='ID владельца')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Дата и время удаления желания', verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удаленное желание',
+                'verbose_name_plural': 'Удаленные желания',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='wish',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='wishes_wish_user_id_0e6bcd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wishtombstone',
+            index=models.Index(fields=['user_id', 'deleted_at', 'id'], name='wishes_wish_user_id_a39ea7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wishtombstone',
+            index=models.Index(fields=['deleted_at'], name='wishes_wish_deleted_1be89e_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:33
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0008_wish_changes_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('original', models.CharField(help_text='Путь к исходному файлу относительно MEDIA_ROOT', max_length=255, verbose_name='Оригинал')),
+                ('processed', models.CharField(help_text='Путь к обработанному JPEG относительно MEDIA_ROOT', max_length=255, verbose_name='Обработанный файл')),
+                ('url_prefix', models.CharField(help_text='Абсолютный MEDIA_URL на момент загрузки', max_length=500, verbose_name='Адрес медиафайлов')),
+                ('status', models.CharField(choices=[('pending', 'Обрабатывается'), ('ready', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('error', models.TextField(blank=True, help_text='Причина неудачной обработки', verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата загрузки')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Загруженное изображение',
+                'verbose_name_plural': 'Загруженные изображения',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='wishes_imag_status_d0144c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0009_image_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='variants',
+            field=models.JSONField(blank=True, default=list, help_text='Обработанные файлы: [{"name", "width", "height", "type"}], name относительно MEDIA_ROOT', verbose_name='Варианты'),
+        ),
+        migrations.AddField(
+            model_name='wish',
+            name='image',
+            field=models.ForeignKey(blank=True, help_text='Загрузка, из которой взяты image_url и уменьшенные копии', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wishes', to='wishes.imageupload', verbose_name='Загруженное изображение'),
+        ),
+    ]
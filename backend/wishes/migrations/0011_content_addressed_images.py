@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0010_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imageupload',
+            name='original',
+            field=models.CharField(db_index=True, help_text='Путь к исходному файлу относительно MEDIA_ROOT (имя — SHA-256 содержимого)', max_length=255, verbose_name='Оригинал'),
+        ),
+        migrations.AlterField(
+            model_name='imageupload',
+            name='processed',
+            field=models.CharField(db_index=True, help_text='Путь к обработанному JPEG относительно MEDIA_ROOT; до обработки совпадает с оригиналом', max_length=255, verbose_name='Обработанный файл'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:44
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0011_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('size', models.PositiveIntegerField(help_text='Размер файла в байтах, заявленный при создании сессии', verbose_name='Размер')),
+                ('received', models.PositiveIntegerField(default=0, help_text='Число байт от начала файла, полученных без пропусков', verbose_name='Получено')),
+                ('content_type', models.CharField(blank=True, help_text='Тип, определенный по сигнатуре первой части', max_length=50, verbose_name='Тип файла')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Время последней полученной части', verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Сессия загрузки',
+                'verbose_name_plural': 'Сессии загрузки',
+                'indexes': [models.Index(fields=['updated_at'], name='wishes_uplo_updated_6aa078_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishes', '0012_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='placeholder',
+            field=models.JSONField(blank=True, help_text='Превью для мгновенной отрисовки: {"data_url", "color", "width", "height"}', null=True, verbose_name='Заглушка'),
+        ),
+    ]
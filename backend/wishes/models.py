@@ -1,9 +1,28 @@
+from uuid import uuid4
 from django.db import models
+from django.db.models import Count, Q
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from users.models import User
 
 
+class WishlistQuerySet(models.QuerySet):
+    """QuerySet вишлистов с вспомогательными аннотациями."""
+    
+    def with_wish_counts(self) -> 'WishlistQuerySet':
+        """Добавляет количество желаний (всего и по статусам) одним запросом."""
+        queryset = self
+        # Django не применяет Meta.ordering к запросам с GROUP BY, задаем его явно
+        if not queryset.query.order_by:
+            queryset = queryset.order_by(*self.model._meta.ordering)
+        return queryset.annotate(
+            wishes_count=Count('wishes'),
+            active_wishes_count=Count('wishes', filter=Q(wishes__status='active')),
+            reserved_wishes_count=Count('wishes', filter=Q(wishes__status='reserved')),
+            fulfilled_wishes_count=Count('wishes', filter=Q(wishes__status='fulfilled')),
+        )
+
+
 class Wishlist(models.Model):
     """Модель вишлиста (списка желаний)."""
     
@@ -53,12 +72,15 @@ class Wishlist(models.Model):
         help_text='Порядок сортировки вишлистов'
     )
     
+    objects = WishlistQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Вишлист'
         verbose_name_plural = 'Вишлисты'
         ordering = ['order', '-created_at']
         indexes = [
-            models.Index(fields=['user', 'order']),
+            # Список вишлистов пользователя в порядке KeysetPagination без сортировки
+            models.Index(fields=['user', 'order', '-created_at', '-id']),
         ]
     
     def __str__(self) -> str:
@@ -119,6 +141,16 @@ class Wish(models.Model):
         help_text='Ссылка на изображение желания'
     )
     
+    image = models.ForeignKey(
+        'ImageUpload',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='wishes',
+        verbose_name='Загруженное изображение',
+        help_text='Загрузка, из которой взяты image_url и уменьшенные копии'
+    )
+    
     price = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -199,10 +231,28 @@ class Wish(models.Model):
         verbose_name = 'Желание'
         verbose_name_plural = 'Желания'
         ordering = ['order', '-created_at']
+        # Индексы повторяют фильтры списков API и заканчиваются ключом сортировки
+        # KeysetPagination (order, -created_at, -id), чтобы страница читалась
+        # по индексу без сортировки всей выборки
         indexes = [
-            models.Index(fields=['wishlist', 'order']),
-            models.Index(fields=['user', 'status']),
+            models.Index(fields=['order', '-created_at', '-id']),
+            models.Index(fields=['wishlist', 'order', '-created_at', '-id']),
+            models.Index(fields=['user', 'order', '-created_at', '-id']),
+            models.Index(fields=['user', 'status', 'order', '-created_at', '-id']),
             models.Index(fields=['status']),
+            # Частичные индексы: зарезервированные и подаренные желания — малая доля таблицы
+            models.Index(
+                fields=['reserved_by', 'order', '-created_at', '-id'],
+                condition=Q(status='reserved'),
+                name='wish_reserved_by_idx',
+            ),
+            models.Index(
+                fields=['gifted_by', 'order', '-created_at', '-id'],
+                condition=Q(status='fulfilled'),
+                name='wish_gifted_by_idx',
+            ),
+            # Инкрементальная синхронизация: изменения владельца после (updated_at, id)
+            models.Index(fields=['user', 'updated_at', 'id']),
         ]
     
     def __str__(self) -> str:
@@ -221,3 +271,209 @@ class Wish(models.Model):
         if self.wishlist and not self.user:
             self.user = self.wishlist.user
         super().save(*args, **kwargs)
+
+
+class WishTombstone(models.Model):
+    """Отметка об удаленном желании для инкрементальной синхронизации.
+
+    Создается сигналом post_delete желания (см. wishes/sync.py). Владелец и
+    вишлист хранятся числами, а не внешними ключами: отметка должна пережить
+    удаление вишлиста и пользователя в той же транзакции.
+    """
+    
+    wish_id = models.BigIntegerField(
+        verbose_name='ID желания',
+        help_text='Идентификатор удаленного желания'
+    )
+    
+    wishlist_id = models.BigIntegerField(
+        verbose_name='ID вишлиста',
+        help_text='Вишлист, в котором было желание'
+    )
+    
+    user_id = models.BigIntegerField(
+        verbose_name='ID владельца',
+        help_text='Владелец удаленного желания'
+    )
+    
+    deleted_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата удаления',
+        help_text='Дата и время удаления желания'
+    )
+    
+    class Meta:
+        verbose_name = 'Удаленное желание'
+        verbose_name_plural = 'Удаленные желания'
+        indexes = [
+            models.Index(fields=['user_id', 'deleted_at', 'id']),
+            models.Index(fields=['deleted_at']),
+        ]
+    
+    def __str__(self) -> str:
+        """Возвращает строковое представление отметки."""
+        return f"Желание {self.wish_id} удалено {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class ImageUpload(models.Model):
+    """Загруженное изображение и состояние его обработки (см. wishes/images.py).
+
+    Оригинал сохраняется как есть и доступен по original_url сразу после
+    загрузки; обработанный JPEG появляется по image_url, когда статус ready.
+    """
+    
+    STATUS_CHOICES = [
+        ('pending', 'Обрабатывается'),
+        ('ready', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+    
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid4,
+        editable=False
+    )
+    
+    original = models.CharField(
+        max_length=255,
+        db_index=True,
+        verbose_name='Оригинал',
+        help_text='Путь к исходному файлу относительно MEDIA_ROOT (имя — SHA-256 содержимого)'
+    )
+    
+    processed = models.CharField(
+        max_length=255,
+        db_index=True,
+        verbose_name='Обработанный файл',
+        help_text='Путь к обработанному JPEG относительно MEDIA_ROOT; до обработки совпадает с оригиналом'
+    )
+    
+    url_prefix = models.CharField(
+        max_length=500,
+        verbose_name='Адрес медиафайлов',
+        help_text='Абсолютный MEDIA_URL на момент загрузки'
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Статус'
+    )
+    
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка',
+        help_text='Причина неудачной обработки'
+    )
+    
+    variants = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name='Варианты',
+        help_text='Обработанные файлы: [{"name", "width", "height", "type"}], name относительно MEDIA_ROOT'
+    )
+    
+    placeholder = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name='Заглушка',
+        help_text='Превью для мгновенной отрисовки: {"data_url", "color", "width", "height"}'
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата загрузки'
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+    
+    class Meta:
+        verbose_name = 'Загруженное изображение'
+        verbose_name_plural = 'Загруженные изображения'
+        indexes = [
+            # Поиск зависших загрузок командой process_images
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self) -> str:
+        """Возвращает строковое представление загрузки."""
+        return f"{self.original} ({self.status})"
+    
+    @property
+    def original_url(self) -> str:
+        return f"{self.url_prefix}{self.original}"
+    
+    @property
+    def image_url(self) -> str:
+        """Адрес, который нужно показывать: обработанный файл, если он готов."""
+        return f"{self.url_prefix}{self.processed if self.status == 'ready' else self.original}"
+    
+    def srcset(self) -> dict[str, str] | None:
+        """Варианты по типам в формате srcset: {'image/webp': 'url 160w, url 480w', ...}."""
+        if self.status != 'ready' or not self.variants:
+            return None
+        srcset = {}
+        for variant in sorted(self.variants, key=lambda variant: variant['width']):
+            entry = f"{self.url_prefix}{variant['name']} {variant['width']}w"
+            srcset[variant['type']] = f"{srcset[variant['type']]}, {entry}" if variant['type'] in srcset else entry
+        return srcset
+
+
+
+class UploadSession(models.Model):
+    """Сессия возобновляемой загрузки изображения частями (см. uploads.py).
+
+    Части пишутся по своим смещениям в один временный файл хранилища;
+    received — сколько байт с начала файла уже получено без пропусков.
+    """
+    
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid4,
+        editable=False
+    )
+    
+    size = models.PositiveIntegerField(
+        verbose_name='Размер',
+        help_text='Размер файла в байтах, заявленный при создании сессии'
+    )
+    
+    received = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Получено',
+        help_text='Число байт от начала файла, полученных без пропусков'
+    )
+    
+    content_type = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name='Тип файла',
+        help_text='Тип, определенный по сигнатуре первой части'
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления',
+        help_text='Время последней полученной части'
+    )
+    
+    class Meta:
+        verbose_name = 'Сессия загрузки'
+        verbose_name_plural = 'Сессии загрузки'
+        indexes = [
+            # Поиск заброшенных сессий командой cleanup_images
+            models.Index(fields=['updated_at']),
+        ]
+    
+    def __str__(self) -> str:
+        """Возвращает строковое представление сессии."""
+        return f"{self.id.hex} ({self.received}/{self.size})"
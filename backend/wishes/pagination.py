@@ -0,0 +1,135 @@
+import base64
+import json
+from datetime import date, datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(values: list) -> str:
+    """Кодирует значения ключа сортировки последней записи в непрозрачный курсор."""
+    payload = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Декодирует курсор в список из size значений ключа сортировки.
+
+    Выбрасывает ValueError, если курсор поврежден.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Некорректный курсор') from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Некорректный курсор')
+    return values
+
+
+def keyset_filter(ordering: list[str], values: list) -> Q:
+    """Строит условие "строго после позиции values" для сортировки ordering.
+
+    Для ordering = ['order', '-created_at', '-id'] получается
+    order > o OR (order = o AND (created_at < c OR (created_at = c AND id < i))).
+    Поля сортировки должны быть NOT NULL, последнее поле — уникальным.
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def cursor_values(obj, ordering: list[str]) -> list:
+    """Возвращает значения полей сортировки объекта."""
+    return [getattr(obj, field.lstrip('-')) for field in ordering]
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная (keyset) пагинация по Meta.ordering модели с добором по id.
+
+    В отличие от PageNumberPagination не выполняет COUNT(*) и не использует
+    OFFSET: следующая страница выбирается условием по значениям ключа
+    сортировки последней записи. Общее количество возвращается только при
+    with_count=1.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'with_count'
+
+    def get_ordering(self, queryset) -> list[str]:
+        """Возвращает сортировку: Meta.ordering модели и id для однозначности."""
+        ordering = list(queryset.model._meta.ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id')
+        return ordering
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        self.page_size = self.get_page_size(request)
+        self.count = None
+
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                values = decode_cursor(cursor, len(self.ordering))
+            except ValueError:
+                # 400, как и в ленте users/views.py feed
+                raise ValidationError({'error': 'Некорректный cursor'})
+            queryset = queryset.filter(keyset_filter(self.ordering, values))
+
+        # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_cursor = encode_cursor(cursor_values(page[-1], self.ordering)) if self.has_next else None
+        return page
+
+    def get_next_link(self) -> str | None:
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data) -> Response:
+        response = {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response['count'] = self.count
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,17 +1,30 @@
 from rest_framework import serializers
+from django.db import transaction
 from .models import Wishlist, Wish
+from . import images, services
 from users.models import User
+from config.instrumentation import InstrumentedSerializerMixin
 
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели Wishlist."""
     
-    wishes_count = serializers.IntegerField(
-        source='wishes.count',
-        read_only=True,
+    wishes_count = serializers.SerializerMethodField(
         help_text='Количество желаний в вишлисте'
     )
     
+    active_wishes_count = serializers.SerializerMethodField(
+        help_text='Количество активных желаний в вишлисте'
+    )
+    
+    reserved_wishes_count = serializers.SerializerMethodField(
+        help_text='Количество зарезервированных желаний в вишлисте'
+    )
+    
+    fulfilled_wishes_count = serializers.SerializerMethodField(
+        help_text='Количество исполненных желаний в вишлисте'
+    )
+    
     created_at = serializers.DateTimeField(
         format='%Y-%m-%d %H:%M:%S',
         read_only=True
@@ -40,13 +53,48 @@ class WishlistSerializer(serializers.ModelSerializer):
             'updated_at',
             'order',
             'wishes_count',
+            'active_wishes_count',
+            'reserved_wishes_count',
+            'fulfilled_wishes_count',
         ]
         read_only_fields = [
             'id',
             'created_at',
             'updated_at',
             'wishes_count',
+            'active_wishes_count',
+            'reserved_wishes_count',
+            'fulfilled_wishes_count',
         ]
+    
+    def get_wishes_count(self, obj: Wishlist) -> int:
+        """Возвращает количество желаний."""
+        return self._annotation(obj, 'wishes_count')
+    
+    def get_active_wishes_count(self, obj: Wishlist) -> int:
+        """Возвращает количество активных желаний."""
+        return self._annotation(obj, 'active_wishes_count')
+    
+    def get_reserved_wishes_count(self, obj: Wishlist) -> int:
+        """Возвращает количество зарезервированных желаний."""
+        return self._annotation(obj, 'reserved_wishes_count')
+    
+    def get_fulfilled_wishes_count(self, obj: Wishlist) -> int:
+        """Возвращает количество исполненных желаний."""
+        return self._annotation(obj, 'fulfilled_wishes_count')
+    
+    def _annotation(self, obj: Wishlist, name: str) -> int:
+        """Возвращает счетчик из аннотации with_wish_counts.
+
+        Отдельный COUNT на каждый вишлист не выполняется: без аннотации
+        выбрасывается ошибка, чтобы N+1 не появился незаметно.
+        """
+        try:
+            return getattr(obj, name)
+        except AttributeError:
+            raise AttributeError(
+                f'{name}: вишлист нужно загружать через Wishlist.objects.with_wish_counts()'
+            ) from None
 
 
 class WishlistCreateSerializer(serializers.ModelSerializer):
@@ -66,12 +114,12 @@ class WishlistCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data: dict) -> Wishlist:
         """Создает вишлист с автоматической установкой пользователя."""
         # Пользователь должен быть передан через контекст
-        user = self.context.get('user')
+        user_id = self.context.get('user_id')
         
-        if not user:
+        if not user_id:
             raise serializers.ValidationError('Пользователь не указан')
         
-        validated_data['user'] = user
+        validated_data['user_id'] = user_id
         return super().create(validated_data)
 
 
@@ -88,11 +136,10 @@ class WishlistUpdateSerializer(serializers.ModelSerializer):
         ]
 
 
-class WishSerializer(serializers.ModelSerializer):
+class WishSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели Wish."""
     
     wishlist_id = serializers.IntegerField(
-        source='wishlist.id',
         read_only=True
     )
     
@@ -109,7 +156,6 @@ class WishSerializer(serializers.ModelSerializer):
     )
     
     user_id = serializers.IntegerField(
-        source='user.id',
         read_only=True
     )
     
@@ -119,13 +165,11 @@ class WishSerializer(serializers.ModelSerializer):
     )
     
     reserved_by_id = serializers.IntegerField(
-        source='reserved_by.id',
         read_only=True,
         allow_null=True
     )
     
     gifted_by_id = serializers.IntegerField(
-        source='gifted_by.id',
         read_only=True,
         allow_null=True
     )
@@ -152,6 +196,13 @@ class WishSerializer(serializers.ModelSerializer):
         allow_null=True
     )
     
+    image_srcset = serializers.SerializerMethodField(
+        help_text='Уменьшенные копии изображения по типам в формате srcset'
+    )
+    image_placeholder = serializers.SerializerMethodField(
+        help_text='Заглушка изображения: data_url, color, width, height'
+    )
+    
     # Для совместимости с фронтендом
     is_fulfilled = serializers.SerializerMethodField()
     fulfilled_by = serializers.SerializerMethodField()
@@ -172,6 +223,8 @@ class WishSerializer(serializers.ModelSerializer):
             'comment',
             'link',
             'image_url',
+            'image_srcset',
+            'image_placeholder',
             'price',
             'currency',
             'status',
@@ -200,13 +253,25 @@ class WishSerializer(serializers.ModelSerializer):
             'fulfilled_at',
         ]
     
+    def get_image_srcset(self, obj: Wish) -> dict[str, str] | None:
+        """Возвращает srcset загруженного изображения (Wish.image через select_related)."""
+        if obj.image_id is None:
+            return None
+        return obj.image.srcset()
+    
+    def get_image_placeholder(self, obj: Wish) -> dict | None:
+        """Возвращает заглушку загруженного изображения, если оно обработано."""
+        if obj.image_id is None:
+            return None
+        return obj.image.placeholder
+    
     def get_is_fulfilled(self, obj: Wish) -> bool:
         """Возвращает True, если желание исполнено."""
         return obj.status == 'fulfilled'
     
     def get_fulfilled_by(self, obj: Wish) -> int | None:
         """Возвращает ID пользователя, который подарил желание."""
-        return obj.gifted_by.id if obj.gifted_by else None
+        return obj.gifted_by_id
     
     def get_fulfilled_at(self, obj: Wish) -> str | None:
         """Возвращает дату дарения в формате строки."""
@@ -231,6 +296,19 @@ class WishCreateSerializer(serializers.ModelSerializer):
             'order',
         ]
     
+    def validate(self, attrs: dict) -> dict:
+        """Связывает желание с загруженным изображением по image_url.
+
+        Пакетное создание передает загрузки всех элементов в context['images']
+        (images.resolve_images), тогда запрос на элемент не выполняется.
+        """
+        if 'image_url' in attrs:
+            resolved = self.context.get('images', {}).get(attrs['image_url'])
+            if resolved is None:
+                resolved = images.resolve_image(attrs['image_url'])
+            attrs['image_url'], attrs['image'] = resolved
+        return super().validate(attrs)
+    
     def create(self, validated_data: dict) -> Wish:
         """Создает желание с автоматической установкой пользователя."""
         wishlist = validated_data.get('wishlist')
@@ -239,6 +317,24 @@ class WishCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class PrefetchedWishlistField(serializers.PrimaryKeyRelatedField):
+    """Вишлист по id из context['wishlists'], загруженного одним запросом на весь список."""
+    
+    def to_internal_value(self, data) -> Wishlist:
+        try:
+            return self.context['wishlists'][int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class WishBulkCreateSerializer(WishCreateSerializer):
+    """Сериализатор элемента пакетного создания желаний (POST /api/wishes/bulk/)."""
+    
+    wishlist = PrefetchedWishlistField(queryset=Wishlist.objects.all())
+
+
 class WishUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для обновления желания."""
     
@@ -257,8 +353,21 @@ class WishUpdateSerializer(serializers.ModelSerializer):
             'order',
         ]
     
+    def validate(self, attrs: dict) -> dict:
+        """Связывает желание с загруженным изображением по image_url."""
+        if 'image_url' in attrs:
+            attrs['image_url'], attrs['image'] = images.resolve_image(attrs['image_url'])
+        return super().validate(attrs)
+    
     def update(self, instance: Wish, validated_data: dict) -> Wish:
-        """Обновляет желание с обработкой reserved_at."""
+        """Обновляет желание с обработкой reserved_at.
+
+        Смена статуса выполняется условным UPDATE относительно статуса,
+        прочитанного при загрузке желания; если его успели изменить,
+        выбрасывается services.StatusConflict. Остальные поля сохраняются
+        через update_fields, поэтому устаревшие значения прочитанной строки
+        (например, статус до чужого резервирования) не перезаписываются.
+        """
         from django.utils import timezone
         
         # Сохраняем старое значение статуса
@@ -274,5 +383,28 @@ class WishUpdateSerializer(serializers.ModelSerializer):
             if 'reserved_by' not in validated_data:
                 validated_data['reserved_by'] = None
         
-        return super().update(instance, validated_data)
-
+        # Резервирование новым пользователем возможно только из статуса 'active'
+        reserved_by = validated_data.get('reserved_by')
+        claims_reservation = (
+            new_status == 'reserved'
+            and reserved_by is not None
+            and reserved_by.pk != instance.reserved_by_id
+        )
+        if new_status == old_status and not claims_reservation:
+            return self._save_changed(instance, validated_data)
+        
+        with transaction.atomic():
+            # Захватываем переход статуса; строка остается заблокированной до конца транзакции
+            fields = {'reserved_at': instance.reserved_at}
+            if 'reserved_by' in validated_data:
+                fields['reserved_by'] = reserved_by
+            expected_status = 'active' if claims_reservation else old_status
+            services.change_status(instance.pk, expected_status, new_status, **fields)
+            return self._save_changed(instance, validated_data, 'reserved_at')
+    
+    def _save_changed(self, instance: Wish, validated_data: dict, *extra_fields: str) -> Wish:
+        """Сохраняет только переданные поля (и updated_at), а не всю строку."""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, *extra_fields, 'updated_at'])
+        return instance
@@ -0,0 +1,260 @@
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from . import caching, events
+from .models import Wish, Wishlist
+from users.models import User
+
+
+class StatusConflict(Exception):
+    """Статус желания изменился конкурентным запросом."""
+
+
+def _adjust_counter(user_id: int | None, field: str, delta: int) -> None:
+    """Атомарно изменяет счетчик пользователя одним UPDATE (не ниже нуля).
+
+    Используется queryset.update(), поэтому остальные колонки пользователя
+    не перезаписываются.
+    """
+    if not user_id or not delta:
+        return
+    User.objects.filter(pk=user_id).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def _apply_gift_counters(wish: Wish, old_status: str, old_gifted_by_id: int | None) -> None:
+    """Обновляет gifts_received/gifts_given по переходу статуса желания."""
+    was_fulfilled = old_status == 'fulfilled'
+    is_fulfilled = wish.status == 'fulfilled'
+
+    if was_fulfilled != is_fulfilled:
+        _adjust_counter(wish.user_id, 'gifts_received', 1 if is_fulfilled else -1)
+
+    if was_fulfilled and (not is_fulfilled or old_gifted_by_id != wish.gifted_by_id):
+        _adjust_counter(old_gifted_by_id, 'gifts_given', -1)
+    if is_fulfilled and (not was_fulfilled or old_gifted_by_id != wish.gifted_by_id):
+        _adjust_counter(wish.gifted_by_id, 'gifts_given', 1)
+
+
+def _lock_wish(pk: int) -> Wish:
+    """Получает желание с блокировкой строки до конца транзакции."""
+    return (
+        Wish.objects
+        .select_related('wishlist', 'user')
+        .select_for_update(of=('self',))
+        .get(pk=pk)
+    )
+
+
+@transaction.atomic
+def fulfill_wish(pk: int, gifted_by_id: int | None = None) -> Wish:
+    """Отмечает желание исполненным и обновляет счетчики подарков.
+
+    Если gifted_by_id не передан, дарителем считается тот, кто зарезервировал
+    желание (или прежний даритель). Повторный вызов для уже исполненного
+    желания счетчики не увеличивает.
+    """
+    wish = _lock_wish(pk)
+    old_status, old_gifted_by_id = wish.status, wish.gifted_by_id
+
+    if gifted_by_id is None:
+        gifted_by_id = wish.reserved_by_id or wish.gifted_by_id
+
+    wish.status = 'fulfilled'
+    wish.gifted_by_id = gifted_by_id
+    wish.gifted_at = timezone.now()
+    wish.save(update_fields=['status', 'gifted_by', 'gifted_at', 'updated_at'])
+
+    _apply_gift_counters(wish, old_status, old_gifted_by_id)
+    return wish
+
+
+@transaction.atomic
+def unfulfill_wish(pk: int) -> Wish:
+    """Отменяет исполнение желания и уменьшает счетчики подарков."""
+    wish = _lock_wish(pk)
+    old_status, old_gifted_by_id = wish.status, wish.gifted_by_id
+
+    wish.status = 'active'
+    wish.gifted_by = None
+    wish.gifted_at = None
+    wish.save(update_fields=['status', 'gifted_by', 'gifted_at', 'updated_at'])
+
+    _apply_gift_counters(wish, old_status, old_gifted_by_id)
+    return wish
+
+
+def change_status(pk: int, expected_status: str, new_status: str, **fields) -> None:
+    """Меняет статус желания условным UPDATE ... WHERE status=expected_status.
+
+    Если статус уже изменен другим запросом (или желания нет), ни одна строка
+    не обновляется и выбрасывается StatusConflict. Блокируется только
+    обновляемая строка.
+    """
+    updated = Wish.objects.filter(pk=pk, status=expected_status).update(
+        status=new_status,
+        updated_at=timezone.now(),
+        **fields,
+    )
+    if not updated:
+        raise StatusConflict(pk)
+    # queryset.update() не отправляет post_save
+    caching.invalidate_wish(pk)
+
+
+def reserve_wish(pk: int, reserved_by_id: int | None = None) -> None:
+    """Резервирует активное желание; из конкурентных запросов выигрывает ровно один."""
+    fields = {'reserved_at': timezone.now()}
+    if reserved_by_id is not None:
+        fields['reserved_by_id'] = reserved_by_id
+    change_status(pk, 'active', 'reserved', **fields)
+
+
+@transaction.atomic
+def bulk_create_wishes(items: list[dict]) -> list[Wish]:
+    """Создает желания одним INSERT (bulk_create).
+
+    items — validated_data сериализатора создания; владелец желания берется
+    из его вишлиста. bulk_create не отправляет post_save, поэтому кэш
+    сбрасывается и события created отправляются здесь.
+    """
+    wishes = Wish.objects.bulk_create(
+        Wish(user=item['wishlist'].user, **item) for item in items
+    )
+    caching.invalidate(
+        wishlist_ids={wish.wishlist_id for wish in wishes},
+        owner_ids={wish.user_id for wish in wishes},
+    )
+    for wish in wishes:
+        events.publish(events.CREATED, wish)
+    return wishes
+
+
+@transaction.atomic
+def bulk_create_wishlists(user_id: int, items: list[dict]) -> list[Wishlist]:
+    """Создает вишлисты пользователя одним INSERT (bulk_create)."""
+    wishlists = Wishlist.objects.bulk_create(Wishlist(user_id=user_id, **item) for item in items)
+    caching.invalidate(owner_ids=[user_id])
+    return wishlists
+
+
+def _reorder(queryset, ids: list[int], scope_field: str) -> list:
+    """Присваивает order = позиции id в списке одним SELECT и одним UPDATE.
+
+    queryset должен загружать только поля order, updated_at и поля области.
+
+    Все объекты должны существовать и относиться к одной области
+    (scope_field — вишлист для желаний, владелец для вишлистов), иначе
+    выбрасывается ValueError. Записываются только объекты, у которых
+    порядок изменился.
+    """
+    if len(set(ids)) != len(ids):
+        raise ValueError('Список содержит повторяющиеся id')
+    objects = queryset.order_by().in_bulk(ids)
+    if len(objects) != len(ids):
+        missing = [pk for pk in ids if pk not in objects]
+        raise ValueError(f'Объекты не найдены: {missing}')
+    if len({getattr(obj, scope_field) for obj in objects.values()}) > 1:
+        raise ValueError('Порядок можно менять только в пределах одного списка')
+
+    now = timezone.now()
+    changed = []
+    for position, pk in enumerate(ids):
+        obj = objects[pk]
+        if obj.order != position:
+            obj.order = position
+            obj.updated_at = now
+            changed.append(obj)
+    queryset.model.objects.bulk_update(changed, ['order', 'updated_at'])
+    return [objects[pk] for pk in ids]
+
+
+@transaction.atomic
+def reorder_wishes(ids: list[int]) -> list[Wish]:
+    """Задает порядок желаний одного вишлиста по списку id."""
+    queryset = Wish.objects.only('id', 'order', 'updated_at', 'wishlist_id', 'user_id')
+    wishes = _reorder(queryset, ids, 'wishlist_id')
+    wishlist_id, user_id = wishes[0].wishlist_id, wishes[0].user_id
+    caching.invalidate(wishlist_ids=[wishlist_id], owner_ids=[user_id])
+    events.publish_event({
+        'type': events.REORDERED,
+        'wishlist_id': wishlist_id,
+        'user_id': user_id,
+        'wish_ids': ids,
+    })
+    return wishes
+
+
+@transaction.atomic
+def reorder_wishlists(ids: list[int]) -> list[Wishlist]:
+    """Задает порядок вишлистов одного пользователя по списку id."""
+    queryset = Wishlist.objects.only('id', 'order', 'updated_at', 'user_id')
+    wishlists = _reorder(queryset, ids, 'user_id')
+    caching.invalidate(owner_ids=[wishlists[0].user_id])
+    return wishlists
+
+
+# Поля, которые переносятся в копию желания; статус, резерв, даритель и даты
+# не копируются. Изображение копируется ссылкой на уже загруженный файл.
+COPIED_WISH_FIELDS = ('title', 'comment', 'link', 'image_url', 'image', 'price', 'currency', 'order')
+
+
+def copy_wish(source: Wish, wishlist: Wishlist) -> Wish:
+    """Создает активную копию желания в вишлисте (владелец — владелец вишлиста)."""
+    return Wish.objects.create(
+        wishlist=wishlist,
+        user=wishlist.user,
+        **{field: getattr(source, field) for field in COPIED_WISH_FIELDS},
+    )
+
+
+def _insert_copies(wishes, wishlist: Wishlist) -> int:
+    """Копирует желания queryset в wishlist одним INSERT ... SELECT.
+
+    Строки не проходят через Python, поэтому число запросов не зависит от
+    размера списка. Копии вставляются в обратном порядке сортировки: у них
+    одинаковый created_at, и порядок среди равных order задает -id.
+    Сигналы post_save не отправляются. Возвращает число скопированных желаний.
+    """
+    now = timezone.now()
+    columns = {
+        'wishlist': Value(wishlist.pk),
+        'user': Value(wishlist.user_id),
+        **{field: F(field) for field in COPIED_WISH_FIELDS},
+        'status': Value('active'),
+        'created_at': Value(now),
+        'updated_at': Value(now),
+    }
+    # Имена аннотаций не должны совпадать с полями модели
+    select = (
+        wishes
+        .annotate(**{f'copy_{name}': expression for name, expression in columns.items()})
+        .values(*(f'copy_{name}' for name in columns))
+        .order_by('-order', 'created_at', 'id')
+    )
+    select_sql, params = select.query.sql_with_params()
+    quote = connection.ops.quote_name
+    column_sql = ', '.join(quote(Wish._meta.get_field(name).column) for name in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(Wish._meta.db_table)} ({column_sql}) {select_sql}', params)
+        return cursor.rowcount
+
+
+@transaction.atomic
+def clone_wishlist(source: Wishlist, user_id: int, name: str) -> Wishlist:
+    """Клонирует вишлист со всеми желаниями для пользователя user_id.
+
+    Вишлист создается одним INSERT, желания копируются одним INSERT ... SELECT,
+    поэтому клонирование не зависит от числа желаний.
+    """
+    clone = Wishlist.objects.create(
+        user_id=user_id,
+        name=name,
+        description=source.description,
+        event_date=source.event_date,
+        order=source.order,
+    )
+    _insert_copies(Wish.objects.filter(wishlist_id=source.pk), clone)
+    caching.invalidate(wishlist_ids=[clone.pk], owner_ids=[user_id])
+    return clone
+
@@ -0,0 +1,110 @@
+"""
+Инкрементальная синхронизация желаний (/api/wishes/changes/).
+
+Токен since — непрозрачный курсор по двум потокам:
+    * измененные и созданные желания — (Wish.updated_at, id);
+    * удаленные желания — (WishTombstone.deleted_at, id).
+
+Когда поток прочитан до конца, его курсор сдвигается не дальше чем на
+SYNC_SAFETY_WINDOW секунд назад от текущего времени: транзакция, начатая
+раньше, может закоммитить запись с более ранним updated_at уже после
+ответа. Поэтому последние изменения могут прийти повторно — клиент
+применяет их как upsert по id.
+
+Отметки об удалении хранятся SYNC_TOMBSTONE_RETENTION_DAYS дней (команда
+prune_wish_tombstones); для более старого токена выбрасывается
+TokenExpired, и клиент должен заново загрузить полный список.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Wish, WishTombstone
+from .pagination import decode_cursor, encode_cursor, keyset_filter
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+WISH_ORDERING = ['updated_at', 'id']
+TOMBSTONE_ORDERING = ['deleted_at', 'id']
+
+
+class TokenExpired(Exception):
+    """Токен старше срока хранения отметок об удалении."""
+
+
+def encode_token(wish_cursor: tuple, tombstone_cursor: tuple) -> str:
+    return encode_cursor([*wish_cursor, *tombstone_cursor])
+
+
+def decode_token(token: str) -> tuple[tuple, tuple]:
+    """Декодирует токен в курсоры ((updated_at, id), (deleted_at, id)).
+
+    Выбрасывает ValueError, если токен поврежден.
+    """
+    wish_at, wish_id, tombstone_at, tombstone_id = decode_cursor(token, 4)
+    wish_at, tombstone_at = parse_datetime(str(wish_at)), parse_datetime(str(tombstone_at))
+    if wish_at is None or tombstone_at is None:
+        raise ValueError('Некорректный токен')
+    return (wish_at, int(wish_id)), (tombstone_at, int(tombstone_id))
+
+
+def _read_stream(queryset, ordering: list[str], cursor: tuple, limit: int) -> tuple[list, bool]:
+    """Читает до limit записей после cursor; возвращает (записи, есть_еще)."""
+    rows = list(queryset.filter(keyset_filter(ordering, list(cursor))).order_by(*ordering)[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def _next_cursor(rows: list, field: str, cursor: tuple, has_more: bool, horizon: datetime) -> tuple:
+    """Курсор следующего запроса для потока."""
+    if has_more:
+        return getattr(rows[-1], field), rows[-1].pk
+    # Поток прочитан до конца: сдвигаемся к горизонту, но не назад
+    return max(cursor, (horizon, 0))
+
+
+def collect_changes(wishes, tombstones, since: str | None, limit: int) -> dict:
+    """Собирает изменения желаний и удаления после токена since.
+
+    wishes и tombstones — querysets, уже ограниченные областью (владелец или
+    подписки). Без since возвращается полный снимок области постранично.
+    Выбрасывает ValueError для поврежденного токена и TokenExpired для
+    устаревшего.
+    """
+    now = timezone.now()
+    horizon = now - timedelta(seconds=settings.SYNC_SAFETY_WINDOW)
+
+    if since:
+        wish_cursor, tombstone_cursor = decode_token(since)
+        if tombstone_cursor[0] < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+            raise TokenExpired(since)
+    else:
+        # Полный снимок: удаления до него клиенту не нужны
+        wish_cursor, tombstone_cursor = (EPOCH, 0), (horizon, 0)
+
+    changed, more_changed = _read_stream(wishes, WISH_ORDERING, wish_cursor, limit)
+    deleted, more_deleted = _read_stream(tombstones, TOMBSTONE_ORDERING, tombstone_cursor, limit)
+
+    return {
+        'changed': changed,
+        'deleted': [tombstone.wish_id for tombstone in deleted],
+        'has_more': more_changed or more_deleted,
+        'next': encode_token(
+            _next_cursor(changed, 'updated_at', wish_cursor, more_changed, horizon),
+            _next_cursor(deleted, 'deleted_at', tombstone_cursor, more_deleted, horizon),
+        ),
+    }
+
+
+@receiver(post_delete, sender=Wish)
+def record_tombstone(sender, instance, **kwargs):
+    """Оставляет отметку об удалении для клиентов, синхронизирующих изменения."""
+    WishTombstone.objects.create(
+        wish_id=instance.pk,
+        wishlist_id=instance.wishlist_id,
+        user_id=instance.user_id,
+    )
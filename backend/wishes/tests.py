@@ -1,3 +1,1317 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+from users.identity import telegram_id_cache
+from users.models import User
+from PIL import Image
+from . import events, image_processing, images, services, uploads
+from .models import ImageUpload, UploadSession, Wishlist, Wish, WishTombstone
+from .pagination import encode_cursor
+from .serializers import WishlistSerializer, WishUpdateSerializer
+from .views import WishViewSet
+
+
+class WishQueryCountTests(TestCase):
+    """Число SQL-запросов списков желаний не должно зависеть от количества желаний."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=1001, first_name='Владелец')
+        cls.friend = User.objects.create(telegram_id=1002, first_name='Друг')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_wishlist(self, size: int) -> Wishlist:
+        """Создает вишлист с size зарезервированными и исполненными желаниями."""
+        wishlist = Wishlist.objects.create(user=self.owner, name=f'Вишлист на {size}')
+        for i in range(size):
+            Wish.objects.create(
+                wishlist=wishlist,
+                user=self.owner,
+                title=f'Желание {i}',
+                status='reserved' if i % 2 else 'fulfilled',
+                reserved_by=self.friend if i % 2 else None,
+                gifted_by=None if i % 2 else self.friend,
+            )
+        return wishlist
+
+    def count_queries(self, url: str, params: dict | None = None) -> int:
+        """Выполняет GET-запрос и возвращает число выполненных SQL-запросов."""
+        # Оба замера выполняются с холодным кэшем telegram_id
+        telegram_id_cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def assertConstantQueries(self, make_request):
+        """Проверяет, что make_request(wishlist) выполняет одинаковое число запросов для 2 и 20 желаний."""
+        counts = [make_request(self.create_wishlist(size)) for size in (2, 20)]
+        self.assertEqual(counts[0], counts[1], f'Число запросов зависит от количества желаний: {counts}')
+
+    def test_list_by_wishlist(self):
+        self.assertConstantQueries(
+            lambda wishlist: self.count_queries('/api/wishes/', {'wishlist_id': wishlist.id})
+        )
+
+    def test_test_wishlist(self):
+        self.assertConstantQueries(
+            lambda wishlist: self.count_queries(f'/api/wishes/test-wishlist/{wishlist.id}/')
+        )
+
+    def test_by_telegram_id(self):
+        def make_request(wishlist):
+            Wish.objects.exclude(wishlist=wishlist).delete()
+            return self.count_queries('/api/wishes/by_telegram_id/', {'telegram_id': self.owner.telegram_id})
+        self.assertConstantQueries(make_request)
+
+    def test_list_by_reserved_by(self):
+        def make_request(wishlist):
+            Wish.objects.exclude(wishlist=wishlist).delete()
+            return self.count_queries('/api/wishes/', {'reserved_by_id': self.friend.id, 'status': 'reserved'})
+        self.assertConstantQueries(make_request)
+
+
+class WishlistCountsTests(TestCase):
+    """Счетчики вишлиста берутся только из аннотации with_wish_counts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=1101, first_name='Владелец')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='Праздник')
+        for wish_status in ('active', 'reserved', 'fulfilled', 'fulfilled'):
+            Wish.objects.create(wishlist=cls.wishlist, user=cls.owner, title='Желание', status=wish_status)
+
+    def test_annotated_counts(self):
+        wishlist = Wishlist.objects.with_wish_counts().get(pk=self.wishlist.pk)
+        with CaptureQueriesContext(connection) as captured:
+            data = WishlistSerializer(wishlist).data
+        self.assertEqual(len(captured), 0)
+        counts = ('wishes_count', 'active_wishes_count', 'reserved_wishes_count', 'fulfilled_wishes_count')
+        self.assertEqual([data[field] for field in counts], [4, 1, 1, 2])
+
+    def test_missing_annotation_fails(self):
+        with self.assertRaisesMessage(AttributeError, 'with_wish_counts'):
+            WishlistSerializer(Wishlist.objects.get(pk=self.wishlist.pk)).data
+
+    def test_endpoints_return_counts(self):
+        client = APIClient()
+        responses = [
+            client.get(f'/api/wishlists/{self.wishlist.id}/').data,
+            client.get('/api/wishlists/', {'user_id': self.owner.id}).data['results'][0],
+            client.get('/api/wishlists/by_telegram_id/', {'telegram_id': self.owner.telegram_id}).data['results'][0],
+            client.post(f'/api/wishlists/{self.wishlist.id}/clone/').data,
+        ]
+        self.assertEqual([data['fulfilled_wishes_count'] for data in responses], [2, 2, 2, 0])
+
+
+class GiftCounterTests(TestCase):
+    """Счетчики подарков обновляются атомарно и восстанавливаются командой."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create(telegram_id=2001, first_name='Владелец')
+        self.friend = User.objects.create(telegram_id=2002, first_name='Друг')
+        wishlist = Wishlist.objects.create(user=self.owner, name='Подарки')
+        self.wish = Wish.objects.create(wishlist=wishlist, user=self.owner, title='Книга')
+
+    def assertCounters(self, received: int, given: int):
+        self.owner.refresh_from_db()
+        self.friend.refresh_from_db()
+        self.assertEqual(self.owner.gifts_received, received)
+        self.assertEqual(self.friend.gifts_given, given)
+
+    def test_fulfill_and_unfulfill(self):
+        last_visit = User.objects.get(pk=self.owner.pk).last_visit
+        url = f'/api/wishes/{self.wish.id}/fulfill/'
+
+        response = self.client.post(url, {'gifted_by_id': self.friend.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['fulfilled_by'], self.friend.id)
+        self.assertCounters(received=1, given=1)
+        # Счетчики обновляются узким UPDATE, last_visit не меняется
+        self.assertEqual(self.owner.last_visit, last_visit)
+
+        # Повторное исполнение не увеличивает счетчики
+        self.client.post(url, {'gifted_by_id': self.friend.id}, format='json')
+        self.assertCounters(received=1, given=1)
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'active')
+        self.assertCounters(received=0, given=0)
+
+    def test_fulfill_unknown_user(self):
+        response = self.client.post(f'/api/wishes/{self.wish.id}/fulfill/', {'gifted_by_id': 999999}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertCounters(received=0, given=0)
+
+    def test_recompute_command(self):
+        Wish.objects.filter(pk=self.wish.pk).update(status='fulfilled', gifted_by=self.friend)
+        User.objects.filter(pk=self.owner.pk).update(gifts_received=7)
+
+        call_command('recompute_gift_counters', stdout=StringIO())
+        self.assertCounters(received=1, given=1)
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    """Нагрузочный тест: из одновременных резервирований одного желания выигрывает ровно одно."""
+
+    THREADS = 16
+
+    def setUp(self):
+        owner = User.objects.create(telegram_id=3001, first_name='Владелец')
+        self.friends = [
+            User.objects.create(telegram_id=3100 + i, first_name=f'Друг {i}')
+            for i in range(self.THREADS)
+        ]
+        wishlist = Wishlist.objects.create(user=owner, name='Подарки')
+        self.wish = Wish.objects.create(wishlist=wishlist, user=owner, title='Велосипед')
+
+    def hammer(self, make_request) -> list[int]:
+        """Запускает make_request(friend) из THREADS потоков одновременно и возвращает коды ответов."""
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker(friend):
+            try:
+                barrier.wait()
+                return make_request(APIClient(), friend).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            return list(pool.map(worker, self.friends))
+
+    def assertSingleWinner(self, codes: list[int]):
+        self.assertEqual(codes.count(200), 1, codes)
+        self.assertEqual(codes.count(409), self.THREADS - 1, codes)
+        self.wish.refresh_from_db()
+        self.assertEqual(self.wish.status, 'reserved')
+        winner = self.friends[codes.index(200)]
+        self.assertEqual(self.wish.reserved_by_id, winner.id)
+
+    def test_reserve_action(self):
+        codes = self.hammer(lambda client, friend: client.post(
+            f'/api/wishes/{self.wish.id}/reserve/', {'reserved_by_id': friend.id}, format='json'
+        ))
+        self.assertSingleWinner(codes)
+
+    def test_patch_status(self):
+        codes = self.hammer(lambda client, friend: client.patch(
+            f'/api/wishes/{self.wish.id}/', {'status': 'reserved', 'reserved_by': friend.id}, format='json'
+        ))
+        self.assertSingleWinner(codes)
+
+
+class StaleUpdateTests(TestCase):
+    """PATCH без смены статуса не затирает резервирование, сделанное после чтения желания."""
+
+    def test_patch_keeps_concurrent_reservation(self):
+        owner = User.objects.create(telegram_id=3501, first_name='Владелец')
+        friend = User.objects.create(telegram_id=3502, first_name='Друг')
+        wishlist = Wishlist.objects.create(user=owner, name='Подарки')
+        wish = Wish.objects.create(wishlist=wishlist, user=owner, title='Велосипед')
+
+        stale = Wish.objects.get(pk=wish.pk)
+        services.reserve_wish(wish.pk, friend.id)
+        serializer = WishUpdateSerializer(stale, data={'title': 'Новый велосипед'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        wish.refresh_from_db()
+        self.assertEqual(
+            (wish.status, wish.reserved_by_id, wish.title),
+            ('reserved', friend.id, 'Новый велосипед'),
+        )
+
+    def test_move_keeps_concurrent_reservation(self):
+        owner = User.objects.create(telegram_id=3503, first_name='Владелец')
+        friend = User.objects.create(telegram_id=3504, first_name='Друг')
+        wishlist = Wishlist.objects.create(user=owner, name='Подарки')
+        target = Wishlist.objects.create(user=owner, name='Новый год')
+        wish = Wish.objects.create(wishlist=wishlist, user=owner, title='Велосипед')
+
+        # get_object() прочитал желание до резервирования
+        stale = Wish.objects.get(pk=wish.pk)
+        services.reserve_wish(wish.pk, friend.id)
+        with mock.patch.object(WishViewSet, 'get_object', return_value=stale):
+            response = APIClient().post(f'/api/wishes/{wish.id}/move/', {'wishlist_id': target.id})
+
+        self.assertEqual((response.data['status'], response.data['wishlist']), ('reserved', target.id))
+        wish.refresh_from_db()
+        self.assertEqual(
+            (wish.status, wish.reserved_by_id, wish.wishlist_id),
+            ('reserved', friend.id, target.id),
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    """Курсорная пагинация обходит все записи без повторов и без COUNT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=4001, first_name='Владелец')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='Много желаний')
+        Wish.objects.bulk_create(
+            Wish(wishlist=cls.wishlist, user=cls.owner, title=f'Желание {i}', order=i % 3)
+            for i in range(25)
+        )
+        # Одинаковое время создания у части записей: порядок должен добираться по id
+        Wish.objects.filter(order=1).update(created_at=timezone.now())
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def collect(self, url: str, params: dict) -> list[int]:
+        """Проходит все страницы по ссылке next и возвращает id записей."""
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [item['id'] for item in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_walks_all_pages_in_order(self):
+        expected = list(
+            Wish.objects.filter(wishlist=self.wishlist)
+            .order_by('order', '-created_at', '-id')
+            .values_list('id', flat=True)
+        )
+        ids = self.collect('/api/wishes/', {'wishlist_id': self.wishlist.id, 'page_size': 4})
+        self.assertEqual(ids, expected)
+
+    def test_by_telegram_id_is_paginated(self):
+        ids = self.collect('/api/wishes/by_telegram_id/', {'telegram_id': self.owner.telegram_id, 'page_size': 10})
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(len(set(ids)), 25)
+
+    def test_no_count_query_unless_requested(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get('/api/wishes/', {'wishlist_id': self.wishlist.id})
+        self.assertFalse(any('COUNT(' in query['sql'] for query in captured.captured_queries))
+
+        response = self.client.get('/api/wishes/', {'wishlist_id': self.wishlist.id, 'with_count': 1})
+        self.assertEqual(response.data['count'], 25)
+
+    def test_invalid_cursor(self):
+        wrong_size = encode_cursor([1])
+        for url in ('/api/wishes/', '/api/wishlists/'):
+            for cursor in ('не-курсор', wrong_size):
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('error', response.data)
+
+
+class ListIndexUsageTests(TestCase):
+    """Списки API читаются по индексу в порядке сортировки, без сортировки всей выборки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=5001, first_name='Владелец')
+        cls.friend = User.objects.create(telegram_id=5002, first_name='Друг')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='Индексы')
+        statuses = ['active', 'reserved', 'fulfilled']
+        Wish.objects.bulk_create(
+            Wish(
+                wishlist=cls.wishlist,
+                user=cls.owner,
+                title=f'Желание {i}',
+                order=i % 5,
+                status=statuses[i % 3],
+                reserved_by=cls.friend if i % 3 == 1 else None,
+                gifted_by=cls.friend if i % 3 == 2 else None,
+            )
+            for i in range(60)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def explain_list(self, url: str, params: dict) -> str:
+        """Выполняет GET-запрос и возвращает план запроса, выбравшего страницу из wishes_wish."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        sql = next(
+            query['sql'] for query in captured.captured_queries
+            if 'FROM "wishes_wish"' in query['sql'] and 'ORDER BY' in query['sql']
+        )
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # На маленькой таблице Seq Scan дешевле любого индекса, запрещаем его
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def assertIndexScan(self, url: str, params: dict) -> None:
+        plan = self.explain_list(url, params)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan on wishes_wish', plan)
+            self.assertNotRegex(plan, r'(?m)^\s*(->\s*)?Sort ')
+        else:
+            self.assertNotRegex(plan, r'SCAN wishes_wish(?! USING)')
+            self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_list_by_wishlist(self):
+        self.assertIndexScan('/api/wishes/', {'wishlist_id': self.wishlist.id})
+
+    def test_list_by_user(self):
+        self.assertIndexScan('/api/wishes/', {'user_id': self.owner.id})
+
+    def test_list_by_user_and_status(self):
+        self.assertIndexScan('/api/wishes/', {'user_id': self.owner.id, 'status': 'fulfilled'})
+
+    def test_list_reserved_by(self):
+        self.assertIndexScan('/api/wishes/', {'reserved_by_id': self.friend.id, 'status': 'reserved'})
+
+    def test_list_gifted_by(self):
+        self.assertIndexScan('/api/wishes/', {'gifted_by_id': self.friend.id, 'status': 'fulfilled'})
+
+    def test_by_telegram_id(self):
+        self.assertIndexScan('/api/wishes/by_telegram_id/', {'telegram_id': self.owner.telegram_id})
+
+
+class TelegramIdCacheTests(TestCase):
+    """telegram_id разрешается в id пользователя без повторных запросов к users_user."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=6001, first_name='Владелец')
+        Wishlist.objects.create(user=cls.owner, name='Кэш')
+
+    def setUp(self):
+        self.client = APIClient()
+        telegram_id_cache.clear()
+        self.addCleanup(telegram_id_cache.clear)
+
+    def user_lookups(self, url: str, params: dict) -> int:
+        """Выполняет GET-запрос и возвращает число запросов к users_user по telegram_id."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return sum('"telegram_id" =' in query['sql'] for query in captured.captured_queries)
+
+    def test_repeat_lookups_are_cached(self):
+        params = {'telegram_id': self.owner.telegram_id}
+        self.assertEqual(self.user_lookups('/api/wishlists/by_telegram_id/', params), 1)
+        self.assertEqual(self.user_lookups('/api/wishlists/by_telegram_id/', params), 0)
+        self.assertEqual(self.user_lookups('/api/wishes/', params), 0)
+
+    def test_create_wishlist_resolves_user_once(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(
+                '/api/wishlists/', {'telegram_id': self.owner.telegram_id, 'name': 'Новый'}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sum('"telegram_id" =' in query['sql'] for query in captured.captured_queries), 1)
+        self.assertEqual(Wishlist.objects.get(pk=response.data['id']).user, self.owner)
+
+    def test_invalidated_on_telegram_id_change_and_delete(self):
+        self.user_lookups('/api/wishlists/by_telegram_id/', {'telegram_id': 6001})
+        self.owner.telegram_id = 6002
+        self.owner.save()
+        response = self.client.get('/api/wishlists/by_telegram_id/', {'telegram_id': 6001})
+        self.assertEqual(response.status_code, 404)
+
+        self.user_lookups('/api/wishlists/by_telegram_id/', {'telegram_id': 6002})
+        self.owner.delete()
+        response = self.client.get('/api/wishlists/by_telegram_id/', {'telegram_id': 6002})
+        self.assertEqual(response.status_code, 404)
+
+
+class ResponseCacheTests(TestCase):
+    """Списки вишлиста и владельца кэшируются и сбрасываются при изменениях."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=8001, first_name='Владелец')
+        cls.friend = User.objects.create(telegram_id=8002, first_name='Друг')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='День рождения')
+        cls.wish = Wish.objects.create(wishlist=cls.wishlist, user=cls.owner, title='Книга')
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def get(self, url: str, params: dict, **headers):
+        """Выполняет GET-запрос и возвращает (ответ, число SQL-запросов)."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params, headers=headers)
+        return response, len(captured)
+
+    def test_repeat_read_is_served_from_cache(self):
+        params = {'wishlist_id': self.wishlist.id}
+        first, _ = self.get('/api/wishes/', params)
+        second, queries = self.get('/api/wishes/', params)
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        params = {'user_id': self.owner.id}
+        first, _ = self.get('/api/wishlists/', params)
+        response, queries = self.get('/api/wishlists/', params, if_none_match=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(queries, 0)
+
+    def test_reserve_invalidates_wishlist_and_owner(self):
+        wishes, _ = self.get('/api/wishes/', {'wishlist_id': self.wishlist.id})
+        wishlists, _ = self.get('/api/wishlists/', {'user_id': self.owner.id})
+
+        self.client.post(f'/api/wishes/{self.wish.id}/reserve/', {'reserved_by_id': self.friend.id})
+
+        response, _ = self.get('/api/wishes/', {'wishlist_id': self.wishlist.id}, if_none_match=wishes['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['status'], 'reserved')
+        response, _ = self.get('/api/wishlists/', {'user_id': self.owner.id})
+        self.assertNotEqual(response['ETag'], wishlists['ETag'])
+        self.assertEqual(response.data['results'][0]['reserved_wishes_count'], 1)
+
+    def test_wishlist_rename_and_wish_delete_invalidate(self):
+        params = {'wishlist_id': self.wishlist.id}
+        self.get('/api/wishes/', params)
+
+        self.client.patch(f'/api/wishlists/{self.wishlist.id}/', {'name': 'Новый год'}, format='json')
+        response, _ = self.get('/api/wishes/', params)
+        self.assertEqual(response.data['results'][0]['wishlist_name'], 'Новый год')
+
+        self.client.delete(f'/api/wishes/{self.wish.id}/')
+        response, _ = self.get('/api/wishes/', params)
+        self.assertEqual(response.data['results'], [])
+
+    def test_move_invalidates_source_wishlist(self):
+        target = Wishlist.objects.create(user=self.owner, name='Новый год')
+        self.get('/api/wishes/', {'wishlist_id': self.wishlist.id})
+
+        self.client.post(f'/api/wishes/{self.wish.id}/move/', {'wishlist_id': target.id})
+        response, _ = self.get('/api/wishes/', {'wishlist_id': self.wishlist.id})
+        self.assertEqual(response.data['results'], [])
+
+        # Перемещение через PATCH сбрасывает кэш так же, как move
+        self.get('/api/wishes/', {'wishlist_id': target.id})
+        self.client.patch(f'/api/wishes/{self.wish.id}/', {'wishlist': self.wishlist.id}, format='json')
+        response, _ = self.get('/api/wishes/', {'wishlist_id': target.id})
+        self.assertEqual(response.data['results'], [])
+
+
+class ConditionalGetTests(TestCase):
+    """Списки и объекты отвечают 304, пока отпечаток updated_at/количества не изменился."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=9001, first_name='Владелец')
+        cls.friend = User.objects.create(telegram_id=9002, first_name='Друг')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='Праздник')
+        cls.wishes = [
+            Wish.objects.create(wishlist=cls.wishlist, user=cls.owner, title=f'Желание {i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = '/api/wishes/by_telegram_id/'
+        self.params = {'telegram_id': self.owner.telegram_id}
+
+    def revalidate(self, first, url=None, params=None):
+        """Повторяет запрос с валидаторами из первого ответа и возвращает (ответ, SQL-запросы)."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(
+                url or self.url,
+                self.params if params is None else params,
+                headers={'if-none-match': first['ETag'], 'if-modified-since': first.get('Last-Modified', '')},
+            )
+        return response, captured.captured_queries
+
+    def test_unchanged_list_returns_304_with_one_query(self):
+        first = self.client.get(self.url, self.params)
+        self.assertEqual(first.status_code, 200)
+        response, queries = self.revalidate(first)
+        self.assertEqual(response.status_code, 304)
+        # telegram_id уже в кэше, остается только агрегат отпечатка
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+    def test_update_changes_fingerprint(self):
+        first = self.client.get(self.url, self.params)
+        self.client.post(f'/api/wishes/{self.wishes[0].id}/reserve/', {'reserved_by_id': self.friend.id})
+        response, _ = self.revalidate(first)
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete_changes_fingerprint(self):
+        first = self.client.get('/api/wishlists/by_telegram_id/', self.params)
+        self.client.delete(f'/api/wishes/{self.wishes[1].id}/')
+        response, _ = self.revalidate(first, '/api/wishlists/by_telegram_id/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['wishes_count'], 2)
+        self.assertIsNotNone(User.objects.get(pk=self.owner.pk).wishes_changed_at)
+
+    def test_if_modified_since_only(self):
+        url = f'/api/wishes/{self.wishes[0].id}/'
+        first = self.client.get(url)
+        response = self.client.get(url, headers={'if-modified-since': first['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_row_leaving_filtered_list_changes_fingerprint(self):
+        for wish in self.wishes[:2]:
+            self.client.post(f'/api/wishes/{wish.id}/reserve/', {'reserved_by_id': self.friend.id})
+        url, params = '/api/wishes/', {'reserved_by_id': self.friend.id, 'status': 'reserved'}
+        first = self.client.get(url, params)
+        self.assertEqual(len(first.data['results']), 2)
+        # MAX(updated_at) оставшейся строки не меняется, поэтому списки без Last-Modified
+        self.assertNotIn('Last-Modified', first)
+        since = http_date(time.time() + 60)
+
+        self.client.patch(f'/api/wishes/{self.wishes[1].id}/', {'status': 'active'}, format='json')
+        response, _ = self.revalidate(first, url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get(url, params, headers={'if-modified-since': since})
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve(self):
+        url = f'/api/wishes/{self.wishes[2].id}/'
+        first = self.client.get(url)
+        response, queries = self.revalidate(first, url, {})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+        self.client.patch(f'/api/wishlists/{self.wishlist.id}/', {'name': 'Новый год'}, format='json')
+        response, _ = self.revalidate(first, url, {})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['wishlist_name'], 'Новый год')
+
+    def test_retrieve_missing(self):
+        self.assertEqual(self.client.get('/api/wishes/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/wishes/abc/').status_code, 404)
+
+
+class WishChangesTests(TestCase):
+    """/api/wishes/changes/ возвращает только изменения и удаления после токена."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=9101, first_name='Владелец')
+        cls.reader = User.objects.create(telegram_id=9102, first_name='Подписчик')
+        cls.reader.subscriptions.add(cls.owner)
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='Синхронизация')
+        cls.wishes = [
+            Wish.objects.create(wishlist=cls.wishlist, user=cls.owner, title=f'Желание {i}')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def changes(self, **params) -> dict:
+        response = self.client.get('/api/wishes/changes/', {'user_id': self.owner.id, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def age(self, seconds: int) -> None:
+        """Сдвигает время изменений в прошлое, за окно перекрытия курсора."""
+        past = timezone.now() - timedelta(seconds=seconds)
+        Wish.objects.update(updated_at=past)
+        WishTombstone.objects.update(deleted_at=past)
+
+    def test_snapshot_pages_then_deltas(self):
+        ids, token = [], None
+        while True:
+            data = self.changes(limit=2, **({'since': token} if token else {}))
+            ids += [wish['id'] for wish in data['changed']]
+            token = data['next']
+            if not data['has_more']:
+                break
+        self.assertEqual(sorted(ids), sorted(wish.id for wish in self.wishes))
+
+        self.age(60)
+        data = self.changes(since=token)
+        token = data['next']
+        self.age(60)
+        self.assertEqual(self.changes(since=token)['changed'], [])
+
+        self.client.post(f'/api/wishes/{self.wishes[0].id}/reserve/', {})
+        self.client.delete(f'/api/wishes/{self.wishes[1].id}/')
+        data = self.changes(since=token)
+        self.assertEqual([wish['id'] for wish in data['changed']], [self.wishes[0].id])
+        self.assertEqual(data['changed'][0]['status'], 'reserved')
+        self.assertEqual(data['deleted'], [self.wishes[1].id])
+
+    def test_subscriber_scope(self):
+        data = self.client.get('/api/wishes/changes/', {'subscriber_id': self.reader.id}).data
+        self.assertEqual(len(data['changed']), 5)
+        data = self.client.get('/api/wishes/changes/', {'subscriber_id': self.owner.id}).data
+        self.assertEqual(data['changed'], [])
+
+    def test_expired_and_invalid_tokens(self):
+        token = self.changes()['next']
+        WishTombstone.objects.create(wish_id=1, wishlist_id=1, user_id=self.owner.id)
+        with self.settings(SYNC_TOMBSTONE_RETENTION_DAYS=0):
+            response = self.client.get('/api/wishes/changes/', {'user_id': self.owner.id, 'since': token})
+        self.assertEqual(response.status_code, 410)
+        response = self.client.get('/api/wishes/changes/', {'user_id': self.owner.id, 'since': 'мусор'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/wishes/changes/').status_code, 400)
+
+    def test_prune_command(self):
+        self.client.delete(f'/api/wishes/{self.wishes[2].id}/')
+        self.age(40 * 24 * 3600)
+        call_command('prune_wish_tombstones', stdout=StringIO())
+        self.assertFalse(WishTombstone.objects.exists())
+
+
+class WishEventsTests(TestCase):
+    """События желаний отправляются после коммита и доходят до подписчиков вишлиста."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=9201, first_name='Владелец')
+        cls.friend = User.objects.create(telegram_id=9202, first_name='Друг')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='События')
+        cls.other_wishlist = Wishlist.objects.create(user=cls.owner, name='Другой')
+        cls.wish = Wish.objects.create(wishlist=cls.wishlist, user=cls.owner, title='Велосипед')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def sent_events(self, func) -> list[dict]:
+        """Выполняет func и возвращает события, отправленные после коммита."""
+        with mock.patch.object(events, 'send') as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                func()
+        return [call.args[0] for call in send.call_args_list]
+
+    def test_actions_publish_events(self):
+        url = f'/api/wishes/{self.wish.id}'
+        sent = self.sent_events(lambda: self.client.post(f'{url}/reserve/', {'reserved_by_id': self.friend.id}))
+        self.assertEqual([(e['type'], e['reserved_by_id']) for e in sent], [('reserved', self.friend.id)])
+
+        sent = self.sent_events(lambda: self.client.post(f'{url}/fulfill/'))
+        self.assertEqual([e['type'] for e in sent], ['fulfilled'])
+
+        sent = self.sent_events(lambda: self.client.delete(f'{url}/fulfill/'))
+        self.assertEqual([(e['type'], e['status']) for e in sent], [('unfulfilled', 'active')])
+
+        sent = self.sent_events(lambda: self.client.post(f'{url}/move/', {'wishlist_id': self.other_wishlist.id}))
+        self.assertEqual(
+            [(e['type'], e['wishlist_id'], e['from_wishlist_id']) for e in sent],
+            [('moved', self.other_wishlist.id, self.wishlist.id)],
+        )
+
+    def test_patch_status_publishes_status_events(self):
+        url = f'/api/wishes/{self.wish.id}/'
+
+        def patch(data):
+            return self.sent_events(lambda: self.client.patch(url, data, format='json'))
+
+        sent = patch({'status': 'reserved', 'reserved_by': self.friend.id})
+        self.assertEqual([(e['type'], e['reserved_by_id']) for e in sent], [('reserved', self.friend.id)])
+        self.assertEqual([e['type'] for e in patch({'status': 'fulfilled'})], ['fulfilled'])
+        self.assertEqual([(e['type'], e['status']) for e in patch({'status': 'active'})], [('unfulfilled', 'active')])
+        self.assertEqual([e['type'] for e in patch({'title': 'Самокат'})], ['updated'])
+
+    def test_create_and_delete_publish_events(self):
+        sent = self.sent_events(lambda: self.client.post(
+            '/api/wishes/', {'wishlist': self.wishlist.id, 'title': 'Книга'}, format='json',
+        ))
+        self.assertEqual([(e['type'], e['wishlist_id']) for e in sent], [('created', self.wishlist.id)])
+
+        sent = self.sent_events(lambda: self.client.delete(f'/api/wishes/{self.wish.id}/'))
+        self.assertEqual([(e['type'], e['wish_id']) for e in sent], [('deleted', self.wish.id)])
+
+    def test_rejected_reservation_publishes_nothing(self):
+        Wish.objects.filter(pk=self.wish.pk).update(status='fulfilled')
+        sent = self.sent_events(lambda: self.client.post(f'/api/wishes/{self.wish.id}/reserve/'))
+        self.assertEqual(sent, [])
+
+    async def test_broadcaster_delivers_once_per_subscriber(self):
+        broadcaster = events.Broadcaster(queue_size=2)
+        watcher = broadcaster.subscribe([1, 2])
+        stranger = broadcaster.subscribe([3])
+
+        broadcaster.dispatch({'type': 'moved', 'wishlist_id': 2, 'from_wishlist_id': 1})
+        self.assertEqual((await watcher.get(1))['type'], 'moved')
+        self.assertIsNone(await watcher.get(0.01))
+        self.assertIsNone(await stranger.get(0.01))
+
+        # Медленный подписчик получает resync вместо пропущенных событий
+        for _ in range(3):
+            broadcaster.dispatch({'type': 'updated', 'wishlist_id': 1})
+        await asyncio.sleep(0)
+        self.assertEqual((await watcher.get(1))['type'], 'resync')
+
+        broadcaster.unsubscribe(watcher)
+        broadcaster.unsubscribe(stranger)
+        self.assertEqual(len(broadcaster), 0)
+
+    async def test_event_stream(self):
+        client = AsyncClient()
+        response = await client.get('/api/events/', {'wishlist_id': [self.wishlist.id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        events.send({'type': 'reserved', 'wish_id': self.wish.id, 'wishlist_id': self.wishlist.id})
+        self.assertIn(b'"type": "reserved"', await anext(chunks))
+        await chunks.aclose()
+
+    def test_event_stream_requires_wishlist_ids(self):
+        self.assertEqual(self.client.get('/api/events/').status_code, 400)
+        self.assertEqual(self.client.get('/api/events/', {'wishlist_id': 'x'}).status_code, 400)
+
+
+
+class BulkEndpointsTests(TestCase):
+    """Пакетное создание и изменение порядка выполняются за фиксированное число запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=9301, first_name='Владелец')
+        cls.stranger = User.objects.create(telegram_id=9302, first_name='Чужой')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='Пакет')
+        cls.other_wishlist = Wishlist.objects.create(user=cls.owner, name='Второй')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_writes(self, method, url: str, data: dict) -> tuple[object, int]:
+        """Выполняет запрос и возвращает (ответ, число SELECT/INSERT/UPDATE)."""
+        with CaptureQueriesContext(connection) as captured:
+            response = method(url, data, format='json')
+        statements = [q['sql'] for q in captured if q['sql'].split()[0] in ('SELECT', 'INSERT', 'UPDATE')]
+        return response, len(statements)
+
+    def test_bulk_create_wishes(self):
+        items = [{'wishlist': self.wishlist.id, 'title': f'Желание {i}', 'price': '10.00'} for i in range(30)]
+        items[-1]['wishlist'] = self.other_wishlist.id
+        response, queries = self.count_writes(self.client.post, '/api/wishes/bulk/', {'wishes': items})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data), 30)
+        self.assertEqual(response.data[0]['user_id'], self.owner.id)
+        self.assertEqual(response.data[-1]['wishlist_name'], 'Второй')
+        # Вишлисты одним SELECT, желания одним INSERT
+        self.assertEqual(queries, 2)
+        self.assertEqual(Wish.objects.filter(user=self.owner).count(), 30)
+
+    def test_bulk_create_wishes_with_images(self):
+        prefix = 'https://makrei.ru/media/'
+        uploads = [
+            ImageUpload.objects.create(
+                original=f'{images.IMAGES_DIR}/{i:064x}.png',
+                processed=f'{images.IMAGES_DIR}/{i:064x}.jpg',
+                url_prefix=prefix,
+                status='ready',
+            )
+            for i in range(10)
+        ]
+        items = [
+            {'wishlist': self.wishlist.id, 'title': f'Желание {i}', 'image_url': upload.original_url}
+            for i, upload in enumerate(uploads)
+        ]
+        items.append({'wishlist': self.wishlist.id, 'title': 'Внешнее', 'image_url': 'https://example.com/a.png'})
+        response, queries = self.count_writes(self.client.post, '/api/wishes/bulk/', {'wishes': items})
+        self.assertEqual(response.status_code, 201, response.data)
+        # Вишлисты и загрузки по одному SELECT, желания одним INSERT
+        self.assertEqual(queries, 3)
+        self.assertEqual(
+            [wish['image_url'] for wish in response.data],
+            [upload.image_url for upload in uploads] + ['https://example.com/a.png'],
+        )
+        self.assertEqual(
+            set(Wish.objects.exclude(image=None).values_list('image_id', flat=True)),
+            {upload.id for upload in uploads},
+        )
+
+    def test_bulk_create_is_all_or_nothing(self):
+        items = [{'wishlist': self.wishlist.id, 'title': 'Хорошее'}, {'wishlist': 999999, 'title': 'Плохое'}]
+        response = self.client.post('/api/wishes/bulk/', {'wishes': items}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('wishlist', response.data[1])
+        self.assertFalse(Wish.objects.exists())
+
+        response = self.client.post('/api/wishes/bulk/', {'wishes': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_reorder_wishes(self):
+        wishes = [Wish.objects.create(wishlist=self.wishlist, user=self.owner, title=f'Ж{i}', order=i) for i in range(50)]
+        ids = [wish.id for wish in reversed(wishes)]
+        response, queries = self.count_writes(self.client.patch, '/api/wishes/reorder/', {'ids': ids})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(queries, 2)
+        listed = self.client.get('/api/wishes/', {'wishlist_id': self.wishlist.id, 'page_size': 100}).data['results']
+        self.assertEqual([wish['id'] for wish in listed], ids)
+
+    def test_reorder_rejects_mixed_and_missing_ids(self):
+        first = Wish.objects.create(wishlist=self.wishlist, user=self.owner, title='Первое')
+        second = Wish.objects.create(wishlist=self.other_wishlist, user=self.owner, title='Второе')
+        for ids in ([first.id, second.id], [first.id, 999999], [first.id, first.id], ['x']):
+            response = self.client.patch('/api/wishes/reorder/', {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, 400, ids)
+
+    def test_bulk_create_and_reorder_wishlists(self):
+        response = self.client.post('/api/wishlists/bulk/', {
+            'telegram_id': self.owner.telegram_id,
+            'wishlists': [{'name': 'День рождения'}, {'name': 'Новый год', 'event_date': '2026-12-31'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([w['wishes_count'] for w in response.data], [0, 0])
+
+        ids = [w['id'] for w in response.data] + [self.other_wishlist.id, self.wishlist.id]
+        response = self.client.patch('/api/wishlists/reorder/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        listed = self.client.get('/api/wishlists/', {'user_id': self.owner.id}).data['results']
+        self.assertEqual([w['id'] for w in listed], ids)
+
+        other = Wishlist.objects.create(user=self.stranger, name='Чужой')
+        response = self.client.patch('/api/wishlists/reorder/', {'ids': [self.wishlist.id, other.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/wishlists/bulk/', {'wishlists': [{'name': 'Без владельца'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CopyCloneTests(TestCase):
+    """Копирование желания и клонирование вишлиста сбрасывают статус и не зависят от размера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=9401, first_name='Владелец')
+        cls.friend = User.objects.create(telegram_id=9402, first_name='Друг')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='Оригинал', description='Описание')
+        cls.friend_wishlist = Wishlist.objects.create(user=cls.friend, name='Мой')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def fill(self, size: int) -> list[Wish]:
+        """Создает size желаний с разными статусами (порядок частично совпадает)."""
+        return [
+            Wish.objects.create(
+                wishlist=self.wishlist,
+                user=self.owner,
+                title=f'Желание {i}',
+                image_url=f'https://example.com/media/wishes/{i}.jpg',
+                price='99.90',
+                order=i // 3,
+                status=('active', 'reserved', 'fulfilled')[i % 3],
+                reserved_by=self.friend if i % 3 == 1 else None,
+                gifted_by=self.friend if i % 3 == 2 else None,
+            )
+            for i in range(size)
+        ]
+
+    def test_copy_wish_to_friend_wishlist(self):
+        source = self.fill(3)[1]
+        response = self.client.post(f'/api/wishes/{source.id}/copy/', {'wishlist_id': self.friend_wishlist.id})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['user_id'], self.friend.id)
+        self.assertEqual(response.data['status'], 'active')
+        self.assertIsNone(response.data['reserved_by_id'])
+        self.assertEqual(response.data['image_url'], source.image_url)
+
+        self.assertEqual(self.client.post(f'/api/wishes/{source.id}/copy/', {}).status_code, 400)
+        self.assertEqual(self.client.post(f'/api/wishes/{source.id}/copy/', {'wishlist_id': 999999}).status_code, 404)
+
+    def test_clone_wishlist(self):
+        self.fill(12)
+        original = [w['title'] for w in self.client.get('/api/wishes/', {'wishlist_id': self.wishlist.id}).data['results']]
+
+        response = self.client.post(f'/api/wishlists/{self.wishlist.id}/clone/', {'telegram_id': self.friend.telegram_id})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['name'], 'Оригинал (копия)')
+        self.assertEqual(response.data['user'], self.friend.id)
+        self.assertEqual((response.data['wishes_count'], response.data['active_wishes_count']), (12, 12))
+
+        clone_id = response.data['id']
+        cloned = self.client.get('/api/wishes/', {'wishlist_id': clone_id}).data['results']
+        self.assertEqual([w['title'] for w in cloned], original)
+        self.assertTrue(all(w['user_id'] == self.friend.id and w['gifted_by_id'] is None for w in cloned))
+        # Исходный вишлист не изменился
+        self.assertEqual(Wish.objects.filter(wishlist=self.wishlist, status='fulfilled').count(), 4)
+
+    def test_clone_query_count_is_constant(self):
+        def clone_queries(size: int) -> int:
+            Wish.objects.filter(wishlist=self.wishlist).delete()
+            self.fill(size)
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.post(f'/api/wishlists/{self.wishlist.id}/clone/', {'name': 'Копия'})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data['wishes_count'], size)
+            return len(captured)
+
+        self.assertEqual(clone_queries(3), clone_queries(30))
+
+
+def make_image(size=(3000, 1000), mode='RGBA', fmt='PNG') -> SimpleUploadedFile:
+    """Создает загружаемый файл изображения заданного размера."""
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 100, 50, 128) if mode == 'RGBA' else (200, 100, 50)).save(buffer, fmt)
+    return SimpleUploadedFile(f'image.{fmt.lower()}', buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class TemporaryMediaMixin:
+    """Подменяет MEDIA_ROOT временным каталогом на время теста."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def use_pipeline(self, workers: int, queue_size: int = 4) -> images.ImagePipeline:
+        pipeline = images.ImagePipeline(workers=workers, queue_size=queue_size)
+        patcher = mock.patch.object(images, 'pipeline', pipeline)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(pipeline.shutdown)
+        return pipeline
+
+
+class ImageUploadTests(TemporaryMediaMixin, TestCase):
+    """Загрузка сохраняет оригинал, обработка подменяет его адрес в желаниях."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=9501, first_name='Владелец')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='С картинками')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.use_pipeline(workers=0)
+
+    def test_processed_url_replaces_original(self):
+        upload, _ = images.save_original(make_image(), 'image/png', 'http://localhost/media/')
+        wish = Wish.objects.create(wishlist=self.wishlist, user=self.owner, title='Лампа', image_url=upload.original_url)
+
+        images.process_now(upload)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'ready')
+        with Image.open(images.media_path(upload.processed)) as processed:
+            self.assertEqual((processed.format, processed.mode, processed.size), ('JPEG', 'RGB', (2000, 667)))
+        wish.refresh_from_db()
+        self.assertEqual(wish.image_url, upload.image_url)
+
+        # Адрес оригинала, сохраненный после обработки, тоже подменяется
+        response = self.client.post('/api/wishes/', {
+            'wishlist': self.wishlist.id, 'title': 'Лампа 2', 'image_url': upload.original_url,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['image_url'], upload.image_url)
+
+    def test_derivatives_and_srcset(self):
+        upload, _ = images.save_original(make_image(), 'image/png', 'http://localhost/media/')
+        images.process_now(upload)
+        upload.refresh_from_db()
+
+        sizes = sorted((variant['type'], variant['width']) for variant in upload.variants)
+        expected = [('image/jpeg', 160), ('image/jpeg', 480), ('image/jpeg', 1080), ('image/jpeg', 2000)]
+        if image_processing.HAS_WEBP:
+            expected += [('image/webp', 160), ('image/webp', 480), ('image/webp', 1080)]
+        self.assertEqual(sizes, sorted(expected))
+        for variant in upload.variants:
+            with Image.open(images.media_path(variant['name'])) as derivative:
+                self.assertEqual(derivative.size, (variant['width'], variant['height']))
+
+        response = self.client.post('/api/wishes/', {
+            'wishlist': self.wishlist.id, 'title': 'Лампа', 'image_url': upload.original_url,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        wish = Wish.objects.get(title='Лампа')
+        self.assertEqual(wish.image_id, upload.id)
+        srcset = self.client.get(f'/api/wishes/{wish.id}/').data['image_srcset']
+        self.assertRegex(srcset['image/jpeg'], rf'^http://localhost/media/{images.IMAGES_DIR}/[0-9a-f/]{{6}}[0-9a-f]{{64}}\.jpg 160w, ')
+        self.assertTrue(srcset['image/jpeg'].endswith('.jpg 2000w'))
+
+        # Внешний адрес отвязывает загрузку
+        self.client.patch(f'/api/wishes/{wish.id}/', {'image_url': 'https://example.com/a.jpg'}, format='json')
+        wish.refresh_from_db()
+        self.assertIsNone(wish.image_id)
+
+    def test_placeholder_is_returned_with_wish(self):
+        upload, _ = images.save_original(make_image(mode='RGB'), 'image/png', 'http://localhost/media/')
+        Wish.objects.create(wishlist=self.wishlist, user=self.owner, title='Лампа', image_url=upload.original_url)
+        images.process_now(upload)
+
+        placeholder = self.client.get(f'/api/wishes/?wishlist_id={self.wishlist.id}').data['results'][0]['image_placeholder']
+        self.assertEqual((placeholder['width'], placeholder['height'], placeholder['color']), (2000, 667, '#c86432'))
+        prefix = 'data:image/jpeg;base64,'
+        self.assertTrue(placeholder['data_url'].startswith(prefix))
+        with Image.open(BytesIO(base64.b64decode(placeholder['data_url'][len(prefix):]))) as preview:
+            self.assertEqual(preview.size, (20, 7))
+
+        # Загрузки без заглушки обрабатываются заново командой
+        ImageUpload.objects.update(placeholder=None)
+        call_command('process_images', missing_placeholders=True, stdout=StringIO())
+        self.assertEqual(ImageUpload.objects.get().placeholder, placeholder)
+
+    def test_exif_orientation_is_applied(self):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Повернуто на 90° по часовой стрелке
+        Image.new('RGB', (300, 100), (200, 100, 50)).save(buffer, 'JPEG', exif=exif)
+        upload, _ = images.save_original(
+            SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            'image/jpeg',
+            'http://localhost/media/',
+        )
+        upload = images.process_now(upload)
+        with Image.open(images.media_path(upload.processed)) as processed:
+            self.assertEqual(processed.size, (100, 300))
+            self.assertNotIn(0x0112, processed.getexif())
+
+    def test_upload_endpoint_and_status(self):
+        response = self.client.post('/api/wishes/upload-image/', {'image': make_image((300, 200))})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['status'], 'ready')
+        self.assertTrue(response.data['image_url'].endswith('.jpg'))
+
+        status_response = self.client.get(f'/api/wishes/upload-image/{response.data["id"]}/')
+        self.assertEqual(status_response.data['image_url'], response.data['image_url'])
+        self.assertEqual(self.client.get(f'/api/wishes/upload-image/{"0" * 32}/').status_code, 404)
+
+    def test_broken_image_keeps_original(self):
+        broken = SimpleUploadedFile('broken.png', b'\x89PNG\r\n\x1a\nnot an image', content_type='image/png')
+        with self.assertLogs('wishes.images', 'WARNING'):
+            response = self.client.post('/api/wishes/upload-image/', {'image': broken})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertTrue(response.data['image_url'].endswith('.png'))
+
+    def test_full_queue_rejects_upload(self):
+        pipeline = self.use_pipeline(workers=1, queue_size=1)
+        pipeline._slots.acquire()
+        self.addCleanup(pipeline._slots.release)
+
+        response = self.client.post('/api/wishes/upload-image/', {'image': make_image((10, 10))})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertEqual([files for _, _, files in os.walk(images.media_path(images.IMAGES_DIR))], [[], [], []])
+
+
+class StreamingUploadTests(TemporaryMediaMixin, TestCase):
+    """upload-image пишет файл на диск по частям и проверяет его по первым байтам."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.use_pipeline(workers=0)
+
+    def stored_files(self) -> list[str]:
+        return [name for _, _, names in os.walk(images.media_path(images.IMAGES_DIR)) for name in names]
+
+    def test_type_is_detected_from_content(self):
+        image = make_image((300, 200), mode='RGB', fmt='JPEG')
+        image.content_type = 'image/png'
+        response = self.client.post('/api/wishes/upload-image/', {'image': image})
+        self.assertEqual(response.status_code, 201, response.data)
+        upload = ImageUpload.objects.get()
+        self.assertTrue(upload.original.endswith(f'{hashlib.sha256(image.file.getvalue()).hexdigest()}.jpg'))
+
+    def test_unknown_signature_is_rejected(self):
+        fake = SimpleUploadedFile('fake.png', b'<svg xmlns="http://www.w3.org/2000/svg"/>' * 100, content_type='image/png')
+        response = self.client.post('/api/wishes/upload-image/', {'image': fake})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], uploads.TYPE_ERROR)
+        self.assertEqual(self.stored_files(), [])
+        self.assertFalse(ImageUpload.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024 * 1024)
+    def test_oversized_upload_is_rejected(self):
+        # Content-Length больше лимита: тело не разбирается
+        response = self.client.post('/api/wishes/upload-image/', {'image': make_image((1000, 1000), mode='RGB', fmt='BMP')})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Размер файла превышает 1 МБ')
+
+        # Content-Length в пределах запаса, но файл больше лимита: прием прекращается
+        handler = uploads.ImageUploadHandler()
+        handler.new_file('image', 'big.png', 'image/png', None)
+        handler.receive_data_chunk(b'\x89PNG\r\n\x1a\n' + b'0' * 1024, 0)
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(b'0' * 1024 * 1024, 1032)
+        self.assertEqual(handler.error, 'Размер файла превышает 1 МБ')
+        self.assertEqual(self.stored_files(), [])
+
+
+@override_settings(IMAGE_UPLOAD_CHUNK_SIZE=64 * 1024)
+class ChunkedUploadTests(TemporaryMediaMixin, TestCase):
+    """Загрузка частями продолжается с полученного смещения после обрыва."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.use_pipeline(workers=0)
+        # Шум не сжимается: PNG на несколько частей
+        buffer = BytesIO()
+        Image.frombytes('RGB', (300, 300), os.urandom(300 * 300 * 3)).save(buffer, 'PNG')
+        self.data = buffer.getvalue()
+        self.chunk = 64 * 1024
+
+    def put_chunk(self, session_id: str, start: int, end: int = None):
+        end = min(end or start + self.chunk, len(self.data))
+        return self.client.put(
+            f'/api/wishes/uploads/{session_id}/',
+            self.data[start:end],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end - 1}/{len(self.data)}',
+        )
+
+    def test_resume_after_interrupted_upload(self):
+        response = self.client.post('/api/wishes/uploads/', {'size': len(self.data)}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        session_id = response.data['id']
+        self.assertEqual((response.data['offset'], response.data['chunk_size']), (0, self.chunk))
+
+        self.assertEqual(self.put_chunk(session_id, 0).data['offset'], self.chunk)
+        # Часть после пропуска отклоняется с текущим смещением
+        response = self.put_chunk(session_id, 2 * self.chunk)
+        self.assertEqual((response.status_code, response.data['offset']), (409, self.chunk))
+        # Повтор уже полученной части не уменьшает смещение
+        self.assertEqual(self.put_chunk(session_id, 0).data['offset'], self.chunk)
+
+        offset = self.client.get(f'/api/wishes/uploads/{session_id}/').data['offset']
+        self.assertEqual(self.client.post(f'/api/wishes/uploads/{session_id}/finalize/').status_code, 409)
+        while offset < len(self.data):
+            offset = self.put_chunk(session_id, offset).data['offset']
+
+        response = self.client.post(f'/api/wishes/uploads/{session_id}/finalize/')
+        self.assertEqual(response.status_code, 201, response.data)
+        upload = ImageUpload.objects.get()
+        self.assertEqual(upload.original, f'{images.IMAGES_DIR}/{image_processing.content_name(hashlib.sha256(self.data).hexdigest(), ".png")}')
+        with open(images.media_path(upload.original), 'rb') as original:
+            self.assertEqual(original.read(), self.data)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(self.client.post(f'/api/wishes/uploads/{session_id}/finalize/').status_code, 404)
+        self.assertFalse([name for name in os.listdir(images.media_path(images.IMAGES_DIR)) if '.' in name])
+
+    def test_invalid_chunks_are_rejected(self):
+        self.assertEqual(self.client.post('/api/wishes/uploads/', {'size': 20 * 1024 * 1024}, format='json').status_code, 400)
+        session_id = self.client.post('/api/wishes/uploads/', {'size': len(self.data)}, format='json').data['id']
+
+        response = self.client.put(
+            f'/api/wishes/uploads/{session_id}/', self.data[:10], content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-99/{len(self.data)}',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.put_chunk(session_id, 0, 2 * self.chunk).status_code, 400)
+
+        self.data = b'<svg/>' + self.data[6:]
+        response = self.put_chunk(session_id, 0)
+        self.assertEqual((response.status_code, response.data['error']), (400, uploads.TYPE_ERROR))
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(images.media_path(images.IMAGES_DIR)), [])
+
+
+class ContentAddressedStorageTests(TemporaryMediaMixin, TestCase):
+    """Файлы хранятся по хэшу содержимого, один раз, и удаляются без ссылок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(telegram_id=9601, first_name='Владелец')
+        cls.wishlist = Wishlist.objects.create(user=cls.owner, name='С картинками')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.use_pipeline(workers=0)
+
+    def stored_files(self) -> list[str]:
+        root = images.media_path(images.IMAGES_DIR)
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), settings.MEDIA_ROOT)
+            for directory, _, names in os.walk(root) for name in names
+        )
+
+    def test_same_file_is_stored_once(self):
+        first = self.client.post('/api/wishes/upload-image/', {'image': make_image((300, 200))})
+        files = self.stored_files()
+        second = self.client.post('/api/wishes/upload-image/', {'image': make_image((300, 200))})
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(self.stored_files(), files)
+        self.assertEqual(ImageUpload.objects.count(), 1)
+        for name in files:
+            self.assertTrue(images.is_content_addressed(name), name)
+
+    def test_media_is_served_as_immutable(self):
+        response = self.client.post('/api/wishes/upload-image/', {'image': make_image((300, 200))})
+        path = response.data['image_url'].split('/media/', 1)[1]
+        media = self.client.get(f'/media/{path}')
+        self.assertEqual(media.status_code, 200)
+        self.assertEqual(media['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_cleanup_removes_only_unreferenced_files(self):
+        kept, _ = images.save_original(make_image((300, 200)), 'image/png', 'http://localhost/media/')
+        images.process_now(kept)
+        kept.refresh_from_db()
+        Wish.objects.create(wishlist=self.wishlist, user=self.owner, title='Лампа', image_url=kept.image_url, image=kept)
+        # Другой оригинал с тем же результатом обработки делит с первой загрузкой файлы
+        buffer = BytesIO()
+        Image.new('RGBA', (300, 200), (200, 100, 50, 128)).save(buffer, 'PNG', compress_level=1)
+        shared, _ = images.save_original(
+            SimpleUploadedFile('copy.png', buffer.getvalue(), content_type='image/png'),
+            'image/png',
+            'http://localhost/media/',
+        )
+        images.process_now(shared)
+        shared.refresh_from_db()
+        self.assertEqual(shared.processed, kept.processed)
+        orphan, _ = images.save_original(make_image((400, 100)), 'image/png', 'http://localhost/media/')
+        images.process_now(orphan)
+        orphan.refresh_from_db()
+
+        call_command('cleanup_images', older_than=-60, stdout=StringIO())
+
+        # shared остается: image_url желания указывает и на ее обработанный файл
+        self.assertEqual(set(ImageUpload.objects.all()), {kept, shared})
+        self.assertEqual(self.stored_files(), sorted(images.upload_files(kept) | images.upload_files(shared)))
+        self.assertFalse(images.upload_files(orphan) & set(self.stored_files()))
+
+class ImageProcessPoolTests(TemporaryMediaMixin, TransactionTestCase):
+    """Обработка в пуле процессов не блокирует запрос загрузки."""
+
+    def test_upload_is_processed_in_background(self):
+        self.use_pipeline(workers=1)
+        client = APIClient()
+        response = client.post('/api/wishes/upload-image/', {'image': make_image(mode='RGB', fmt='JPEG')})
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(response.data['status'], 'pending')
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            data = client.get(f'/api/wishes/upload-image/{response.data["id"]}/').data
+            if data['status'] != 'pending':
+                break
+            time.sleep(0.1)
+        self.assertEqual(data['status'], 'ready')
+        with Image.open(images.media_path(data['image_url'].split('/media/', 1)[1])) as processed:
+            self.assertEqual(processed.size, (2000, 667))
 
-# Create your tests here.
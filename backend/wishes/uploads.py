@@ -0,0 +1,290 @@
+"""
+Потоковый прием загружаемых изображений (upload-image).
+
+Стандартные обработчики Django держат файл меньше FILE_UPLOAD_MAX_MEMORY_SIZE
+в памяти воркера целиком, а больший копируют во временный файл.
+ImageUploadHandler пишет части файла сразу во временный файл в каталоге
+хранилища (wish_images/), попутно считая SHA-256, поэтому
+images.save_original переносит его на место одним переименованием, без
+повторного чтения и копирования.
+
+Проверки выполняются до чтения файла целиком:
+    - Content-Length больше IMAGE_UPLOAD_MAX_SIZE — тело не разбирается;
+    - первые байты не совпадают с сигнатурой JPEG, PNG, GIF или WebP —
+      прием прекращается на первой части;
+    - файл оказался больше IMAGE_UPLOAD_MAX_SIZE — прием прекращается.
+Причина отказа сохраняется в handler.error, view отвечает 400.
+
+Для нестабильных соединений есть загрузка частями (UploadSession):
+create_session создает временный файл <id>.part заявленного размера в
+каталоге хранилища, write_chunk пишет каждую часть по ее смещению
+(Content-Range), finalize считает SHA-256 и переименовывает файл в
+хранилище — части не склеиваются и не копируются. После обрыва клиент
+узнает session.received и досылает только недостающее. Заброшенные
+сессии удаляет команда cleanup_images.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db.models import Value
+from django.db.models.functions import Greatest
+from django.http import QueryDict
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from . import image_processing, images
+from .models import ImageUpload, UploadSession
+
+# Запас на границы multipart и остальные поля формы сверх размера файла
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Байтов достаточно для распознавания любой сигнатуры ниже
+HEADER_SIZE = 12
+
+TYPE_ERROR = 'Неподдерживаемый тип файла. Разрешены: JPEG, PNG, WebP, GIF'
+
+# Суффикс временных файлов сессий загрузки частями
+PART_SUFFIX = '.part'
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+# Размер блока чтения тела части и файла при подсчете хэша
+READ_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    """Часть или завершение не совпадают с полученными байтами.
+
+    offset — сколько байт сессии уже получено, с него клиент продолжает.
+    """
+
+    def __init__(self, offset: int):
+        super().__init__(offset)
+        self.offset = offset
+
+
+def sniff_content_type(header: bytes) -> str | None:
+    """Определяет тип изображения по первым байтам файла."""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def size_error() -> str:
+    return f'Размер файла превышает {settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)} МБ'
+
+
+class HashedUploadedFile(UploadedFile):
+    """Файл, записанный ImageUploadHandler во временный файл хранилища.
+
+    sha256 — хэш содержимого, content_type определен по сигнатуре.
+    """
+
+    def __init__(self, file, path: str, name, content_type, size, charset, sha256: str):
+        super().__init__(file, name, content_type, size, charset)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self) -> str:
+        return self.path
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Обработчик загрузки поля image: пишет файл на диск по частям."""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self.file = None
+        self.path = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        """Отклоняет слишком большой запрос по Content-Length, не разбирая тело."""
+        if content_length > settings.IMAGE_UPLOAD_MAX_SIZE + MULTIPART_OVERHEAD:
+            self.error = size_error()
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name != 'image' or self.file is not None:
+            return
+        self.root = images.media_path(images.IMAGES_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=self.root, suffix=image_processing.TEMPORARY_SUFFIX)
+        self.file = os.fdopen(fd, 'w+b')
+        self.digest = hashlib.sha256()
+        self.header = b''
+        self.sniffed_type = None
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> None:
+        # Остальные файлы формы не нужны и не сохраняются
+        if self.field_name != 'image' or self.file is None or self.file.closed:
+            return None
+        if self.sniffed_type is None and len(self.header) < HEADER_SIZE:
+            self.header += raw_data[:HEADER_SIZE - len(self.header)]
+            if len(self.header) == HEADER_SIZE:
+                self.check_type()
+        self.size += len(raw_data)
+        if self.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.abort(size_error())
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size: int) -> HashedUploadedFile | None:
+        if self.field_name != 'image' or self.file is None or self.file.closed:
+            return None
+        if self.sniffed_type is None:
+            self.check_type()
+        self.file.flush()
+        self.file.seek(0)
+        return HashedUploadedFile(
+            self.file,
+            self.path,
+            self.file_name,
+            self.sniffed_type,
+            self.size,
+            self.charset,
+            self.digest.hexdigest(),
+        )
+
+    def upload_interrupted(self) -> None:
+        self.remove()
+
+    def check_type(self) -> None:
+        self.sniffed_type = sniff_content_type(self.header)
+        if self.sniffed_type is None:
+            self.abort(TYPE_ERROR)
+
+    def abort(self, error: str) -> None:
+        """Прекращает прием, не дочитывая тело запроса."""
+        self.error = error
+        self.remove()
+        raise StopUpload(connection_reset=True)
+
+    def remove(self) -> None:
+        """Удаляет временный файл, если он еще не перенесен в хранилище."""
+        if self.file is not None:
+            self.file.close()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def part_path(session: UploadSession) -> str:
+    """Абсолютный путь временного файла сессии (в каталоге хранилища, для переименования)."""
+    return images.media_path(f'{images.IMAGES_DIR}/{session.id.hex}{PART_SUFFIX}')
+
+
+def create_session(size: int) -> UploadSession:
+    """Создает сессию и временный файл размера size; ValueError — недопустимый размер."""
+    if size <= 0:
+        raise ValueError('Размер файла должен быть больше нуля')
+    if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise ValueError(size_error())
+    session = UploadSession.objects.create(size=size)
+    os.makedirs(images.media_path(images.IMAGES_DIR), exist_ok=True)
+    # Файл сразу нужного размера: части пишутся по своим смещениям
+    with open(part_path(session), 'wb') as part:
+        part.truncate(size)
+    return session
+
+
+def parse_content_range(header: str | None, size: int) -> tuple[int, int]:
+    """Разбирает Content-Range: bytes start-end/size; возвращает [start, end)."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if match is None:
+        raise ValueError('Нужен заголовок Content-Range: bytes <начало>-<конец>/<размер>')
+    start, last, total = (int(value) for value in match.groups())
+    if total != size or start > last or last >= size:
+        raise ValueError('Content-Range не соответствует размеру файла')
+    if last - start + 1 > settings.IMAGE_UPLOAD_CHUNK_SIZE:
+        raise ValueError(f'Часть больше {settings.IMAGE_UPLOAD_CHUNK_SIZE} байт')
+    return start, last + 1
+
+
+def write_chunk(session: UploadSession, content_range: str | None, stream) -> UploadSession:
+    """Пишет тело части из stream по смещению из Content-Range.
+
+    Часть должна начинаться не дальше session.received, иначе OffsetMismatch.
+    received увеличивается условным UPDATE, поэтому повтор или параллельная
+    отправка уже полученной части его не уменьшают. Первая часть проверяется
+    по сигнатуре; при неизвестном типе сессия удаляется (ValueError).
+    """
+    start, end = parse_content_range(content_range, session.size)
+    if start > session.received:
+        raise OffsetMismatch(session.received)
+
+    fd = os.open(part_path(session), os.O_WRONLY)
+    try:
+        offset = start
+        header = b''
+        while offset < end:
+            data = stream.read(min(READ_SIZE, end - offset))
+            if not data:
+                break
+            if offset < HEADER_SIZE:
+                header += data[:HEADER_SIZE - offset]
+            os.pwrite(fd, data, offset)
+            offset += len(data)
+    finally:
+        os.close(fd)
+    if offset < end or stream.read(1):
+        raise ValueError('Длина тела не совпадает с Content-Range')
+
+    changes = {'received': Greatest('received', Value(end)), 'updated_at': timezone.now()}
+    if start == 0:
+        content_type = sniff_content_type(header)
+        if content_type is None:
+            discard_session(session)
+            raise ValueError(TYPE_ERROR)
+        changes['content_type'] = content_type
+    UploadSession.objects.filter(pk=session.pk, received__gte=start).update(**changes)
+    session.refresh_from_db(fields=['received', 'content_type', 'updated_at'])
+    return session
+
+
+def finalize(session: UploadSession, url_prefix: str) -> tuple[ImageUpload, bool]:
+    """Переносит полностью полученный файл в хранилище (см. images.store_original).
+
+    Сессия удаляется условным DELETE до переноса файла, поэтому повторное
+    завершение той же сессии получает UploadSession.DoesNotExist.
+    """
+    if session.received < session.size:
+        raise OffsetMismatch(session.received)
+    deleted, _ = UploadSession.objects.filter(pk=session.pk).delete()
+    if not deleted:
+        raise UploadSession.DoesNotExist
+    path = part_path(session)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        while data := part.read(READ_SIZE):
+            digest.update(data)
+    return images.store_original(path, digest.hexdigest(), session.content_type, url_prefix)
+
+
+def discard_session(session: UploadSession) -> None:
+    """Удаляет сессию и ее временный файл."""
+    path = part_path(session)
+    session.delete()
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
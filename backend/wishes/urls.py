@@ -1,12 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import WishlistViewSet, WishViewSet
+from .views import WishlistViewSet, WishViewSet, wish_events
 
 router = DefaultRouter()
 router.register(r'wishlists', WishlistViewSet, basename='wishlist')
 router.register(r'wishes', WishViewSet, basename='wish')
 
 urlpatterns = [
+    path('events/', wish_events, name='wish-events'),
     path('', include(router.urls)),
 ]
 
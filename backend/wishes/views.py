@@ -4,38 +4,67 @@ from rest_framework.response import Response
 from rest_framework.request import Request
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
-from django.utils import timezone
 from django.conf import settings
-from .models import Wishlist, Wish
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.views.static import serve
+from .models import ImageUpload, UploadSession, Wishlist, Wish, WishTombstone
+from .pagination import KeysetPagination
+from . import caching, events, images, services, sync, uploads
+from .caching import CachedListMixin, ConditionalGetMixin
 from .serializers import (
     WishlistSerializer,
     WishlistCreateSerializer,
     WishlistUpdateSerializer,
     WishSerializer,
     WishCreateSerializer,
+    WishBulkCreateSerializer,
     WishUpdateSerializer,
 )
+from users.identity import resolve_user_id
 from users.models import User
 import logging
-import os
-from uuid import uuid4
-
-# Опциональный импорт Pillow для обработки изображений
-try:
-    from PIL import Image
-    HAS_PIL = True
-except ImportError:
-    HAS_PIL = False
-    Image = None
+from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
+# Связи, которые читает WishSerializer (wishlist.name, user.telegram_id, srcset и т.д.)
+WISH_SELECT_RELATED = ('wishlist', 'user', 'image')
+
+# Заголовок для файлов, названных по содержимому (images.is_content_addressed)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def bulk_items(data, key: str) -> list:
+    """Возвращает непустой список data[key] не длиннее BULK_MAX_ITEMS, иначе ValueError."""
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError(f'Параметр {key} должен быть непустым списком')
+    if len(items) > settings.BULK_MAX_ITEMS:
+        raise ValueError(f'За один запрос можно передать не более {settings.BULK_MAX_ITEMS} элементов')
+    return items
+
+
+def bulk_ids(data) -> list[int]:
+    """Возвращает список id из data['ids'] для изменения порядка, иначе ValueError."""
+    ids = bulk_items(data, 'ids')
+    if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+        raise ValueError('Параметр ids должен содержать целые числа')
+    return ids
 
-class WishlistViewSet(viewsets.ModelViewSet):
+
+class WishlistViewSet(ConditionalGetMixin, CachedListMixin, viewsets.ModelViewSet):
     """ViewSet для работы с вишлистами через API."""
     
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
+    pagination_class = KeysetPagination
+    # Списки вишлистов друга (?user_id=) кэшируются, см. caching.py
+    cache_scope = caching.OWNER_SCOPE
+    cache_scope_param = 'user_id'
+    # Счетчики вишлиста меняются вместе с updated_at его желаний
+    fingerprint_fields = ('updated_at', 'wishes__updated_at', 'user__wishes_changed_at')
     
     def get_serializer_class(self):
         """Возвращает соответствующий сериализатор в зависимости от действия."""
@@ -46,32 +75,37 @@ class WishlistViewSet(viewsets.ModelViewSet):
         return WishlistSerializer
     
     def get_serializer_context(self):
-        """Добавляет user в контекст сериализатора."""
+        """Добавляет user_id владельца в контекст сериализатора создания."""
         context = super().get_serializer_context()
         
+        # Владелец нужен только при создании и клонировании вишлистов
+        if self.action not in ('create', 'bulk', 'clone'):
+            return context
+        
         # Получаем user из request (через telegram_id или user_id)
         telegram_id = self.request.data.get('telegram_id') or self.request.query_params.get('telegram_id')
         user_id = self.request.data.get('user_id') or self.request.query_params.get('user_id')
         
-        if telegram_id:
-            try:
-                user = User.objects.get(telegram_id=int(telegram_id))
-                context['user'] = user
-            except (User.DoesNotExist, ValueError):
-                pass
-        elif user_id:
-            try:
-                user = User.objects.get(id=int(user_id))
-                context['user'] = user
-            except (User.DoesNotExist, ValueError):
-                pass
+        try:
+            if telegram_id:
+                context['user_id'] = resolve_user_id(telegram_id, self.request)
+            elif user_id:
+                context['user_id'] = User.objects.filter(id=int(user_id)).values_list('id', flat=True).first()
+        except (TypeError, ValueError):
+            pass
         
         return context
     
     def get_queryset(self):
-        """Возвращает queryset с возможностью фильтрации."""
-        queryset = super().get_queryset()
-        
+        """Возвращает queryset с количеством желаний и возможностью фильтрации."""
+        return self.filter_by_params(super().get_queryset()).with_wish_counts()
+    
+    def get_fingerprint_queryset(self):
+        """Отпечаток считается без аннотаций with_wish_counts."""
+        return self.filter_by_params(Wishlist.objects.all())
+    
+    def filter_by_params(self, queryset):
+        """Применяет фильтры из параметров запроса."""
         # Фильтрация по user_id если передан
         user_id = self.request.query_params.get('user_id', None)
         if user_id:
@@ -84,10 +118,10 @@ class WishlistViewSet(viewsets.ModelViewSet):
         telegram_id = self.request.query_params.get('telegram_id', None)
         if telegram_id:
             try:
-                user = User.objects.get(telegram_id=int(telegram_id))
-                queryset = queryset.filter(user=user)
-            except (User.DoesNotExist, ValueError):
-                queryset = queryset.none()
+                user_id = resolve_user_id(telegram_id, self.request)
+            except ValueError:
+                user_id = None
+            queryset = queryset.filter(user_id=user_id) if user_id else queryset.none()
         
         return queryset
     
@@ -103,21 +137,107 @@ class WishlistViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            user = get_object_or_404(User, telegram_id=int(telegram_id))
-            wishlists = Wishlist.objects.filter(user=user)
-            serializer = self.get_serializer(wishlists, many=True)
-            return Response(serializer.data)
+            user_id = resolve_user_id(telegram_id, request)
+            if user_id is None:
+                raise Http404('Пользователь не найден')
+            wishlists = Wishlist.objects.filter(user_id=user_id)
+            
+            def respond():
+                page = self.paginate_queryset(wishlists.with_wish_counts())
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            
+            return self.conditional_response(wishlists, respond, use_last_modified=False)
         except ValueError:
             return Response(
                 {'error': 'Некорректный telegram_id'},
                 status=status.HTTP_400_BAD_REQUEST
             )
     
-class WishViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def bulk(self, request: Request) -> Response:
+        """Создает несколько вишлистов пользователя одним INSERT.
+
+        Тело: {"telegram_id" или "user_id": владелец, "wishlists": [...]}.
+        При ошибке в любом элементе не создается ничего.
+        """
+        try:
+            items = bulk_items(request.data, 'wishlists')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        context = self.get_serializer_context()
+        if not context.get('user_id'):
+            return Response(
+                {'error': 'Пользователь не указан'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = WishlistCreateSerializer(data=items, many=True, context=context)
+        serializer.is_valid(raise_exception=True)
+        wishlists = services.bulk_create_wishlists(context['user_id'], serializer.validated_data)
+        
+        # Счетчики новых вишлистов читаются одним запросом
+        created = Wishlist.objects.filter(pk__in=[wishlist.pk for wishlist in wishlists]).with_wish_counts()
+        serializer = WishlistSerializer(created, many=True, context=context)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def clone(self, request: Request, pk: int = None) -> Response:
+        """Клонирует вишлист со всеми желаниями за постоянное число запросов.
+
+        Тело: {"telegram_id" или "user_id": владелец копии (по умолчанию
+        владелец исходного вишлиста), "name": название (по умолчанию
+        «<название> (копия)»)}. Желания копируются активными, без резерва.
+        """
+        source = self.get_object()
+        user_id = self.get_serializer_context().get('user_id', source.user_id)
+        if not user_id:
+            return Response(
+                {'error': 'Пользователь не найден'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_length = Wishlist._meta.get_field('name').max_length
+        name = str(request.data.get('name') or f'{source.name} (копия)')[:max_length]
+        clone = services.clone_wishlist(source, user_id, name)
+        
+        serializer = WishlistSerializer(Wishlist.objects.with_wish_counts().get(pk=clone.pk))
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['patch'])
+    def reorder(self, request: Request) -> Response:
+        """Задает порядок вишлистов пользователя: {"ids": [...]} в новом порядке."""
+        try:
+            ids = bulk_ids(request.data)
+            services.reorder_wishlists(ids)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'ids': ids})
+    
+
+class WishViewSet(ConditionalGetMixin, CachedListMixin, viewsets.ModelViewSet):
     """ViewSet для работы с желаниями через API."""
     
-    queryset = Wish.objects.all()
+    queryset = Wish.objects.select_related(*WISH_SELECT_RELATED)
     serializer_class = WishSerializer
+    pagination_class = KeysetPagination
+    # Списки желаний вишлиста (?wishlist_id=) кэшируются, см. caching.py
+    cache_scope = caching.WISHLIST_SCOPE
+    cache_scope_param = 'wishlist_id'
+    # В ответе есть название и дата вишлиста
+    fingerprint_fields = ('updated_at', 'wishlist__updated_at', 'user__wishes_changed_at')
+    
+    def initialize_request(self, request, *args, **kwargs):
+        """Для upload-image подключает потоковый обработчик загрузки (см. uploads.py).
+
+        Обработчики нужно заменить до первого обращения к телу запроса.
+        """
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'upload_image':
+            self.upload_handler = uploads.ImageUploadHandler(request)
+            request.upload_handlers = [self.upload_handler]
+        return drf_request
     
     def get_serializer_class(self):
         """Возвращает соответствующий сериализатор в зависимости от действия."""
@@ -135,25 +255,15 @@ class WishViewSet(viewsets.ModelViewSet):
         wishlist_id = self.request.query_params.get('wishlist_id', None)
         if wishlist_id:
             try:
-                wishlist_id_int = int(wishlist_id)
-                logger.info(f'[WishViewSet] Фильтруем желания по wishlist_id={wishlist_id_int}')
-                queryset = queryset.filter(wishlist_id=wishlist_id_int)
-                count = queryset.count()
-                logger.info(f'[WishViewSet] Найдено желаний: {count}')
-                # Логируем первые несколько ID для отладки
-                if count > 0:
-                    ids = list(queryset.values_list('id', flat=True)[:5])
-                    logger.info(f'[WishViewSet] ID найденных желаний: {ids}')
+                queryset = queryset.filter(wishlist_id=int(wishlist_id))
             except ValueError:
                 logger.warning(f'[WishViewSet] Некорректный wishlist_id: {wishlist_id}')
-                pass
         
         # Фильтрация по user_id если передан
         user_id = self.request.query_params.get('user_id', None)
         if user_id:
             try:
                 queryset = queryset.filter(user_id=int(user_id))
-                logger.info(f'[WishViewSet] Фильтруем по user_id={user_id}, осталось: {queryset.count()}')
             except ValueError:
                 pass
         
@@ -161,10 +271,12 @@ class WishViewSet(viewsets.ModelViewSet):
         telegram_id = self.request.query_params.get('telegram_id', None)
         if telegram_id:
             try:
-                user = User.objects.get(telegram_id=int(telegram_id))
-                queryset = queryset.filter(user=user)
-                logger.info(f'[WishViewSet] Фильтруем по telegram_id={telegram_id}, осталось: {queryset.count()}')
-            except (User.DoesNotExist, ValueError):
+                user_id = resolve_user_id(telegram_id, self.request)
+            except ValueError:
+                user_id = None
+            if user_id:
+                queryset = queryset.filter(user_id=user_id)
+            else:
                 logger.warning(f'[WishViewSet] Пользователь с telegram_id={telegram_id} не найден')
                 queryset = queryset.none()
         
@@ -172,38 +284,68 @@ class WishViewSet(viewsets.ModelViewSet):
         reserved_by_id = self.request.query_params.get('reserved_by_id', None)
         if reserved_by_id:
             try:
-                reserved_by_id_int = int(reserved_by_id)
-                queryset = queryset.filter(reserved_by_id=reserved_by_id_int)
-                logger.info(f'[WishViewSet] Фильтруем по reserved_by_id={reserved_by_id_int}, осталось: {queryset.count()}')
+                queryset = queryset.filter(reserved_by_id=int(reserved_by_id))
             except ValueError:
                 logger.warning(f'[WishViewSet] Некорректный reserved_by_id: {reserved_by_id}')
-                pass
         
         # Фильтрация по gifted_by_id если передан
         gifted_by_id = self.request.query_params.get('gifted_by_id', None)
         if gifted_by_id:
             try:
-                gifted_by_id_int = int(gifted_by_id)
-                queryset = queryset.filter(gifted_by_id=gifted_by_id_int)
-                logger.info(f'[WishViewSet] Фильтруем по gifted_by_id={gifted_by_id_int}, осталось: {queryset.count()}')
+                queryset = queryset.filter(gifted_by_id=int(gifted_by_id))
             except ValueError:
                 logger.warning(f'[WishViewSet] Некорректный gifted_by_id: {gifted_by_id}')
-                pass
         
         # Фильтрация по status
         status_filter = self.request.query_params.get('status', None)
         if status_filter:
             queryset = queryset.filter(status=status_filter)
-            logger.info(f'[WishViewSet] Фильтруем по status={status_filter}, осталось: {queryset.count()}')
         
         return queryset
     
-    def list(self, request: Request, *args, **kwargs) -> Response:
-        """Переопределяем list для логирования."""
-        logger.info(f'[WishViewSet] Запрос списка желаний. Параметры: {dict(request.query_params)}')
-        response = super().list(request, *args, **kwargs)
-        logger.info(f'[WishViewSet] Возвращено желаний: {len(response.data) if isinstance(response.data, list) else "не список"}')
-        return response
+    def update(self, request: Request, *args, **kwargs) -> Response:
+        """Обновляет желание; конкурентная смена статуса возвращает 409."""
+        try:
+            return super().update(request, *args, **kwargs)
+        except services.StatusConflict:
+            return Response(
+                {'error': 'Статус желания был изменен другим пользователем'},
+                status=status.HTTP_409_CONFLICT
+            )
+    
+    def perform_update(self, serializer):
+        old_wishlist_id = serializer.instance.wishlist_id
+        old_status = serializer.instance.status
+        super().perform_update(serializer)
+        wish = serializer.instance
+        moved = wish.wishlist_id != old_wishlist_id
+        if moved:
+            self._after_move(wish, old_wishlist_id)
+        
+        # Смена статуса через PATCH сообщается теми же событиями, что и в
+        # действиях reserve/fulfill/unfulfill
+        if wish.status == old_status:
+            if not moved:
+                events.publish(events.UPDATED, wish)
+        elif wish.status == 'reserved':
+            events.publish(events.RESERVED, wish, reserved_by_id=wish.reserved_by_id)
+        elif wish.status == 'fulfilled':
+            events.publish(events.FULFILLED, wish)
+        elif old_status == 'fulfilled':
+            events.publish(events.UNFULFILLED, wish)
+        else:
+            # Снятие резерва: отдельного события нет
+            events.publish(events.UPDATED, wish)
+    
+    def _after_move(self, wish: Wish, old_wishlist_id: int) -> None:
+        """Сбрасывает кэш старого вишлиста и сообщает о перемещении желания.
+
+        post_save сбрасывает кэш только нового вишлиста, а из старого
+        желание пропадает без изменения updated_at.
+        """
+        caching.invalidate(wishlist_ids=[old_wishlist_id])
+        caching.touch_owner(wish.user_id)
+        events.publish(events.MOVED, wish, from_wishlist_id=old_wishlist_id)
     
     @action(detail=False, methods=['get'])
     def by_telegram_id(self, request: Request) -> Response:
@@ -217,29 +359,158 @@ class WishViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            user = get_object_or_404(User, telegram_id=int(telegram_id))
-            wishes = Wish.objects.filter(user=user)
-            logger.info(f'[WishViewSet.by_telegram_id] Найдено желаний для пользователя {telegram_id}: {wishes.count()}')
-            serializer = self.get_serializer(wishes, many=True)
-            return Response(serializer.data)
+            user_id = resolve_user_id(telegram_id, request)
+            if user_id is None:
+                raise Http404('Пользователь не найден')
+            wishes = Wish.objects.select_related(*WISH_SELECT_RELATED).filter(user_id=user_id)
+            
+            def respond():
+                page = self.paginate_queryset(wishes)
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            
+            return self.conditional_response(wishes, respond, use_last_modified=False)
         except ValueError:
             return Response(
                 {'error': 'Некорректный telegram_id'},
                 status=status.HTTP_400_BAD_REQUEST
             )
     
+    @action(detail=False, methods=['get'])
+    def changes(self, request: Request) -> Response:
+        """Возвращает желания, созданные, измененные и удаленные после токена since.
+
+        Область задается одним из параметров: user_id или telegram_id
+        (желания владельца) либо subscriber_id (желания пользователей, на
+        которых он подписан). Без since возвращается полный снимок области.
+        Ответ: changed — желания, deleted — id удаленных желаний, next —
+        токен для следующего запроса, has_more — есть ли еще изменения.
+        При изменении подписок клиент запрашивает снимок заново.
+        """
+        params = request.query_params
+        try:
+            limit = int(params.get('limit', settings.SYNC_PAGE_SIZE))
+            if params.get('telegram_id'):
+                owner_id = resolve_user_id(params['telegram_id'], request)
+                if owner_id is None:
+                    raise Http404('Пользователь не найден')
+                owners = [owner_id]
+            elif params.get('user_id'):
+                owners = [int(params['user_id'])]
+            elif params.get('subscriber_id'):
+                owners = User.objects.filter(subscribers=int(params['subscriber_id'])).values('id')
+            else:
+                return Response(
+                    {'error': 'Нужен один из параметров user_id, telegram_id или subscriber_id'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        except ValueError:
+            return Response(
+                {'error': 'Некорректные параметры запроса'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, settings.SYNC_MAX_PAGE_SIZE))
+        
+        try:
+            changes = sync.collect_changes(
+                Wish.objects.select_related(*WISH_SELECT_RELATED).filter(user_id__in=owners),
+                WishTombstone.objects.filter(user_id__in=owners),
+                params.get('since'),
+                limit,
+            )
+        except sync.TokenExpired:
+            return Response(
+                {'error': 'Токен устарел, загрузите список заново'},
+                status=status.HTTP_410_GONE
+            )
+        except ValueError:
+            return Response(
+                {'error': 'Некорректный токен since'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        changes['changed'] = self.get_serializer(changes['changed'], many=True).data
+        return Response(changes)
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request: Request) -> Response:
+        """Создает несколько желаний одним INSERT: {"wishes": [...]}.
+
+        Вишлисты всех элементов читаются одним запросом, элементы проверяются
+        за один проход; при ошибке в любом элементе не создается ничего.
+        """
+        try:
+            items = bulk_items(request.data, 'wishes')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        wishlist_ids = set()
+        for item in items:
+            try:
+                wishlist_ids.add(int(item.get('wishlist')))
+            except (AttributeError, TypeError, ValueError):
+                # Ошибку элемента вернет сериализатор
+                pass
+        
+        context = self.get_serializer_context()
+        context['wishlists'] = Wishlist.objects.select_related('user').in_bulk(wishlist_ids)
+        # Загруженные изображения всех элементов — тоже одним запросом
+        context['images'] = images.resolve_images(
+            item.get('image_url') for item in items if isinstance(item, dict)
+        )
+        serializer = WishBulkCreateSerializer(data=items, many=True, context=context)
+        serializer.is_valid(raise_exception=True)
+        wishes = services.bulk_create_wishes(serializer.validated_data)
+        
+        serializer = self.get_serializer(wishes, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def copy(self, request: Request, pk: int = None) -> Response:
+        """Копирует желание в вишлист wishlist_id (например, желание друга к себе).
+
+        Копия активна и без резерва; изображение не загружается заново.
+        """
+        wishlist_id = request.data.get('wishlist_id')
+        if not wishlist_id:
+            return Response(
+                {'error': 'Параметр wishlist_id обязателен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            wishlist = get_object_or_404(Wishlist.objects.select_related('user'), id=int(wishlist_id))
+        except ValueError:
+            return Response(
+                {'error': 'Некорректный wishlist_id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        wish = services.copy_wish(self.get_object(), wishlist)
+        serializer = self.get_serializer(wish)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['patch'])
+    def reorder(self, request: Request) -> Response:
+        """Задает порядок желаний вишлиста: {"ids": [...]} в новом порядке."""
+        try:
+            ids = bulk_ids(request.data)
+            services.reorder_wishes(ids)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'ids': ids})
+    
     @action(detail=False, methods=['get'], url_path='test-wishlist/(?P<wishlist_id>[^/.]+)')
     def test_wishlist(self, request: Request, wishlist_id: int = None) -> Response:
         """Тестовый endpoint для проверки желаний вишлиста."""
         try:
             wishlist = get_object_or_404(Wishlist, id=int(wishlist_id))
-            wishes = Wish.objects.filter(wishlist=wishlist)
-            logger.info(f'[WishViewSet.test_wishlist] Вишлист {wishlist_id}: найдено желаний {wishes.count()}')
+            wishes = Wish.objects.select_related(*WISH_SELECT_RELATED).filter(wishlist=wishlist)
             serializer = self.get_serializer(wishes, many=True)
             return Response({
                 'wishlist_id': wishlist_id,
                 'wishlist_name': wishlist.name,
-                'wishes_count': wishes.count(),
+                'wishes_count': len(serializer.data),
                 'wishes': serializer.data
             })
         except (ValueError, Wishlist.DoesNotExist) as e:
@@ -252,90 +523,77 @@ class WishViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def fulfill(self, request: Request, pk: int = None) -> Response:
         """Отмечает желание как исполненное."""
-        wish = self.get_object()
-        
         # Получаем пользователя, который дарит (из request или query params)
         gifted_by_id = request.data.get('gifted_by_id') or request.query_params.get('gifted_by_id')
         
-        # Если gifted_by_id не передан, но подарок зарезервирован, используем reserved_by
-        if not gifted_by_id and wish.reserved_by:
-            gifted_by_id = wish.reserved_by.id
-        
+        # Если gifted_by_id не передан, сервис использует reserved_by
         if gifted_by_id:
             try:
-                gifted_by = User.objects.get(id=int(gifted_by_id))
-                wish.gifted_by = gifted_by
+                gifted_by_id = int(gifted_by_id)
+                User.objects.only('id').get(id=gifted_by_id)
             except (User.DoesNotExist, ValueError):
                 return Response(
                     {'error': 'Пользователь не найден'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        else:
+            gifted_by_id = None
         
-        wish.status = 'fulfilled'
-        wish.gifted_at = timezone.now()
-        wish.save()
-        
-        # Обновляем статистику пользователей
-        if wish.user:
-            wish.user.gifts_received += 1
-            wish.user.save()
-        
-        if wish.gifted_by:
-            wish.gifted_by.gifts_given += 1
-            wish.gifted_by.save()
+        try:
+            wish = services.fulfill_wish(int(pk), gifted_by_id)
+        except (Wish.DoesNotExist, ValueError):
+            raise Http404
+        events.publish(events.FULFILLED, wish)
         
         serializer = self.get_serializer(wish)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['delete'], url_path='fulfill')
+    @fulfill.mapping.delete
     def unfulfill(self, request: Request, pk: int = None) -> Response:
         """Отменяет исполнение желания."""
-        wish = self.get_object()
-        
-        # Обновляем статистику пользователей (уменьшаем)
-        if wish.user and wish.gifted_by:
-            wish.user.gifts_received = max(0, wish.user.gifts_received - 1)
-            wish.user.save()
-            
-            wish.gifted_by.gifts_given = max(0, wish.gifted_by.gifts_given - 1)
-            wish.gifted_by.save()
-        
-        wish.status = 'active'
-        wish.gifted_by = None
-        wish.gifted_at = None
-        wish.save()
+        try:
+            wish = services.unfulfill_wish(int(pk))
+        except (Wish.DoesNotExist, ValueError):
+            raise Http404
+        events.publish(events.UNFULFILLED, wish)
         
         serializer = self.get_serializer(wish)
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def reserve(self, request: Request, pk: int = None) -> Response:
-        """Резервирует желание."""
+        """Резервирует желание.
+
+        Резервирование выполняется условным UPDATE, поэтому из одновременных
+        запросов успешен ровно один, остальные получают 409.
+        """
         wish = self.get_object()
         
-        if wish.status != 'active':
-            return Response(
-                {'error': 'Можно зарезервировать только активное желание'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         # Получаем пользователя, который резервирует
         reserved_by_id = request.data.get('reserved_by_id') or request.query_params.get('reserved_by_id')
         
         if reserved_by_id:
             try:
-                reserved_by = User.objects.get(id=int(reserved_by_id))
-                wish.reserved_by = reserved_by
+                reserved_by_id = int(reserved_by_id)
+                User.objects.only('id').get(id=reserved_by_id)
             except (User.DoesNotExist, ValueError):
                 return Response(
                     {'error': 'Пользователь не найден'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        else:
+            reserved_by_id = None
         
-        wish.status = 'reserved'
-        wish.reserved_at = timezone.now()
-        wish.save()
+        try:
+            services.reserve_wish(wish.pk, reserved_by_id)
+        except services.StatusConflict:
+            return Response(
+                {'error': 'Можно зарезервировать только активное желание'},
+                status=status.HTTP_409_CONFLICT
+            )
         
+        wish.refresh_from_db(fields=['status', 'reserved_by', 'reserved_at', 'updated_at'])
+        events.publish(events.RESERVED, wish, reserved_by_id=wish.reserved_by_id)
         serializer = self.get_serializer(wish)
         return Response(serializer.data)
     
@@ -361,8 +619,13 @@ class WishViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
+            old_wishlist_id = wish.wishlist_id
             wish.wishlist = new_wishlist
-            wish.save()
+            # Только вишлист: статус и резерв, прочитанные get_object(),
+            # могли устареть из-за одновременного резервирования
+            wish.save(update_fields=['wishlist', 'updated_at'])
+            wish.refresh_from_db(fields=['status', 'reserved_by', 'reserved_at'])
+            self._after_move(wish, old_wishlist_id)
             
             serializer = self.get_serializer(wish)
             return Response(serializer.data)
@@ -374,92 +637,184 @@ class WishViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'], url_path='upload-image')
     def upload_image(self, request: Request) -> Response:
-        """Загружает изображение и возвращает URL."""
-        if 'image' not in request.FILES:
+        """Загружает изображение и возвращает URL.
+
+        Файл сохраняется как есть, обработка выполняется в фоне (см. images.py).
+        Ответ 202 содержит адрес оригинала, который можно сразу сохранить в
+        желании, и id для проверки статуса; после обработки адрес заменяется.
+        Тип и размер проверяются при приеме тела запроса (см. uploads.py).
+        """
+        files = request.FILES
+        if self.upload_handler.error:
             return Response(
-                {'error': 'Изображение не найдено'},
+                {'error': self.upload_handler.error},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        image_file = request.FILES['image']
-        
-        # Проверяем тип файла
-        allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp', 'image/gif']
-        if image_file.content_type not in allowed_types:
+        if 'image' not in files:
             return Response(
-                {'error': 'Неподдерживаемый тип файла. Разрешены: JPEG, PNG, WebP, GIF'},
+                {'error': 'Изображение не найдено'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Проверяем размер файла (максимум 10 МБ)
-        max_size = 10 * 1024 * 1024  # 10 МБ
-        if image_file.size > max_size:
-            return Response(
-                {'error': 'Размер файла превышает 10 МБ'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Тип определен по сигнатуре файла, а не по заголовку клиента
+        image_file = files['image']
         
         try:
-            # Создаем директорию для изображений, если её нет
-            upload_dir = os.path.join(settings.MEDIA_ROOT, 'wish_images')
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Генерируем уникальное имя файла (всегда сохраняем как JPEG после обработки)
-            unique_filename = f"{uuid4().hex}.jpg"
-            file_path = os.path.join(upload_dir, unique_filename)
-            
-            # Обрабатываем и сохраняем изображение
-            if HAS_PIL and Image:
-                try:
-                    img = Image.open(image_file)
-                    # Конвертируем в RGB, если нужно (для PNG с прозрачностью)
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'P':
-                            img = img.convert('RGBA')
-                        rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                        img = rgb_img
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # Изменяем размер, если изображение слишком большое (максимум 2000px по большей стороне)
-                    max_dimension = 2000
-                    if max(img.size) > max_dimension:
-                        img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
-                    
-                    # Сохраняем с оптимизацией
-                    img.save(file_path, 'JPEG', quality=85, optimize=True)
-                except Exception as e:
-                    logger.warning(f'Ошибка при обработке изображения: {e}')
-                    # Если обработка не удалась, сохраняем оригинал
-                    with open(file_path, 'wb+') as destination:
-                        for chunk in image_file.chunks():
-                            destination.write(chunk)
-            else:
-                # Если Pillow не установлен, сохраняем оригинал
-                logger.warning('Pillow не установлен, изображение сохраняется без обработки')
-                with open(file_path, 'wb+') as destination:
-                    for chunk in image_file.chunks():
-                        destination.write(chunk)
-            
-            # Формируем URL
-            media_url = settings.MEDIA_URL
-            if not media_url.startswith('http'):
-                # Если это относительный URL, формируем полный URL
-                image_url = request.build_absolute_uri(f"{media_url}wish_images/{unique_filename}")
-            else:
-                image_url = f"{media_url}wish_images/{unique_filename}"
-            
-            logger.info(f'Изображение успешно загружено: {image_url}')
-            
-            return Response({
-                'image_url': image_url,
-                'filename': unique_filename
-            }, status=status.HTTP_201_CREATED)
-            
+            upload, created = images.save_original(image_file, image_file.content_type, self._media_url_prefix(request))
         except Exception as e:
             logger.error(f'Ошибка при загрузке изображения: {e}')
             return Response(
                 {'error': f'Ошибка при загрузке изображения: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        return self._submit_upload(upload, created)
+    
+    @action(detail=False, methods=['post'], url_path='uploads')
+    def create_upload_session(self, request: Request) -> Response:
+        """Начинает загрузку изображения частями: {"size": <байт>}.
+
+        Дальше клиент отправляет части PUT /api/wishes/uploads/<id>/ с
+        заголовком Content-Range: bytes <начало>-<конец>/<size> и телом части,
+        после обрыва узнает полученное смещение GET /api/wishes/uploads/<id>/
+        и продолжает с него, а затем вызывает POST .../finalize/.
+        """
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Параметр size обязателен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            session = uploads.create_session(size)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self._upload_session_data(session), status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get', 'put'], url_path='uploads/(?P<session_id>[0-9a-f-]{32,36})')
+    def upload_chunk(self, request: Request, session_id: str = None) -> Response:
+        """PUT записывает часть файла по смещению из Content-Range, GET возвращает смещение.
+
+        Часть может начинаться не дальше уже полученных байт (повтор части
+        допустим), иначе 409 с offset, с которого нужно продолжить.
+        """
+        session = self._get_upload_session(session_id)
+        if request.method == 'PUT':
+            try:
+                uploads.write_chunk(session, request.headers.get('Content-Range'), request.stream or BytesIO())
+            except uploads.OffsetMismatch as e:
+                return Response(
+                    {'error': 'Часть начинается после пропуска', 'offset': e.offset},
+                    status=status.HTTP_409_CONFLICT
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self._upload_session_data(session))
+    
+    @action(detail=False, methods=['post'], url_path='uploads/(?P<session_id>[0-9a-f-]{32,36})/finalize')
+    def finalize_upload_session(self, request: Request, session_id: str = None) -> Response:
+        """Завершает загрузку частями: файл переносится в хранилище и ставится в обработку.
+
+        Ответ такой же, как у upload-image.
+        """
+        session = self._get_upload_session(session_id)
+        try:
+            upload, created = uploads.finalize(session, self._media_url_prefix(request))
+        except uploads.OffsetMismatch as e:
+            return Response(
+                {'error': 'Файл получен не полностью', 'offset': e.offset},
+                status=status.HTTP_409_CONFLICT
+            )
+        except UploadSession.DoesNotExist:
+            raise Http404
+        return self._submit_upload(upload, created)
+    
+    def _get_upload_session(self, session_id: str) -> UploadSession:
+        try:
+            return get_object_or_404(UploadSession, pk=session_id)
+        except ValidationError:
+            raise Http404
+    
+    def _upload_session_data(self, session: UploadSession) -> dict:
+        return {
+            'id': session.id.hex,
+            'size': session.size,
+            'offset': session.received,
+            'chunk_size': settings.IMAGE_UPLOAD_CHUNK_SIZE,
+        }
+    
+    def _media_url_prefix(self, request: Request) -> str:
+        """Абсолютный адрес медиафайлов для ссылок на загруженные изображения."""
+        media_url = settings.MEDIA_URL
+        return media_url if media_url.startswith('http') else request.build_absolute_uri(media_url)
+    
+    def _submit_upload(self, upload: ImageUpload, created: bool) -> Response:
+        """Ставит новую загрузку в обработку и отвечает ее статусом (201 — готово, 202 — в обработке)."""
+        # Повторная загрузка того же файла уже обработана или стоит в очереди
+        if created and not images.pipeline.submit(upload):
+            images.discard(upload)
+            return Response(
+                {'error': 'Сервер перегружен обработкой изображений, попробуйте позже'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '5'}
+            )
+        
+        upload.refresh_from_db(fields=['status', 'processed'])
+        logger.info(f'Изображение загружено: {upload.original_url} ({upload.status})')
+        return Response(
+            self._image_upload_data(upload),
+            status=status.HTTP_201_CREATED if upload.status == 'ready' else status.HTTP_202_ACCEPTED
+        )
+    
+    @action(detail=False, methods=['get'], url_path='upload-image/(?P<upload_id>[0-9a-f-]{32,36})')
+    def image_upload_status(self, request: Request, upload_id: str = None) -> Response:
+        """Возвращает статус обработки загруженного изображения."""
+        try:
+            upload = get_object_or_404(ImageUpload, pk=upload_id)
+        except ValidationError:
+            raise Http404
+        return Response(self._image_upload_data(upload))
+    
+    def _image_upload_data(self, upload: ImageUpload) -> dict:
+        return {
+            'id': upload.id.hex,
+            'status': upload.status,
+            'image_url': upload.image_url,
+            'filename': upload.image_url.rsplit('/', 1)[-1],
+            'error': upload.error or None,
+        }
+
+
+@require_GET
+async def wish_events(request) -> StreamingHttpResponse | JsonResponse:
+    """SSE-поток событий желаний вишлистов ?wishlist_id=1&wishlist_id=2 (см. events.py)."""
+    try:
+        wishlist_ids = {int(value) for value in request.GET.getlist('wishlist_id')}
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный wishlist_id'}, status=status.HTTP_400_BAD_REQUEST)
+    if not wishlist_ids:
+        return JsonResponse({'error': 'Параметр wishlist_id обязателен'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(wishlist_ids) > settings.EVENTS_MAX_WISHLISTS:
+        return JsonResponse(
+            {'error': f'Можно подписаться не более чем на {settings.EVENTS_MAX_WISHLISTS} вишлистов'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    response = StreamingHttpResponse(events.stream(wishlist_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключает буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def serve_media(request, path: str):
+    """Отдает файл из MEDIA_ROOT (при SERVE_MEDIA, см. config/urls.py).
+
+    Файлы, названные по содержимому, не меняются, поэтому их можно
+    кэшировать навсегда — и браузеру, и прокси перед приложением.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if images.is_content_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -44,6 +44,8 @@ fi
 # Удаляем базу данных
 DB_FILE="$PROJECT_DIR/backend/db.sqlite3"
 DB_JOURNAL="$PROJECT_DIR/backend/db.sqlite3-journal"
+DB_WAL="$PROJECT_DIR/backend/db.sqlite3-wal"
+DB_SHM="$PROJECT_DIR/backend/db.sqlite3-shm"
 
 echo -e "${YELLOW}🗑️  Удаляю базу данных...${NC}"
 
@@ -59,6 +61,12 @@ if [ -f "$DB_JOURNAL" ]; then
     echo -e "${GREEN}✓ Журнал базы данных удалён${NC}"
 fi
 
+# Файлы режима WAL
+if [ -f "$DB_WAL" ] || [ -f "$DB_SHM" ]; then
+    rm -f "$DB_WAL" "$DB_SHM"
+    echo -e "${GREEN}✓ WAL-файлы базы данных удалены${NC}"
+fi
+
 # Выполняем миграции для создания новой БД
 echo -e "${YELLOW}🗄️  Создаю новую базу данных...${NC}"
 cd "$PROJECT_DIR/backend" || {
@@ -95,7 +103,7 @@ fi
 echo -e "${YELLOW}🔄 Перезапускаю Gunicorn...${NC}"
 cd "$PROJECT_DIR/backend" || exit 1
 
-nohup "$VENV_PYTHON" -m gunicorn config.wsgi:application --bind 127.0.0.1:8002 > gunicorn.log 2>&1 &
+nohup "$VENV_PYTHON" -m gunicorn config.asgi:application -k uvicorn_worker.UvicornWorker --bind 127.0.0.1:8002 > gunicorn.log 2>&1 &
 GUNICORN_PID=$!
 sleep 1
 
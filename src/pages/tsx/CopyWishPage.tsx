@@ -21,6 +21,7 @@ export function CopyWishPage() {
   const [searchParams] = useSearchParams()
 
   // Получаем данные подарка из URL параметров
+  const wishId = Number(searchParams.get('wish_id')) || null
   const title = searchParams.get('title') || ''
   const comment = searchParams.get('comment') || ''
   const link = searchParams.get('link') || ''
@@ -86,15 +87,20 @@ export function CopyWishPage() {
 
     setIsSubmitting(true)
     try {
-      await wishesRepo.createWish({
-        wishlist: wishlistId,
-        title: title.trim(),
-        comment: comment.trim() || undefined,
-        link: link || undefined,
-        image_url: imageUrl || undefined,
-        price: price ? parseFloat(price) : undefined,
-        currency: currency || '₽',
-      })
+      if (wishId) {
+        // Копия создается на сервере из исходного подарка
+        await wishesRepo.copyWish(wishId, wishlistId)
+      } else {
+        await wishesRepo.createWish({
+          wishlist: wishlistId,
+          title: title.trim(),
+          comment: comment.trim() || undefined,
+          link: link || undefined,
+          image_url: imageUrl || undefined,
+          price: price ? parseFloat(price) : undefined,
+          currency: currency || '₽',
+        })
+      }
       // Возвращаемся на страницу вишлиста
       navigate(`/wishes/wishlist/${wishlistId}`)
     } catch (err) {
@@ -5,8 +5,8 @@ import '../css/FeedPage.css'
 import '../css/WishesPage.css'
 import { useTelegramWebApp } from '../../hooks/useTelegramWebApp'
 import { useApiContext } from '../../contexts/ApiContext'
-import type { User } from '../../utils/api/users'
-import type { Wish } from '../../utils/api/wishes'
+import type { FeedResponse, User } from '../../utils/api/users'
+import { imagePlaceholderStyle, type Wish } from '../../utils/api/wishes'
 import { GiftIcon } from '../../utils/tsx/GiftIcon'
 
 interface FeedItem {
@@ -15,6 +15,22 @@ interface FeedItem {
   wishlistName?: string
 }
 
+// Разворачивает страницу ленты (группы по владельцам) в список подарков
+function toFeedItems(page: FeedResponse): FeedItem[] {
+  return page.groups.flatMap(({ user, wishes }) =>
+    wishes.map((wish) => ({ wish, user, wishlistName: wish.wishlist_name })),
+  )
+}
+
+// Сортирует подарки по дате создания (новые сначала)
+function sortByCreatedAt(items: FeedItem[]): FeedItem[] {
+  return [...items].sort((a, b) => {
+    const dateA = new Date(a.wish.created_at).getTime()
+    const dateB = new Date(b.wish.created_at).getTime()
+    return dateB - dateA
+  })
+}
+
 // Компонент меню для желания (три точки)
 interface WishMenuProps {
   status: 'active' | 'reserved' | 'fulfilled'
@@ -195,6 +211,9 @@ export function FeedPage() {
   const [isLoading, setIsLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
   const [currentDbUser, setCurrentDbUser] = useState<User | null>(null)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
+  const loadMoreRef = useRef<HTMLDivElement>(null)
 
   // Загружаем подарки из подписок
   useEffect(() => {
@@ -212,45 +231,10 @@ export function FeedPage() {
         const dbUser = await usersRepo.getUserByTelegramId(currentUser.id)
         setCurrentDbUser(dbUser)
         
-        // Получаем список подписок
-        const subscriptions = await usersRepo.getSubscriptions(dbUser.id)
-        
-        if (subscriptions.length === 0) {
-          setFeedItems([])
-          setIsLoading(false)
-          return
-        }
-
-        // Для каждой подписки получаем все подарки
-        const allFeedItems: FeedItem[] = []
-        
-        await Promise.all(
-          subscriptions.map(async (subUser) => {
-            try {
-              const wishes = await wishesRepo.getWishesByTelegramId(subUser.telegram_id)
-              
-              // Для каждого подарка создаем FeedItem
-              wishes.forEach((wish) => {
-                allFeedItems.push({
-                  wish,
-                  user: subUser,
-                  wishlistName: wish.wishlist_name,
-                })
-              })
-            } catch (err) {
-              console.error(`Ошибка при загрузке подарков для пользователя ${subUser.telegram_id}:`, err)
-            }
-          })
-        )
-
-        // Сортируем по дате создания (новые сначала)
-        allFeedItems.sort((a, b) => {
-          const dateA = new Date(a.wish.created_at).getTime()
-          const dateB = new Date(b.wish.created_at).getTime()
-          return dateB - dateA // Сортировка по убыванию (новые первые)
-        })
-
-        setFeedItems(allFeedItems)
+        // Первая страница ленты одним запросом; следующие — при прокрутке
+        const page = await usersRepo.getFeed(dbUser.id)
+        setFeedItems(sortByCreatedAt(toFeedItems(page)))
+        setNextCursor(page.next_cursor)
       } catch (err: any) {
         console.error('Ошибка при загрузке ленты:', err)
         setError(err?.message || 'Не удалось загрузить ленту')
@@ -264,6 +248,39 @@ export function FeedPage() {
     loadFeed()
   }, [currentUser?.id, usersRepo, wishesRepo])
 
+  // Догружает следующую страницу ленты по курсору
+  const loadMore = useCallback(async () => {
+    if (!usersRepo || !currentDbUser || !nextCursor || isLoadingMore) return
+
+    try {
+      setIsLoadingMore(true)
+      const page = await usersRepo.getFeed(currentDbUser.id, nextCursor)
+      setFeedItems(prev => sortByCreatedAt([...prev, ...toFeedItems(page)]))
+      setNextCursor(page.next_cursor)
+    } catch (err) {
+      console.error('Ошибка при загрузке ленты:', err)
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }, [usersRepo, currentDbUser, nextCursor, isLoadingMore])
+
+  // Следующая страница загружается, когда конец списка появляется на экране
+  useEffect(() => {
+    const sentinel = loadMoreRef.current
+    if (!sentinel || !nextCursor) return
+
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        loadMore()
+      }
+    }, { rootMargin: '200px' })
+    observer.observe(sentinel)
+
+    return () => {
+      observer.disconnect()
+    }
+  }, [nextCursor, loadMore, isLoading])
+
   const formatPrice = (price?: number | string, currency?: string) => {
     if (!price) return null
     const numPrice = typeof price === 'string' ? parseFloat(price) : price
@@ -554,7 +571,7 @@ export function FeedPage() {
                                   className="feed-item-wish-content-wrapper"
                                   onClick={() => handleWishClick(wish, userGroup.user)}
                                 >
-                                  <div className="feed-item-wish-image-container">
+                                  <div className="feed-item-wish-image-container" style={imagePlaceholderStyle(wish.image_placeholder)}>
                                     {wish.image_url ? (
                                       <img 
                                         src={wish.image_url} 
@@ -619,6 +636,11 @@ export function FeedPage() {
             )
           })}
         </div>
+        {nextCursor && (
+          <div ref={loadMoreRef} className="feed-loading">
+            {isLoadingMore && <p>Загрузка ленты...</p>}
+          </div>
+        )}
       </div>
     </div>
   )
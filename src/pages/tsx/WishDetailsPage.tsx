@@ -115,7 +115,8 @@ export function WishDetailsPage() {
     if (!wish) return
     // Открываем страницу выбора вишлиста для копирования
     navigate(
-      `/wishes/copy-wish?title=${encodeURIComponent(wish.title || '')}` +
+      `/wishes/copy-wish?wish_id=${wish.id}` +
+        `&title=${encodeURIComponent(wish.title || '')}` +
         `&comment=${encodeURIComponent(wish.comment || '')}` +
         (wish.link ? `&link=${encodeURIComponent(wish.link)}` : '') +
         (wish.image_url ? `&image_url=${encodeURIComponent(wish.image_url)}` : '') +
@@ -6,6 +6,7 @@ import { useTelegramWebApp } from '../../hooks/useTelegramWebApp'
 import { useApiContext } from '../../contexts/ApiContext'
 import { GiftIcon } from '../../utils/tsx/GiftIcon'
 import type { User } from '../../utils/api/users'
+import { imagePlaceholderStyle, type ImagePlaceholder } from '../../utils/api/wishes'
 
 
 // Компонент меню для желания (три точки)
@@ -238,6 +239,7 @@ interface Wish {
   price?: number
   currency?: string
   image_url?: string
+  image_placeholder?: ImagePlaceholder | null
   comment?: string
   link?: string
   status: 'active' | 'reserved' | 'fulfilled'
@@ -358,6 +360,7 @@ export function WishlistPage() {
                 : undefined,
               currency: w.currency ? String(w.currency) : undefined,
               image_url: w.image_url ? String(w.image_url) : undefined,
+              image_placeholder: w.image_placeholder ?? null,
               comment: w.comment ? String(w.comment) : undefined,
               link: w.link ? String(w.link) : undefined,
               status: (w.status === 'reserved' || w.status === 'fulfilled') ? w.status : 'active',
@@ -476,7 +479,8 @@ export function WishlistPage() {
     if (!wish) return
     // Открываем страницу выбора вишлиста для копирования
     navigate(
-      `/wishes/copy-wish?title=${encodeURIComponent(wish.title || '')}` +
+      `/wishes/copy-wish?wish_id=${wish.id}` +
+        `&title=${encodeURIComponent(wish.title || '')}` +
         `&comment=${encodeURIComponent(wish.comment || '')}` +
         (wish.link ? `&link=${encodeURIComponent(wish.link)}` : '') +
         (wish.image_url ? `&image_url=${encodeURIComponent(wish.image_url)}` : '') +
@@ -658,7 +662,7 @@ export function WishlistPage() {
                       role={!isOwnWishlist ? "button" : undefined}
                       onClick={!isOwnWishlist ? handleOpenDetails : undefined}
                     >
-                      <div className="wish-image-container">
+                      <div className="wish-image-container" style={imagePlaceholderStyle(wish.image_placeholder)}>
                         {wish.image_url ? (
                           <img 
                             src={wish.image_url} 
@@ -96,7 +96,8 @@ export class ApiClient {
       const response = await fetch(url, {
         method,
         headers,
-        body: options.body ? JSON.stringify(options.body) : undefined,
+        // Blob (часть файла) отправляется как есть, остальное — JSON
+        body: options.body instanceof Blob ? options.body : options.body ? JSON.stringify(options.body) : undefined,
         signal,
       })
 
@@ -161,6 +162,45 @@ export class ApiClient {
     return this.request<T>(endpoint, { ...options, method: 'GET' })
   }
 
+  /**
+   * GET запрос списка с обходом всех страниц пагинации (по ссылке next)
+   */
+  async getAllPages<T>(endpoint: string, options?: Omit<RequestOptions, 'method' | 'body'>): Promise<T[]> {
+    const items: T[] = []
+    let next: string | null = endpoint
+
+    while (next) {
+      const response: any = await this.get<any>(next, options)
+      // Кастомные action могут возвращать массив без пагинации
+      if (Array.isArray(response)) {
+        return [...items, ...response]
+      }
+      if (!response || typeof response !== 'object' || !Array.isArray(response.results)) {
+        console.warn('[ApiClient] Неожиданный формат ответа API:', response)
+        return items
+      }
+      items.push(...response.results)
+      next = response.next ? this.toEndpoint(response.next) : null
+    }
+
+    return items
+  }
+
+  /**
+   * Полный URL эндпоинта (для EventSource и других запросов мимо fetch)
+   */
+  url(endpoint: string): string {
+    return `${this.baseUrl}${endpoint.startsWith('/') ? endpoint : `/${endpoint}`}`
+  }
+
+  /**
+   * Преобразует абсолютную ссылку из ответа API в путь относительно baseUrl
+   */
+  private toEndpoint(url: string): string {
+    const parsed = new URL(url, this.baseUrl || window.location.origin)
+    return `${parsed.pathname}${parsed.search}`
+  }
+
   /**
    * POST запрос
    */
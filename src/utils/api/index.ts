@@ -5,8 +5,8 @@
 export { ApiClient, ApiClientError, createApiClient } from './client'
 export type { ApiError, ApiResponse, ApiClientConfig, RequestOptions } from './client'
 
-export { WishesRepository } from './wishes'
-export type { Wish, CreateWishRequest, UpdateWishRequest } from './wishes'
+export { WishesRepository, imagePlaceholderStyle } from './wishes'
+export type { Wish, CreateWishRequest, UpdateWishRequest, WishEvent, ImagePlaceholder } from './wishes'
 
 export { WishlistsRepository } from './wishlists'
 export type { Wishlist, CreateWishlistRequest, UpdateWishlistRequest } from './wishlists'
@@ -3,6 +3,7 @@
  */
 
 import { ApiClient } from './client'
+import type { Wish } from './wishes'
 
 export interface User {
   id: number
@@ -31,6 +32,19 @@ export interface RegisterUserRequest {
   start_param?: string
 }
 
+export interface FeedGroup {
+  user: User
+  wishes: Wish[]
+}
+
+export interface FeedResponse {
+  groups: FeedGroup[]
+  next_cursor: string | null
+}
+
+// Максимальный размер страницы ленты (FEED_MAX_PAGE_SIZE на бэкенде)
+export const FEED_MAX_PAGE_SIZE = 100
+
 /**
  * Репозиторий для работы с пользователями
  */
@@ -69,6 +83,20 @@ export class UsersRepository {
     return this.apiClient.get<User[]>(`/api/users/${userId}/subscriptions/`)
   }
 
+  /**
+   * Получает страницу ленты желаний из подписок пользователя
+   */
+  async getFeed(
+    userId: number,
+    cursor?: string | null,
+    limit: number = FEED_MAX_PAGE_SIZE,
+  ): Promise<FeedResponse> {
+    const queryParams = new URLSearchParams()
+    queryParams.append('limit', limit.toString())
+    if (cursor) queryParams.append('cursor', cursor)
+    return this.apiClient.get<FeedResponse>(`/api/users/${userId}/feed/?${queryParams.toString()}`)
+  }
+
   /**
    * Подписывает пользователя на другого пользователя
    */
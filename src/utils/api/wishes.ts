@@ -4,7 +4,7 @@
  * Пример использования паттерна Repository
  */
 
-import { ApiClient } from './client'
+import { ApiClient, ApiClientError } from './client'
 
 export interface Wish {
   id: number
@@ -19,6 +19,10 @@ export interface Wish {
   comment?: string
   link?: string
   image_url?: string
+  // Уменьшенные копии загруженного изображения по типам: {'image/webp': 'url 160w, url 480w'}
+  image_srcset?: Record<string, string> | null
+  // Заглушка для отрисовки до загрузки изображения
+  image_placeholder?: ImagePlaceholder | null
   price?: number
   currency?: string
   status: 'active' | 'reserved' | 'fulfilled'
@@ -60,6 +64,90 @@ export interface UpdateWishRequest {
   order?: number
 }
 
+/**
+ * Область синхронизации изменений: желания владельца или подписок пользователя
+ */
+export type WishChangesScope =
+  | { user_id: number }
+  | { telegram_id: number }
+  | { subscriber_id: number }
+
+/**
+ * Ответ /api/wishes/changes/
+ */
+export interface WishChangesResponse {
+  changed: Wish[]
+  deleted: number[]
+  next: string
+  has_more: boolean
+}
+
+/**
+ * Событие потока /api/events/. Событие — только уведомление: данные
+ * забираются через getWishChanges; resync означает пропущенные события
+ */
+export interface WishEvent {
+  type: 'created' | 'updated' | 'deleted' | 'reserved' | 'fulfilled' | 'unfulfilled' | 'moved' | 'reordered' | 'resync'
+  wish_id?: number
+  wishlist_id?: number
+  from_wishlist_id?: number
+  user_id?: number
+  status?: Wish['status']
+  reserved_by_id?: number | null
+  wish_ids?: number[]
+}
+
+/**
+ * Заглушка изображения: превью ~20px (data URL), основной цвет и размеры оригинала
+ */
+export interface ImagePlaceholder {
+  data_url: string
+  color: string
+  width: number
+  height: number
+}
+
+/**
+ * Фон контейнера изображения из заглушки: виден, пока грузится image_url
+ */
+export function imagePlaceholderStyle(placeholder?: ImagePlaceholder | null): { [key: string]: string } | undefined {
+  if (!placeholder) {
+    return undefined
+  }
+  return {
+    backgroundColor: placeholder.color,
+    backgroundImage: `url(${placeholder.data_url})`,
+    backgroundSize: 'cover',
+    backgroundPosition: 'center',
+  }
+}
+
+/**
+ * Загруженное изображение: image_url указывает на оригинал, пока status = 'pending'
+ */
+export interface ImageUpload {
+  id: string
+  status: 'pending' | 'ready' | 'failed'
+  image_url: string
+  filename: string
+  error: string | null
+}
+
+/**
+ * Сессия загрузки изображения частями: offset — сколько байт сервер уже получил
+ */
+interface UploadSession {
+  id: string
+  size: number
+  offset: number
+  chunk_size: number
+}
+
+// Файлы больше этого размера загружаются частями с докачкой после обрыва
+const CHUNKED_UPLOAD_THRESHOLD = 1024 * 1024
+// Попыток подряд на одну часть, прежде чем сдаться
+const CHUNK_RETRIES = 5
+
 /**
  * Репозиторий для работы с желаниями
  */
@@ -74,43 +162,21 @@ export class WishesRepository {
    * Получает список желаний пользователя по Telegram ID
    */
   async getWishesByTelegramId(telegramId: number): Promise<Wish[]> {
-    return this.apiClient.get<Wish[]>(`/api/wishes/by_telegram_id/?telegram_id=${telegramId}`)
+    return this.apiClient.getAllPages<Wish>(`/api/wishes/by_telegram_id/?telegram_id=${telegramId}`)
   }
 
   /**
    * Получает список желаний вишлиста
    */
   async getWishesByWishlistId(wishlistId: number): Promise<Wish[]> {
-    const response = await this.apiClient.get<any>(`/api/wishes/?wishlist_id=${wishlistId}`)
-    // Django REST Framework возвращает объект с пагинацией, нужно извлечь results
-    if (response && typeof response === 'object' && 'results' in response && Array.isArray(response.results)) {
-      return response.results as Wish[]
-    }
-    // Если это уже массив, возвращаем как есть
-    if (Array.isArray(response)) {
-      return response as Wish[]
-    }
-    // Если это объект без results, возвращаем пустой массив
-    console.warn('[WishesRepository] Неожиданный формат ответа API:', response)
-    return []
+    return this.apiClient.getAllPages<Wish>(`/api/wishes/?wishlist_id=${wishlistId}`)
   }
 
   /**
    * Получает список желаний пользователя по user_id
    */
   async getUserWishes(userId: number): Promise<Wish[]> {
-    const response = await this.apiClient.get<any>(`/api/wishes/?user_id=${userId}`)
-    // Django REST Framework возвращает объект с пагинацией, нужно извлечь results
-    if (response && typeof response === 'object' && 'results' in response && Array.isArray(response.results)) {
-      return response.results as Wish[]
-    }
-    // Если это уже массив, возвращаем как есть
-    if (Array.isArray(response)) {
-      return response as Wish[]
-    }
-    // Если это объект без results, возвращаем пустой массив
-    console.warn('[WishesRepository] Неожиданный формат ответа API:', response)
-    return []
+    return this.apiClient.getAllPages<Wish>(`/api/wishes/?user_id=${userId}`)
   }
 
   /**
@@ -150,6 +216,27 @@ export class WishesRepository {
     return this.apiClient.post<Wish>('/api/wishes/', data)
   }
 
+  /**
+   * Создает несколько желаний одним запросом (ошибка в любом — не создается ничего)
+   */
+  async createWishes(wishes: CreateWishRequest[]): Promise<Wish[]> {
+    return this.apiClient.post<Wish[]>('/api/wishes/bulk/', { wishes })
+  }
+
+  /**
+   * Копирует желание в вишлист (копия активна, изображение не загружается заново)
+   */
+  async copyWish(wishId: number, wishlistId: number): Promise<Wish> {
+    return this.apiClient.post<Wish>(`/api/wishes/${wishId}/copy/`, { wishlist_id: wishlistId })
+  }
+
+  /**
+   * Задает порядок желаний вишлиста (id в новом порядке)
+   */
+  async reorderWishes(ids: number[]): Promise<void> {
+    await this.apiClient.patch('/api/wishes/reorder/', { ids })
+  }
+
   /**
    * Обновляет желание
    */
@@ -190,68 +277,128 @@ export class WishesRepository {
    * Получает список забронированных подарков пользователя по user_id
    */
   async getReservedWishesByUserId(userId: number): Promise<Wish[]> {
-    const response = await this.apiClient.get<any>(`/api/wishes/?reserved_by_id=${userId}&status=reserved`)
-    // Django REST Framework возвращает объект с пагинацией, нужно извлечь results
-    if (response && typeof response === 'object' && 'results' in response && Array.isArray(response.results)) {
-      return response.results as Wish[]
-    }
-    // Если это уже массив, возвращаем как есть
-    if (Array.isArray(response)) {
-      return response as Wish[]
-    }
-    // Если это объект без results, возвращаем пустой массив
-    console.warn('[WishesRepository] Неожиданный формат ответа API:', response)
-    return []
+    return this.apiClient.getAllPages<Wish>(`/api/wishes/?reserved_by_id=${userId}&status=reserved`)
   }
 
   /**
    * Получает список подаренных подарков пользователя по user_id
    */
   async getGiftedWishesByUserId(userId: number): Promise<Wish[]> {
-    const response = await this.apiClient.get<any>(`/api/wishes/?gifted_by_id=${userId}&status=fulfilled`)
-    // Django REST Framework возвращает объект с пагинацией, нужно извлечь results
-    if (response && typeof response === 'object' && 'results' in response && Array.isArray(response.results)) {
-      return response.results as Wish[]
-    }
-    // Если это уже массив, возвращаем как есть
-    if (Array.isArray(response)) {
-      return response as Wish[]
-    }
-    // Если это объект без results, возвращаем пустой массив
-    console.warn('[WishesRepository] Неожиданный формат ответа API:', response)
-    return []
+    return this.apiClient.getAllPages<Wish>(`/api/wishes/?gifted_by_id=${userId}&status=fulfilled`)
   }
 
   /**
    * Получает список полученных подарков пользователя по user_id
    */
   async getReceivedWishesByUserId(userId: number): Promise<Wish[]> {
-    const response = await this.apiClient.get<any>(`/api/wishes/?user_id=${userId}&status=fulfilled`)
-    // Django REST Framework возвращает объект с пагинацией, нужно извлечь results
-    if (response && typeof response === 'object' && 'results' in response && Array.isArray(response.results)) {
-      return response.results as Wish[]
+    return this.apiClient.getAllPages<Wish>(`/api/wishes/?user_id=${userId}&status=fulfilled`)
+  }
+
+  /**
+   * Получает изменения желаний после токена since (без since — полный снимок).
+   * Изменения применяются к локальной копии как upsert по id; при ответе 410
+   * токен устарел и список нужно загрузить заново (без since).
+   */
+  async getWishChanges(scope: WishChangesScope, since?: string): Promise<WishChangesResponse> {
+    const queryParams = new URLSearchParams()
+    Object.entries(scope).forEach(([key, value]) => queryParams.append(key, String(value)))
+    if (since) queryParams.append('since', since)
+    return this.apiClient.get<WishChangesResponse>(`/api/wishes/changes/?${queryParams.toString()}`)
+  }
+
+  /**
+   * Подписывается на события желаний вишлистов (Server-Sent Events).
+   * EventSource сам переподключается при обрыве, onOpen вызывается при каждом
+   * подключении — в нем стоит синхронизироваться через getWishChanges.
+   * Возвращает функцию отписки.
+   */
+  subscribeToWishlists(
+    wishlistIds: number[],
+    onEvent: (event: WishEvent) => void,
+    onOpen?: () => void
+  ): () => void {
+    const queryParams = new URLSearchParams()
+    wishlistIds.forEach((id) => queryParams.append('wishlist_id', String(id)))
+    const source = new EventSource(this.apiClient.url(`/api/events/?${queryParams.toString()}`))
+
+    source.onmessage = (message) => {
+      try {
+        onEvent(JSON.parse(message.data) as WishEvent)
+      } catch (error) {
+        console.warn('[WishesRepository] Некорректное событие:', message.data, error)
+      }
     }
-    // Если это уже массив, возвращаем как есть
-    if (Array.isArray(response)) {
-      return response as Wish[]
+    if (onOpen) {
+      source.onopen = () => onOpen()
     }
-    // Если это объект без results, возвращаем пустой массив
-    console.warn('[WishesRepository] Неожиданный формат ответа API:', response)
-    return []
+
+    return () => source.close()
   }
 
   /**
    * Загружает изображение на сервер
    * @param file Файл изображения
-   * @returns URL загруженного изображения
+   * @returns URL загруженного изображения (пока идет обработка — адрес оригинала,
+   * сервер сам заменит его в желании на обработанный)
    */
   async uploadImage(file: File): Promise<string> {
-    const response = await this.apiClient.uploadFile<{ image_url: string; filename: string }>(
+    if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+      return (await this.uploadImageInChunks(file)).image_url
+    }
+    const response = await this.apiClient.uploadFile<ImageUpload>(
       '/api/wishes/upload-image/',
       file,
       'image'
     )
     return response.image_url
   }
+
+  /**
+   * Загружает изображение частями. После ошибки сети запрашивает у сервера
+   * полученное смещение и продолжает с него, а не с начала файла.
+   */
+  async uploadImageInChunks(file: File): Promise<ImageUpload> {
+    let session = await this.apiClient.post<UploadSession>('/api/wishes/uploads/', { size: file.size })
+    const endpoint = `/api/wishes/uploads/${session.id}/`
+    let failures = 0
+
+    while (session.offset < file.size) {
+      const end = Math.min(session.offset + session.chunk_size, file.size)
+      try {
+        session = await this.apiClient.put<UploadSession>(endpoint, file.slice(session.offset, end), {
+          headers: {
+            'Content-Type': 'application/octet-stream',
+            'Content-Range': `bytes ${session.offset}-${end - 1}/${file.size}`,
+          },
+        })
+        failures = 0
+      } catch (error) {
+        // Ошибки запроса 4xx не повторяем, кроме таймаута и 409 (смещение разошлось с сервером)
+        const status = error instanceof ApiClientError ? error.status : undefined
+        if (status && status >= 400 && status < 500 && status !== 408 && status !== 409) {
+          throw error
+        }
+        failures += 1
+        if (failures > CHUNK_RETRIES) {
+          throw error
+        }
+        await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** failures))
+        try {
+          session = await this.apiClient.get<UploadSession>(endpoint)
+        } catch {
+          // Сеть еще недоступна: повторим ту же часть на следующей итерации
+        }
+      }
+    }
+
+    return this.apiClient.post<ImageUpload>(`${endpoint}finalize/`)
+  }
+
+  /**
+   * Возвращает статус обработки загруженного изображения
+   */
+  async getImageUpload(uploadId: string): Promise<ImageUpload> {
+    return this.apiClient.get<ImageUpload>(`/api/wishes/upload-image/${uploadId}/`)
+  }
 }
 
@@ -14,6 +14,9 @@ export interface Wishlist {
   updated_at: string
   order: number
   wishes_count: number
+  active_wishes_count?: number
+  reserved_wishes_count?: number
+  fulfilled_wishes_count?: number
 }
 
 export interface CreateWishlistRequest {
@@ -45,37 +48,14 @@ export class WishlistsRepository {
    * Получает список вишлистов пользователя по Telegram ID
    */
   async getWishlistsByTelegramId(telegramId: number): Promise<Wishlist[]> {
-    const response = await this.apiClient.get<any>(`/api/wishlists/by_telegram_id/?telegram_id=${telegramId}`)
-    // Django REST Framework может возвращать объект с пагинацией, нужно извлечь results
-    // Но для кастомных action (by_telegram_id) обычно возвращается массив напрямую
-    if (response && typeof response === 'object' && 'results' in response && Array.isArray(response.results)) {
-      return response.results as Wishlist[]
-    }
-    // Если это уже массив, возвращаем как есть
-    if (Array.isArray(response)) {
-      return response as Wishlist[]
-    }
-    // Если это объект без results, возвращаем пустой массив
-    console.warn('[WishlistsRepository] Неожиданный формат ответа API:', response)
-    return []
+    return this.apiClient.getAllPages<Wishlist>(`/api/wishlists/by_telegram_id/?telegram_id=${telegramId}`)
   }
 
   /**
    * Получает список вишлистов пользователя по user_id
    */
   async getWishlistsByUserId(userId: number): Promise<Wishlist[]> {
-    const response = await this.apiClient.get<any>(`/api/wishlists/?user_id=${userId}`)
-    // Django REST Framework может возвращать объект с пагинацией, нужно извлечь results
-    if (response && typeof response === 'object' && 'results' in response && Array.isArray(response.results)) {
-      return response.results as Wishlist[]
-    }
-    // Если это уже массив, возвращаем как есть
-    if (Array.isArray(response)) {
-      return response as Wishlist[]
-    }
-    // Если это объект без results, возвращаем пустой массив
-    console.warn('[WishlistsRepository] Неожиданный формат ответа API:', response)
-    return []
+    return this.apiClient.getAllPages<Wishlist>(`/api/wishlists/?user_id=${userId}`)
   }
 
   /**
@@ -105,5 +85,26 @@ export class WishlistsRepository {
   async deleteWishlist(wishlistId: number): Promise<void> {
     return this.apiClient.delete<void>(`/api/wishlists/${wishlistId}/`)
   }
+
+  /**
+   * Создает несколько вишлистов пользователя одним запросом
+   */
+  async createWishlists(telegramId: number, wishlists: Omit<CreateWishlistRequest, 'telegram_id'>[]): Promise<Wishlist[]> {
+    return this.apiClient.post<Wishlist[]>('/api/wishlists/bulk/', { telegram_id: telegramId, wishlists })
+  }
+
+  /**
+   * Клонирует вишлист со всеми желаниями (по умолчанию владелец копии — владелец вишлиста)
+   */
+  async cloneWishlist(wishlistId: number, data: { telegram_id?: number; name?: string } = {}): Promise<Wishlist> {
+    return this.apiClient.post<Wishlist>(`/api/wishlists/${wishlistId}/clone/`, data)
+  }
+
+  /**
+   * Задает порядок вишлистов пользователя (id в новом порядке)
+   */
+  async reorderWishlists(ids: number[]): Promise<void> {
+    await this.apiClient.patch('/api/wishlists/reorder/', { ids })
+  }
 }
 
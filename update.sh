@@ -25,6 +25,8 @@ DB_BACKUP="$PROJECT_DIR/backend/db.sqlite3.backup"
 DB_SAVED=false
 
 if [ -f "$DB_FILE" ]; then
+    # В режиме WAL свежие записи могут быть только в db.sqlite3-wal: переносим их в основной файл
+    python3 -c "import sqlite3, sys; sqlite3.connect(sys.argv[1]).execute('PRAGMA wal_checkpoint(TRUNCATE)')" "$DB_FILE" 2>/dev/null
     echo -e "${YELLOW}💾 Сохраняю резервную копию базы данных...${NC}"
     cp "$DB_FILE" "$DB_BACKUP"
     if [ -f "$DB_BACKUP" ]; then
@@ -114,7 +116,7 @@ cd "$PROJECT_DIR/backend" || {
 } && {
     if [ -f "$PROJECT_DIR/.venv/bin/python" ]; then
         echo -e "${YELLOW}🚀 Запускаю Gunicorn в фоновом режиме...${NC}"
-        nohup "$PROJECT_DIR/.venv/bin/gunicorn" config.wsgi:application --bind 127.0.0.1:8002 > gunicorn.log 2>&1 &
+        nohup "$PROJECT_DIR/.venv/bin/gunicorn" config.asgi:application -k uvicorn_worker.UvicornWorker --bind 127.0.0.1:8002 > gunicorn.log 2>&1 &
         GUNICORN_PID=$!
         sleep 1
         